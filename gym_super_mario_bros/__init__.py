@@ -1,27 +1,90 @@
 """Registration code of Gym environments in this package.
 
-Compatibility:
-    Gym 0.26.x still references the `np.bool8` alias, which was removed in
-    NumPy 2.0. To keep this package working on Python 3.12 + NumPy 2.x, we
-    provide a small alias during import.
+Importing this package is cheap: the environments, nes-py, NumPy, and
+Gymnasium load on first use, so spawned workers start fast. The environment
+IDs are registered as soon as Gymnasium is imported (or right away if it
+already is), which keeps `gymnasium.make('SuperMarioBros-v0')` working after
+a plain `import gym_super_mario_bros`.
 """
 
 from __future__ import annotations
 
-import numpy as np
+import importlib
+import importlib.util
+import sys
 
-# NumPy 2.0 removed `np.bool8`; Gym<=0.26 still references it.
-if not hasattr(np, "bool8"):
-    np.bool8 = np.bool_
 
-from .smb_env import SuperMarioBrosEnv
-from .smb_random_stages_env import SuperMarioBrosRandomStagesEnv
-from ._registration import make
+# the outward facing API of this package mapped to the module defining it
+_LAZY_ATTRIBUTES = {
+    'make': '._registration',
+    'make_raw': '._registration',
+    'DatasetReader': '._dataset',
+    'DatasetWriter': '._dataset',
+    'EpisodeLog': '._episode_log',
+    'EpisodeRecorder': '._episode_log',
+    'evaluate_sequences': '._evaluation',
+    'SequenceEvaluator': '._evaluation',
+    'InputLogBackend': '._backend',
+    'ReplayBackend': '._backend',
+    'ReplayTrace': '._backend',
+    'CheckpointArena': '._checkpoint_arena',
+    'CheckpointArchive': '._checkpoint_archive',
+    'CellArchive': '._cell_archive',
+    'CheckpointPool': '._checkpoint_pool',
+    'RolloutCache': '._rollout_cache',
+    'SnapshotStore': '._snapshot_store',
+    'record_golden': '._determinism',
+    'verify_golden': '._determinism',
+    'SuperMarioBrosEnv': '.smb_env',
+    'SuperMarioBrosRandomStagesEnv': '.smb_random_stages_env',
+}
+
+
+def __getattr__(name):
+    """Import an attribute of the outward facing API on first access."""
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
+
+class _RegisterOnGymnasiumImport:
+    """An import hook that registers the environments after Gymnasium loads.
+
+    This is a `sys.meta_path` finder. It doesn't subclass
+    `importlib.abc.MetaPathFinder` because importing that alone costs more
+    than the rest of this package.
+    """
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != 'gymnasium':
+            return None
+        # find the real spec without this hook and wrap its loader
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(fullname)
+        if spec is None or spec.loader is None:
+            return spec
+        exec_module = spec.loader.exec_module
+
+        def exec_module_and_register(module):
+            exec_module(module)
+            importlib.import_module('._registration', __name__)
+
+        spec.loader.exec_module = exec_module_and_register
+        return spec
+
+
+# register the environments with Gymnasium now or once it is imported
+if 'gymnasium' in sys.modules:
+    importlib.import_module('._registration', __name__)
+else:
+    sys.meta_path.insert(0, _RegisterOnGymnasiumImport())
 
 
 # define the outward facing API of this package
-__all__ = [
-    make.__name__,
-    SuperMarioBrosEnv.__name__,
-    SuperMarioBrosRandomStagesEnv.__name__,
-]
+__all__ = list(_LAZY_ATTRIBUTES)
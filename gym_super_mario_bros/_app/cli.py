@@ -6,6 +6,8 @@ from nes_py.wrappers import JoypadSpace
 from nes_py.app.play_human import play_human
 from nes_py.app.play_random import play_random
 from ..actions import RIGHT_ONLY, SIMPLE_MOVEMENT, COMPLEX_MOVEMENT
+from .. import _determinism
+from .. import _emulator_state
 
 
 # a key mapping of action spaces to wrap with
@@ -46,14 +48,91 @@ def _get_args():
         nargs='+',
         help='The random stages to sample from for a random stage env'
     )
+    parser.add_argument('--prebuild-state-cache',
+        type=str,
+        nargs='?',
+        const=True,
+        metavar='DIR',
+        help='Cache the post start screen state of every registered env in DIR (default: the user cache directory) and exit'
+    )
+    parser.add_argument('--record-golden',
+        type=str,
+        metavar='PATH',
+        help='Record the RAM hashes of a fixed action corpus on every stage to PATH and exit'
+    )
+    parser.add_argument('--verify-golden',
+        type=str,
+        metavar='PATH',
+        help='Replay the corpus of the golden hashes in PATH on every stage, report diverging stages, and exit'
+    )
+    parser.add_argument('--workers', '-w',
+        type=int,
+        default=None,
+        help='The number of worker processes for --record-golden and --verify-golden (default: the number of CPUs)'
+    )
     # parse arguments and return them
     return parser.parse_args()
 
 
+def _prebuild_state_cache(state_cache):
+    """
+    Construct every registered environment to fill the state cache.
+
+    Only environments on a core that serializes its state use the cache (an
+    `InputLogBackend` state replays the start screen anyway), so on any other
+    core there is nothing to build and this returns without error.
+
+    Args:
+        state_cache (bool, str): the state cache directory (True for default)
+
+    Returns:
+        None
+
+    """
+    if not _emulator_state.is_supported():
+        print('the installed nes-py core cannot serialize emulator states; nothing to cache')
+        return
+    for env_id, spec in gym.envs.registry.items():
+        # skip environments from other packages
+        if not str(spec.entry_point).startswith('gym_super_mario_bros:'):
+            continue
+        print(env_id)
+        gym.make(env_id, state_cache=state_cache).close()
+
+
+def _verify_golden(path, workers):
+    """
+    Compare the RAM hashes of every stage to golden ones and report changes.
+
+    Args:
+        path (str): the golden hashes written by `--record-golden`
+        workers (int): the number of worker processes (None for the CPUs)
+
+    Returns:
+        None
+
+    """
+    divergences = _determinism.verify_golden(path, workers=workers)
+    for env_id, sequence, step in divergences:
+        print('{}: sequence {} diverges at step {}'.format(env_id, sequence, step))
+    if divergences:
+        sys.exit(1)
+    print('every stage matches the golden hashes')
+
+
 def main():
     """The main entry point for the command line interface."""
     # parse arguments from the command line (argparse validates arguments)
     args = _get_args()
+    if args.prebuild_state_cache is not None:
+        _prebuild_state_cache(args.prebuild_state_cache)
+        return
+    if args.record_golden is not None:
+        _determinism.record_golden(args.record_golden, workers=args.workers)
+        return
+    if args.verify_golden is not None:
+        _verify_golden(args.verify_golden, args.workers)
+        return
     if args.stages is not None and 'RandomStages' not in args.env:
         print('--stages,-S should only be specified for RandomStages environments')
         sys.exit(1)
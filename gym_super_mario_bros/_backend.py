@@ -0,0 +1,547 @@
+"""Emulator backends that `SuperMarioBrosEnv` drives.
+
+`SuperMarioBrosEnv` implements `reset()` and `step()` itself on top of a small
+set of emulator primitives: emulate a frame with the controller buffers, hard
+reset, backup/restore the reset slot, and dump/load the complete state (also
+into preallocated buffers, see `SnapshotStore`). A backend provides these
+primitives along with the RAM, screen, and controller buffers the environment
+reads and writes. A backend passed to the environment also provides `clone()`,
+a new backend of the same source for `env.clone()`.
+
+`NesPyBackend` binds the primitives to the nes-py core once, at import. Every
+nes-py release exports them, so the environment no longer probes which
+`reset()` signature, `step()` tuple, or `_did_step` convention the installed
+nes-py uses on each call. Dumping and loading the state needs a build of the
+core that exports it (see `_emulator_state`); PyPI releases of nes-py don't.
+
+`InputLogBackend` drives the same nes-py core and serializes its state on any
+build: a state is the log of controller inputs and RAM writes since the
+environment's start backup, and loading one restores the backup and replays
+the log. States are exact but grow with the episode, and loading costs about
+as much as emulating the logged frames. `anchor()` moves the core's native
+backup to the current state, so loading a state that extends it replays only
+the frames after it (e.g., many rollouts from one checkpoint). Each backend
+counts the frames it replays to load states in `frames_replayed`.
+
+`ReplayBackend` is a pure-Python backend that replays a recorded `ReplayTrace`
+of RAM (and optionally screens). It ignores the controllers, so the
+environment logic built on top of the emulator (rewards, termination,
+truncation, respawn and checkpoint bookkeeping) can be unit-tested and
+benchmarked without a ROM running.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+import hashlib
+import struct
+
+import numpy as np
+from nes_py.nes_env import _LIB
+
+from . import _emulator_state
+
+
+class NesPyBackend:
+    """The nes-py emulator core of a `NESEnv`."""
+
+    # the core powers on to the title screen that the environment skips
+    boots_to_title_screen = True
+
+    # the frames emulated to load states; a native state loads without any
+    frames_replayed = 0
+
+    # whether loading a state emulates its frames again
+    replays_states = False
+
+    def __init__(self, env):
+        """
+        Initialize a backend for the core of an initialized `NESEnv`.
+
+        Args:
+            env (NESEnv): the environment that owns the core
+
+        Returns:
+            None
+
+        """
+        # the handle of the core (named like `NESEnv._env` for _emulator_state)
+        self._env = env._env
+        self.ram = env.ram
+        self.screen = env.screen
+        self.controllers = env.controllers
+
+    @property
+    def supports_state(self):
+        """Return True if the core can dump and load its complete state."""
+        return _emulator_state.is_supported()
+
+    def step(self):
+        """Emulate a frame with the current controller buffers."""
+        _LIB.Step(self._env)
+
+    def reset(self):
+        """Hard reset the emulator."""
+        _LIB.Reset(self._env)
+
+    def backup(self):
+        """Save the state to the backup slot."""
+        _LIB.Backup(self._env)
+
+    def restore(self):
+        """Restore the state from the backup slot."""
+        _LIB.Restore(self._env)
+
+    def state_size(self):
+        """Return the size in bytes of the emulator state (None if it varies)."""
+        return _emulator_state.state_size(self)
+
+    def dump_state(self, out=None):
+        """Return the complete emulator state as opaque bytes (or into `out`)."""
+        return _emulator_state.dump_state(self, out)
+
+    def load_state(self, state):
+        """Restore the complete emulator state from `dump_state` bytes."""
+        _emulator_state.load_state(self, state)
+
+    def anchor(self):
+        """Do nothing; native states load in constant time from anywhere."""
+
+    def close(self):
+        """Free the core."""
+        _LIB.Close(self._env)
+        self._env = None
+
+
+class InputLogBackend(NesPyBackend):
+    """A nes-py core whose states are logs of its inputs since a backup."""
+
+    # a state replays its log onto the core, which works on any nes-py build
+    supports_state = True
+    replays_states = True
+
+    # the state header: magic, version, fingerprint of the anchor (0 before
+    # the first backup), and the frames and RAM writes of the prefix and log
+    _HEADER = struct.Struct('<4sHQIIII')
+    _MAGIC = b'SMBL'
+    _VERSION = 1
+
+    # a RAM write the environment made before a logged frame; writes after the
+    # last frame of a log have the frame number of the next one
+    _WRITE = np.dtype([('frame', '<u4'), ('address', '<u2'), ('value', 'u1')])
+
+    def __init__(self, env):
+        """
+        Initialize a backend for the core of an initialized `NESEnv`.
+
+        The first `backup` anchors the log. Its native backup holds the start
+        state, and the prefix (the log from the power cycle before it) goes
+        into every state, so a state also loads into a core that has never
+        been backed up (e.g., of a clone or an unpickled environment) by
+        replaying the prefix first.
+
+        Args:
+            env (NESEnv): the environment that owns the core
+
+        Returns:
+            None
+
+        """
+        super().__init__(env)
+        # the fingerprint of the anchor state and the prefix that reaches it
+        self._anchor = 0
+        self._prefix = b'', b''
+        # the log since the anchor (or since the power cycle before it)
+        self._inputs = bytearray()
+        self._writes = bytearray()
+        # the RAM after the last logged frame, to find the environment's writes
+        self._shadow = np.zeros_like(self.ram)
+        # the log at the last backup after the anchor (None for the anchor)
+        self._backup_log = None
+        # the log up to the state in the native backup slot and the RAM after
+        # its last frame (None while the slot holds the anchor)
+        self._native = None
+        self.frames_replayed = 0
+
+    def _pending_writes(self):
+        """Return the RAM writes since the last frame as log bytes."""
+        changed = np.flatnonzero(self.ram != self._shadow)
+        if not len(changed):
+            return b''
+        writes = np.empty(len(changed), dtype=self._WRITE)
+        writes['frame'] = len(self._inputs) // 2
+        writes['address'] = changed
+        writes['value'] = self.ram[changed]
+        return writes.tobytes()
+
+    def _clear_log(self):
+        """Start an empty log at the current state."""
+        self._inputs.clear()
+        self._writes.clear()
+        self._shadow[:] = self.ram
+
+    def _log(self):
+        """Return the log (with the pending RAM writes) as bytes."""
+        return bytes(self._inputs), bytes(self._writes) + self._pending_writes()
+
+    def _fingerprint(self):
+        """Return a nonzero 64-bit hash of the RAM and the screen."""
+        digest = hashlib.blake2b(self.ram.tobytes(), digest_size=8)
+        digest.update(self.screen.tobytes())
+        return int.from_bytes(digest.digest(), 'little') or 1
+
+    def _replay(self, inputs, writes, first_frame=0):
+        """Replay a log from one of its frames onto the core, logging it again."""
+        frames = np.frombuffer(inputs, dtype=np.uint8).reshape(-1, 2)[first_frame:]
+        writes = np.frombuffer(writes, dtype=self._WRITE)
+        if first_frame:
+            writes = writes[np.searchsorted(writes['frame'], first_frame):].copy()
+            writes['frame'] -= first_frame
+        self.frames_replayed += len(frames)
+        # the first write of each frame and of the writes after the last one
+        starts = np.searchsorted(writes['frame'], np.arange(len(frames) + 1)).tolist()
+        starts.append(len(writes))
+        for frame, (first, second) in enumerate(frames.tolist()):
+            if starts[frame] < starts[frame + 1]:
+                frame_writes = writes[starts[frame]:starts[frame + 1]]
+                self.ram[frame_writes['address']] = frame_writes['value']
+            self.controllers[0][0] = first
+            self.controllers[1][0] = second
+            self.step()
+        trailing = writes[starts[-2]:]
+        self.ram[trailing['address']] = trailing['value']
+
+    def step(self):
+        """Emulate a frame with the current controller buffers and log it."""
+        self._writes += self._pending_writes()
+        self._inputs += bytes((int(self.controllers[0][0]), int(self.controllers[1][0])))
+        _LIB.Step(self._env)
+        self._shadow[:] = self.ram
+
+    def reset(self):
+        """Power cycle the emulator: a hard reset with the RAM cleared."""
+        _LIB.Reset(self._env)
+        # a hard reset keeps the RAM, clear it so the log replays on any core
+        self.ram[:] = 0
+        self._anchor = 0
+        self._prefix = b'', b''
+        self._backup_log = None
+        self._native = None
+        self._clear_log()
+
+    def backup(self):
+        """Save the state to the backup slot, anchoring the log at the first."""
+        if self._anchor:
+            self._backup_log = self._log()
+            return
+        self._prefix = self._log()
+        _LIB.Backup(self._env)
+        self._anchor = self._fingerprint()
+        self._backup_log = None
+        self._clear_log()
+
+    def restore(self):
+        """Restore the state from the backup slot."""
+        self._load_log(*(self._backup_log or (b'', b'')))
+
+    def anchor(self):
+        """
+        Move the native backup slot to the current state.
+
+        Loading a state (or restoring the backup) whose log extends the
+        current one then replays only the frames after it. Loading any other
+        state first replays the prefix from a power cycle to get back to the
+        anchor, which costs about as much as the start screen.
+
+        Returns:
+            None
+
+        """
+        if not self._anchor:
+            return
+        # the pending RAM writes go into the slot, so keep the RAM before them
+        self._native = bytes(self._inputs), bytes(self._writes), self._shadow.copy()
+        _LIB.Backup(self._env)
+
+    def _extends_native(self, inputs, writes):
+        """Return whether a log since the anchor extends the native backup."""
+        native_inputs, native_writes, _ = self._native
+        if bytes(inputs[:len(native_inputs)]) != native_inputs:
+            return False
+        writes = np.frombuffer(writes, dtype=self._WRITE)
+        frames = len(native_inputs) // 2
+        return writes[:np.searchsorted(writes['frame'], frames)].tobytes() == native_writes
+
+    def _load_log(self, inputs, writes):
+        """Restore the state at the end of a log since the anchor."""
+        if self._native is not None and not self._extends_native(inputs, writes):
+            # the log branches off before the native backup, so get back to
+            # the anchor by replaying the prefix from a power cycle
+            _LIB.Reset(self._env)
+            self.ram[:] = 0
+            self._clear_log()
+            self._replay(*self._prefix)
+            _LIB.Backup(self._env)
+            self._native = None
+        _LIB.Restore(self._env)
+        if self._native is None:
+            self._clear_log()
+            self._replay(inputs, writes)
+            return
+        # continue the log of the native backup from the RAM after its frames
+        native_inputs, native_writes, native_ram = self._native
+        self.ram[:] = native_ram
+        self._inputs[:] = native_inputs
+        self._writes[:] = native_writes
+        self._shadow[:] = native_ram
+        self._replay(inputs, writes, len(native_inputs) // 2)
+
+    def state_size(self):
+        """Return None; the size of a state grows with its log."""
+        return None
+
+    def dump_state(self, out=None):
+        """Return the prefix and the log as bytes."""
+        if out is not None:
+            raise ValueError('InputLogBackend states vary in size and cannot be dumped into a buffer')
+        if self._anchor:
+            prefix, log = self._prefix, self._log()
+        else:
+            prefix, log = self._log(), (b'', b'')
+        header = self._HEADER.pack(
+            self._MAGIC,
+            self._VERSION,
+            self._anchor,
+            len(prefix[0]) // 2,
+            len(prefix[1]) // self._WRITE.itemsize,
+            len(log[0]) // 2,
+            len(log[1]) // self._WRITE.itemsize,
+        )
+        return b''.join((header, *prefix, *log))
+
+    @classmethod
+    def is_log_state(cls, state):
+        """Return whether state bytes were dumped by an InputLogBackend."""
+        return bytes(memoryview(state).cast('B')[:len(cls._MAGIC)]) == cls._MAGIC
+
+    def load_state(self, state):
+        """
+        Restore a state from `dump_state` bytes by replaying its log.
+
+        A core anchored at the state's anchor restores its native backup and
+        replays the rest of the log (see `anchor`). A core that isn't
+        anchored yet replays the prefix from a power cycle first and anchors
+        there.
+
+        Args:
+            state (bytes): the state to load
+
+        Returns:
+            None
+
+        """
+        state = memoryview(state).cast('B')
+        if len(state) < self._HEADER.size:
+            raise ValueError('state was not dumped by an InputLogBackend')
+        magic, version, anchor, *counts = self._HEADER.unpack_from(state)
+        if magic != self._MAGIC or version != self._VERSION:
+            raise ValueError('state was not dumped by an InputLogBackend')
+        sizes = [count * size for count, size in zip(counts, (2, self._WRITE.itemsize) * 2)]
+        if len(state) != self._HEADER.size + sum(sizes):
+            raise ValueError('state is truncated')
+        offsets = np.cumsum([self._HEADER.size, *sizes]).tolist()
+        prefix_inputs, prefix_writes, inputs, writes = (
+            state[begin:end] for begin, end in zip(offsets, offsets[1:])
+        )
+        if anchor and anchor == self._anchor:
+            self._load_log(inputs, writes)
+            return
+        if self._anchor:
+            raise ValueError('state was dumped from another start state than this core')
+        self.reset()
+        self._replay(prefix_inputs, prefix_writes)
+        if not anchor:
+            return
+        self.backup()
+        if self._anchor != anchor:
+            raise ValueError('state replayed to another start state (e.g., of another ROM)')
+        self._replay(inputs, writes)
+
+
+@dataclass(frozen=True)
+class ReplayTrace:
+    """RAM (and optionally screens) of consecutive emulated frames."""
+
+    # the RAM after each frame, shape (frames, 2048)
+    ram: np.ndarray
+    # the screen after each frame, shape (frames, 240, 256, 3), or None
+    screen: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.ram)
+
+    @classmethod
+    def record(cls, env, actions, screen=True):
+        """
+        Record the frames of an episode played by a `SuperMarioBrosEnv`.
+
+        The trace starts at the state after `env.reset()` and holds every
+        frame the emulator runs, including the ones the environment skips.
+        The recording stops early when the episode ends. Record with
+        `fast_respawn` disabled; a restored respawn is not a frame.
+
+        Args:
+            env (SuperMarioBrosEnv): the (unwrapped) environment to play
+            actions (iterable): the actions to step with
+            screen (bool): whether to record the screens too
+
+        Returns:
+            a new ReplayTrace
+
+        """
+        env.reset()
+        frames = _RecordingBackend(env._backend, screen)
+        env._backend = frames
+        try:
+            for action in actions:
+                _, _, terminated, truncated, _ = env.step(action)
+                if terminated or truncated:
+                    break
+        finally:
+            env._backend = frames.backend
+        screens = np.stack(frames.screens) if screen else None
+        return cls(ram=np.stack(frames.ram), screen=screens)
+
+    def save(self, path):
+        """Save the trace to a compressed .npz file."""
+        arrays = dict(ram=self.ram)
+        if self.screen is not None:
+            arrays['screen'] = self.screen
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Load a trace saved with `save`."""
+        with np.load(path) as arrays:
+            screen = arrays['screen'] if 'screen' in arrays else None
+            return cls(ram=arrays['ram'], screen=screen)
+
+
+class _RecordingBackend:
+    """A backend that records the frames another backend emulates."""
+
+    def __init__(self, backend, screen):
+        self.backend = backend
+        self.ram = [backend.ram.copy()]
+        self.screens = [backend.screen.copy()] if screen else None
+
+    def step(self):
+        self.backend.step()
+        self.ram.append(self.backend.ram.copy())
+        if self.screens is not None:
+            self.screens.append(self.backend.screen.copy())
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+class ReplayBackend:
+    """A pure-Python backend that replays a `ReplayTrace`."""
+
+    # a trace starts in game, after the start screen
+    boots_to_title_screen = False
+
+    # the state is a frame index and the RAM
+    supports_state = True
+
+    # a state loads without emulating any frames
+    frames_replayed = 0
+    replays_states = False
+
+    # the state header holding the frame index
+    _HEADER = struct.Struct('<q')
+
+    def __init__(self, trace):
+        """
+        Initialize a backend that replays a trace.
+
+        Args:
+            trace (ReplayTrace): the frames to replay. `step` advances to the
+                next frame and wraps around to the first one at the end
+
+        Returns:
+            None
+
+        """
+        if len(trace) == 0:
+            raise ValueError('trace must hold at least one frame')
+        self.trace = trace
+        self.ram = np.zeros(trace.ram.shape[1], dtype=np.uint8)
+        self.screen = np.zeros((240, 256, 3), dtype=np.uint8)
+        self.controllers = [np.zeros(1, dtype=np.uint8) for _ in range(2)]
+        self.frame = 0
+        self._backup = None
+        self._load_frame(0)
+
+    def _load_frame(self, frame):
+        """Set the buffers to a frame of the trace."""
+        self.frame = frame
+        self.ram[:] = self.trace.ram[frame]
+        if self.trace.screen is not None:
+            self.screen[:] = self.trace.screen[frame]
+
+    def step(self):
+        """Advance to the next frame of the trace."""
+        self._load_frame((self.frame + 1) % len(self.trace))
+
+    def reset(self):
+        """Rewind to the first frame of the trace."""
+        self._load_frame(0)
+
+    def backup(self):
+        """Save the state to the backup slot."""
+        self._backup = self.dump_state()
+
+    def restore(self):
+        """Restore the state from the backup slot."""
+        self.load_state(self._backup)
+
+    def state_size(self):
+        """Return the size in bytes of the state."""
+        return self._HEADER.size + len(self.ram)
+
+    def dump_state(self, out=None):
+        """Return the frame index and the RAM as bytes (or into `out`)."""
+        if out is None:
+            return self._HEADER.pack(self.frame) + self.ram.tobytes()
+        if out.nbytes != self.state_size():
+            raise ValueError('state buffer does not match this trace')
+        self._HEADER.pack_into(out, 0, self.frame)
+        out[self._HEADER.size:] = self.ram
+        return out
+
+    def load_state(self, state):
+        """Restore the frame index and the RAM from `dump_state` bytes."""
+        if len(state) != self.state_size():
+            raise ValueError('state incompatible with this trace')
+        self._load_frame(self._HEADER.unpack_from(state)[0])
+        self.ram[:] = np.frombuffer(state, dtype=np.uint8, offset=self._HEADER.size)
+
+    def anchor(self):
+        """Do nothing; a replay loads states in constant time from anywhere."""
+
+    def clone(self):
+        """Return a new backend replaying the same trace (for `env.clone`)."""
+        return ReplayBackend(self.trace)
+
+    def close(self):
+        """Release nothing; a replay holds no native resources."""
+
+
+__all__ = [
+    InputLogBackend.__name__,
+    NesPyBackend.__name__,
+    ReplayBackend.__name__,
+    ReplayTrace.__name__,
+]
@@ -0,0 +1,318 @@
+"""A Go-Explore style archive of the best checkpoint per cell of the game.
+
+Exploration algorithms like Go-Explore group states into coarse cells, keep
+the best-scoring state of each cell, and restart exploration from cells
+sampled from the archive. `cell_keys` packs a cell into one int64 from the
+RAM. The cell is the world, stage, x bucket, y bucket, and player status,
+and many RAM snapshots are keyed in one vectorized call. `CellArchive` keeps
+two dictionaries keyed by cell: an index of the score and the visit and
+restart counts, and the best checkpoint. Both are looked up in O(1).
+
+`CellArchive.shared(manager)` keeps the dictionaries in a
+`multiprocessing.Manager` and guards them with its lock. The archive then
+pickles to worker processes that all update the same cells. Sampling reads
+only the index, and checkpoints cross processes only when a cell improves
+or a worker restarts from one.
+
+A cell is restored by loading its checkpoint far from where it was saved,
+so the archive only takes checkpoints of the complete emulator state. A
+buffers checkpoint only restores exactly while nes-py's backup slot holds
+its state, and environments on backends that can't serialize their state
+are rejected.
+"""
+
+from __future__ import annotations
+
+from collections import namedtuple
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from ._checkpoint import PAYLOAD_STATE
+from ._evaluation import _start_from
+
+
+# the version of the archive files written by `CellArchive.save`
+FORMAT_VERSION = 1
+
+
+# the error of an environment or checkpoint without a complete emulator state
+_NEEDS_STATE = (
+    'the archive needs checkpoints of the complete emulator state; use a '
+    'backend that can serialize its state (e.g., backend=InputLogBackend)'
+)
+
+
+# the entry of a cell in the index
+CellStats = namedtuple('CellStats', ['score', 'visits', 'chosen'])
+
+
+def cell_keys(ram, x_bucket=16, y_bucket=16):
+    """
+    Return the cell keys of RAM snapshots.
+
+    Args:
+        ram (np.ndarray): a RAM snapshot of shape (2048,) or a batch of them
+            of shape (n, 2048)
+        x_bucket (int): the width of a cell in pixels
+        y_bucket (int): the height of a cell in pixels
+
+    Returns:
+        an int64 key per snapshot (a Python int for a single snapshot) that
+        packs, from the high bits to the low ones, the world and stage, the
+        x bucket, the y bucket, and the player status
+
+    """
+    ram = np.asarray(ram)
+    single = ram.ndim == 1
+    ram = np.atleast_2d(ram).astype(np.int64)
+    level = ram[:, 0x075f] * 8 + ram[:, 0x075c]
+    x = ram[:, 0x006d] * 0x100 + ram[:, 0x0086]
+    # the y position as computed by `SuperMarioBrosEnv._y_position`
+    y_pixel = ram[:, 0x03b8]
+    y = np.where(ram[:, 0x00b5] < 1, 255 + (255 - y_pixel), 255 - y_pixel)
+    keys = (level << 40) | ((x // x_bucket) << 24) | ((y // y_bucket) << 8) | ram[:, 0x0756]
+    return int(keys[0]) if single else keys
+
+
+def decode_cell(key, x_bucket=16, y_bucket=16):
+    """
+    Return the parts of a cell key.
+
+    Args:
+        key (int): a key from `cell_keys`
+        x_bucket (int): the width of a cell in pixels
+        y_bucket (int): the height of a cell in pixels
+
+    Returns:
+        a tuple of the world, stage, x position, y position (the lower bounds
+        of the cell), and player status
+
+    """
+    key = int(key)
+    level = key >> 40
+    return (
+        level // 8 + 1,
+        level % 8 + 1,
+        ((key >> 24) & 0xFFFF) * x_bucket,
+        ((key >> 8) & 0xFFFF) * y_bucket,
+        key & 0xFF,
+    )
+
+
+class CellArchive:
+    """The best-scoring checkpoint of each cell visited by exploration."""
+
+    def __init__(self, x_bucket=16, y_bucket=16, index=None, checkpoints=None, lock=None):
+        """
+        Initialize an empty cell archive (see `shared` to share one).
+
+        Args:
+            x_bucket (int): the width of a cell in pixels
+            y_bucket (int): the height of a cell in pixels
+            index (MutableMapping): the mapping of cells to `CellStats`, or
+                None for a new dictionary
+            checkpoints (MutableMapping): the mapping of cells to their best
+                checkpoints, or None for a new dictionary
+            lock: the lock that guards the mappings, or None for a new
+                thread lock
+
+        Returns:
+            None
+
+        """
+        self.x_bucket = x_bucket
+        self.y_bucket = y_bucket
+        self._index = {} if index is None else index
+        self._checkpoints = {} if checkpoints is None else checkpoints
+        self._lock = threading.Lock() if lock is None else lock
+
+    @classmethod
+    def shared(cls, manager, x_bucket=16, y_bucket=16):
+        """
+        Return an empty archive that worker processes can share.
+
+        Args:
+            manager (multiprocessing.managers.SyncManager): a started manager
+                to keep the index and checkpoints in
+            x_bucket (int): the width of a cell in pixels
+            y_bucket (int): the height of a cell in pixels
+
+        Returns:
+            a CellArchive that can be pickled to worker processes
+
+        """
+        return cls(x_bucket, y_bucket, manager.dict(), manager.dict(), manager.Lock())
+
+    def __len__(self):
+        """Return the number of cells in the archive."""
+        return len(self._index)
+
+    def __contains__(self, cell):
+        """Return True if the archive holds a cell."""
+        return cell in self._index
+
+    def stats(self, cell):
+        """Return the `CellStats` of a cell."""
+        return self._index[cell]
+
+    def checkpoint(self, cell):
+        """Return the best checkpoint of a cell."""
+        return self._checkpoints[cell]
+
+    def cell(self, env):
+        """Return the cell key of the current state of an environment."""
+        return cell_keys(env.unwrapped.ram, self.x_bucket, self.y_bucket)
+
+    def update(self, env, score):
+        """
+        Count a visit to the cell of an environment and keep its best state.
+
+        Args:
+            env (gym.Env): the (possibly wrapped) SuperMarioBrosEnv whose
+                current state is in the cell
+            score (float): the score of the current state (e.g., the return
+                of the trajectory so far); the highest is kept per cell
+
+        Returns:
+            the cell key and True if the state is the new best of the cell
+
+        Raises:
+            ValueError: if the backend of the environment can't serialize its
+                state
+
+        """
+        if not env.unwrapped._backend.supports_state:
+            raise ValueError(_NEEDS_STATE)
+        cell = self.cell(env)
+        stats = self._index.get(cell)
+        checkpoint = None
+        # save outside the lock and only when the cell is likely to improve
+        if stats is None or score > stats.score:
+            checkpoint = env.unwrapped.save_checkpoint()
+        with self._lock:
+            stats = self._index.get(cell)
+            if checkpoint is None or (stats is not None and score <= stats.score):
+                self._index[cell] = stats._replace(visits=stats.visits + 1)
+                return cell, False
+            visits, chosen = (0, 0) if stats is None else (stats.visits, stats.chosen)
+            self._checkpoints[cell] = checkpoint
+            self._index[cell] = CellStats(score, visits + 1, chosen)
+        return cell, True
+
+    def sample(self, n=1, rng=None, weight=None):
+        """
+        Return cells sampled by weight to restart exploration from.
+
+        Args:
+            n (int): the number of cells to sample (with replacement)
+            rng (np.random.Generator): the random generator, or None for a
+                new unseeded one
+            weight (callable): a function of a cell's `CellStats` that
+                returns its weight, or None to weigh cells by
+                1 / sqrt(chosen + 1) like Go-Explore
+
+        Returns:
+            a list of n cell keys
+
+        """
+        index = dict(self._index)
+        if not index:
+            raise ValueError('cannot sample from an empty archive')
+        rng = np.random.default_rng() if rng is None else rng
+        cells = list(index)
+        if weight is None:
+            chosen = np.fromiter((stats.chosen for stats in index.values()), dtype=np.float64, count=len(index))
+            weights = 1 / np.sqrt(chosen + 1)
+        else:
+            weights = np.array([weight(stats) for stats in index.values()], dtype=np.float64)
+        picks = rng.choice(len(cells), size=n, p=weights / weights.sum())
+        return [cells[pick] for pick in picks]
+
+    def restore(self, env, cell):
+        """
+        Restore an environment to the best state of a cell.
+
+        The environment starts a new episode from the state (the truncation
+        budgets restart), and the cell's restart count goes up by one.
+
+        Args:
+            env (gym.Env): the (possibly wrapped) SuperMarioBrosEnv to restore
+            cell (int): the key of the cell to restore
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: if the checkpoint of the cell isn't a complete
+                emulator state
+
+        """
+        checkpoint = self._checkpoints[cell]
+        if checkpoint.payload_format != PAYLOAD_STATE:
+            raise ValueError(_NEEDS_STATE)
+        with self._lock:
+            stats = self._index[cell]
+            self._index[cell] = stats._replace(chosen=stats.chosen + 1)
+        _start_from(env.unwrapped, checkpoint)
+
+    def save(self, path):
+        """
+        Atomically write the archive to a file.
+
+        Args:
+            path (str): the path of the file to write
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            state = dict(
+                format=FORMAT_VERSION,
+                x_bucket=self.x_bucket,
+                y_bucket=self.y_bucket,
+                index=dict(self._index),
+                checkpoints=dict(self._checkpoints),
+            )
+        path = os.fspath(path)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, manager=None):
+        """
+        Read an archive written by `save`.
+
+        Args:
+            path (str): the path of the file to read
+            manager (multiprocessing.managers.SyncManager): a manager to
+                share the loaded archive with (see `shared`), or None
+
+        Returns:
+            a new CellArchive
+
+        """
+        with open(path, 'rb') as file:
+            state = pickle.load(file)
+        if state.get('format') != FORMAT_VERSION:
+            raise ValueError('unsupported cell archive format {!r}'.format(state.get('format')))
+        if manager is None:
+            archive = cls(state['x_bucket'], state['y_bucket'])
+        else:
+            archive = cls.shared(manager, state['x_bucket'], state['y_bucket'])
+        archive._index.update(state['index'])
+        archive._checkpoints.update(state['checkpoints'])
+        return archive
+
+
+__all__ = [
+    CellArchive.__name__,
+    CellStats.__name__,
+    cell_keys.__name__,
+    decode_cell.__name__,
+]
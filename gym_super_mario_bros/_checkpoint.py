@@ -4,6 +4,16 @@ nes-py exposes a single internal backup slot via `NESEnv._backup()`/
 `NESEnv._restore()`. This module builds an *arbitrary* multi-checkpoint API by
 copying emulator snapshots into temporary emulator instances.
 
+When the emulator backend can serialize its complete state, checkpoints hold
+that state instead (`PAYLOAD_STATE`). They are a fraction of the size, since
+the screen is re-rendered from the state, and restore exactly without touching
+the backup slot.
+
+A checkpoint saved with a `base` holds a delta against that checkpoint (see
+`_checkpoint_delta`) and keeps a reference to it. `full_payload()` resolves
+the chain back to its keyframe. A chain is at most `MAX_DELTA_CHAIN` deltas
+long; past that, `save_checkpoint` stores a keyframe instead.
+
 The checkpoint payload is intentionally opaque. It may not be portable across
 nes-py versions.
 """
@@ -13,6 +23,22 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Optional
 
+from ._checkpoint_delta import apply_deltas
+
+
+# the payload holds the RAM, screen, and controller buffers, which are loaded
+# on top of the backup slot
+PAYLOAD_BUFFERS = 'buffers'
+
+
+# the payload holds the complete serialized emulator state (CPU, PPU, mapper,
+# and RAM) of a backend that supports it
+PAYLOAD_STATE = 'state'
+
+
+# the default number of deltas between keyframes of a checkpoint chain
+MAX_DELTA_CHAIN = 16
+
 
 @dataclass(frozen=True)
 class SmbCheckpoint:
@@ -31,3 +57,34 @@ class SmbCheckpoint:
 
     # Snapshot bytes (implementation detail).
     _payload: bytes
+
+    # How `_payload` is encoded (`PAYLOAD_BUFFERS` or `PAYLOAD_STATE`).
+    payload_format: str = PAYLOAD_BUFFERS
+
+    # The checkpoint `_payload` is a delta against, or None for a keyframe.
+    base: Optional['SmbCheckpoint'] = None
+
+    # SHA-256 of the ROM contents (see `_roms.rom_registry`), or '' for a
+    # checkpoint saved before the hash was recorded (loaded unchecked).
+    rom_hash: str = ''
+
+    @property
+    def chain_length(self) -> int:
+        """Return the number of deltas between this checkpoint and its keyframe."""
+        length = 0
+        checkpoint = self.base
+        while checkpoint is not None:
+            length += 1
+            checkpoint = checkpoint.base
+        return length
+
+    def full_payload(self) -> bytes:
+        """Return the payload with the deltas of the chain resolved."""
+        if self.base is None:
+            return self._payload
+        deltas = []
+        checkpoint = self
+        while checkpoint.base is not None:
+            deltas.append(checkpoint._payload)
+            checkpoint = checkpoint.base
+        return apply_deltas(checkpoint._payload, reversed(deltas))
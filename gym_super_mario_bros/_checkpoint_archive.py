@@ -0,0 +1,345 @@
+"""A compressed, append-only archive file of `SmbCheckpoint`s.
+
+Layout of an archive (all integers little-endian):
+
+- header: the magic `SMBCKARC`, the format version (u16), the codec (u8), a
+  pad byte, the size of the metadata (u32), and the metadata as JSON: the ROM
+  SHA-256 and the nes-py and gym-super-mario-bros versions that wrote it
+- records, appended one per `put`: the marker `R`, the size of the key (u16),
+  the size of the data (u32), the CRC-32 of the data (u32), the UTF-8 key,
+  and the data: the checkpoint compressed on its own with the codec
+- index, written by `close`: the marker `I`, the number of entries (u32), and
+  per entry the offset of its record (u64), followed by the offset of the
+  index (u64) and the magic `SMBINDEX`
+
+Readers memory-map the file and decompress only the entries they read. An
+archive that wasn't closed (e.g., a crashed writer) has no index; opening it
+scans the record headers instead, and appending drops a torn last record.
+Putting a key again shadows the earlier entry.
+"""
+
+from __future__ import annotations
+
+import json
+import lzma
+import mmap
+import os
+import struct
+import zlib
+
+from . import _state_cache
+from ._checkpoint import SmbCheckpoint
+
+
+# the version of the archive format
+FORMAT_VERSION = 1
+
+
+# the magic bytes at the start of an archive and the end of its index
+_MAGIC = b'SMBCKARC'
+_INDEX_MAGIC = b'SMBINDEX'
+
+
+# the structure of the header after the magic
+_HEADER = struct.Struct('<HBxI')
+
+
+# the structure of a record header after its marker
+_RECORD = struct.Struct('<HII')
+
+
+# the structure of an index entry and the index trailer
+_INDEX_ENTRY = struct.Struct('<Q')
+_INDEX_COUNT = struct.Struct('<I')
+_TRAILER = struct.Struct('<Q8s')
+
+
+# the compression codecs by name and by their identifier in the header
+_CODECS = {
+    'zlib': (1, zlib.compress, zlib.decompress),
+    'lzma': (2, lzma.compress, lzma.decompress),
+}
+_CODEC_NAMES = {codec_id: name for name, (codec_id, _, _) in _CODECS.items()}
+
+
+# the structure of a checkpoint's metadata size before its JSON and payload
+_ENTRY = struct.Struct('<I')
+
+
+def _encode(checkpoint):
+    """Return a checkpoint as uncompressed bytes (resolving any delta)."""
+    meta = json.dumps(dict(
+        rom_path=checkpoint.rom_path,
+        rom_hash=checkpoint.rom_hash,
+        target=[checkpoint.target_world, checkpoint.target_stage, checkpoint.target_area],
+        time_last=checkpoint.time_last,
+        x_position_last=checkpoint.x_position_last,
+        payload_format=checkpoint.payload_format,
+    )).encode()
+    return _ENTRY.pack(len(meta)) + meta + checkpoint.full_payload()
+
+
+def _decode(data):
+    """Return a checkpoint from bytes made by `_encode`."""
+    size, = _ENTRY.unpack_from(data)
+    meta = json.loads(data[_ENTRY.size:_ENTRY.size + size])
+    world, stage, area = meta['target']
+    return SmbCheckpoint(
+        rom_path=meta['rom_path'],
+        rom_hash=meta['rom_hash'],
+        target_world=world,
+        target_stage=stage,
+        target_area=area,
+        time_last=meta['time_last'],
+        x_position_last=meta['x_position_last'],
+        _payload=bytes(data[_ENTRY.size + size:]),
+        payload_format=meta['payload_format'],
+    )
+
+
+class CheckpointArchive:
+    """A compressed, append-only archive file of checkpoints keyed by string."""
+
+    def __init__(self, path, mode='r', rom_hash=None, codec='zlib', sync_every=64):
+        """
+        Open a checkpoint archive.
+
+        Args:
+            path (str): the path of the archive file
+            mode (str): 'r' to read, 'a' to read and append (creating the
+                archive if it doesn't exist)
+            rom_hash (str): the SHA-256 of the ROM of the checkpoints. Required
+                to create an archive; must match an existing one otherwise
+            codec (str): the compression of new archives, 'zlib' or 'lzma'
+            sync_every (int): the number of `put`s to batch per fsync
+
+        Returns:
+            None
+
+        """
+        if mode not in ('r', 'a'):
+            raise ValueError("mode must be 'r' or 'a', got {!r}".format(mode))
+        if codec not in _CODECS:
+            raise ValueError('codec must be one of {}, got {!r}'.format(sorted(_CODECS), codec))
+        self.path = os.fspath(path)
+        self.mode = mode
+        self.sync_every = sync_every
+        self._index = {}
+        self._unsynced = 0
+        self._map = None
+        self._file = None
+        if mode == 'a' and not os.path.exists(self.path):
+            if rom_hash is None:
+                raise ValueError('rom_hash is required to create an archive')
+            self._create(rom_hash, codec)
+        self._file = open(self.path, 'r+b' if mode == 'a' else 'rb')
+        self._read_header()
+        if rom_hash is not None and rom_hash != self.metadata['rom_hash']:
+            raise ValueError('archive holds checkpoints of a different ROM')
+        self._read_index()
+
+    def _create(self, rom_hash, codec):
+        """Write the header of a new archive."""
+        metadata = json.dumps(dict(
+            rom_hash=rom_hash,
+            nes_py=_state_cache._version('nes-py'),
+            gym_super_mario_bros=_state_cache._version('gym-super-mario-bros'),
+        )).encode()
+        with open(self.path, 'xb') as file:
+            file.write(_MAGIC + _HEADER.pack(FORMAT_VERSION, _CODECS[codec][0], len(metadata)) + metadata)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _view(self, size=None):
+        """Return a memory map of the file covering at least `size` bytes."""
+        if self._map is None or (size is not None and len(self._map) < size):
+            if self._map is not None:
+                self._map.close()
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _read_header(self):
+        """Read the format, codec, and metadata from the header."""
+        view = self._view()
+        if view[:len(_MAGIC)] != _MAGIC:
+            raise ValueError('{} is not a checkpoint archive'.format(self.path))
+        version, codec_id, size = _HEADER.unpack_from(view, len(_MAGIC))
+        if version != FORMAT_VERSION:
+            raise ValueError('unsupported checkpoint archive version {}'.format(version))
+        if codec_id not in _CODEC_NAMES:
+            raise ValueError('unsupported checkpoint archive codec {}'.format(codec_id))
+        start = len(_MAGIC) + _HEADER.size
+        self.metadata = json.loads(view[start:start + size])
+        self.codec = _CODEC_NAMES[codec_id]
+        _, self._compress, self._decompress = _CODECS[self.codec]
+        self._records_start = start + size
+
+    def _read_index(self):
+        """Read the index, or rebuild it from the records if there is none."""
+        view = self._view()
+        self._records_end = self._read_footer(view)
+        if self._records_end is None:
+            self._records_end = self._scan(view)
+        # appending continues after the last complete record
+        if self.mode == 'a':
+            self._map.close()
+            self._map = None
+            self._file.truncate(self._records_end)
+            self._file.seek(self._records_end)
+
+    def _read_footer(self, view):
+        """Index the records from the index and return its offset (or None)."""
+        if len(view) - self._records_start < _TRAILER.size:
+            return None
+        offset, magic = _TRAILER.unpack_from(view, len(view) - _TRAILER.size)
+        if magic != _INDEX_MAGIC or view[offset:offset + 1] != b'I':
+            return None
+        count, = _INDEX_COUNT.unpack_from(view, offset + 1)
+        position = offset + 1 + _INDEX_COUNT.size
+        for _ in range(count):
+            record, = _INDEX_ENTRY.unpack_from(view, position)
+            position += _INDEX_ENTRY.size
+            self._index[self._record_key(view, record)] = record
+        return offset
+
+    def _scan(self, view):
+        """Index the complete records and return the offset after them."""
+        position = self._records_start
+        while view[position:position + 1] == b'R':
+            if position + 1 + _RECORD.size > len(view):
+                break
+            key_size, data_size, _ = _RECORD.unpack_from(view, position + 1)
+            end = position + 1 + _RECORD.size + key_size + data_size
+            if end > len(view):
+                break
+            self._index[self._record_key(view, position)] = position
+            position = end
+        return position
+
+    @staticmethod
+    def _record_key(view, record):
+        """Return the key of the record at an offset."""
+        key_size, _, _ = _RECORD.unpack_from(view, record + 1)
+        start = record + 1 + _RECORD.size
+        return bytes(view[start:start + key_size]).decode()
+
+    def __len__(self):
+        """Return the number of keys in the archive."""
+        return len(self._index)
+
+    def __contains__(self, key):
+        """Return True if the archive holds a checkpoint for a key."""
+        return key in self._index
+
+    def __iter__(self):
+        """Iterate over the keys in the order they were first put."""
+        return iter(self._index)
+
+    def keys(self):
+        """Return the keys of the archive."""
+        return self._index.keys()
+
+    def get(self, key):
+        """
+        Return the checkpoint of a key.
+
+        Args:
+            key (str): the key of the checkpoint
+
+        Returns:
+            the SmbCheckpoint put with the key (the latest one)
+
+        """
+        record = self._index[key]
+        view = self._view(record + 1 + _RECORD.size)
+        key_size, data_size, crc = _RECORD.unpack_from(view, record + 1)
+        start = record + 1 + _RECORD.size + key_size
+        view = self._view(start + data_size)
+        data = view[start:start + data_size]
+        if zlib.crc32(data) != crc:
+            raise ValueError('checkpoint {!r} is corrupt'.format(key))
+        return _decode(self._decompress(data))
+
+    __getitem__ = get
+
+    def put(self, key, checkpoint):
+        """
+        Append a checkpoint to the archive.
+
+        Args:
+            key (str): the key to read the checkpoint by
+            checkpoint (SmbCheckpoint): the checkpoint to append
+
+        Returns:
+            None
+
+        """
+        if self.mode != 'a':
+            raise ValueError('archive is opened read-only')
+        if not isinstance(checkpoint, SmbCheckpoint):
+            raise TypeError('checkpoint must be an SmbCheckpoint')
+        if checkpoint.rom_hash != self.metadata['rom_hash']:
+            raise ValueError('checkpoint was saved from a different ROM than the archive')
+        key_bytes = key.encode()
+        data = self._compress(_encode(checkpoint))
+        header = b'R' + _RECORD.pack(len(key_bytes), len(data), zlib.crc32(data))
+        self._file.write(header + key_bytes + data)
+        self._index[key] = self._records_end
+        self._records_end += len(header) + len(key_bytes) + len(data)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.flush()
+
+    __setitem__ = put
+
+    def flush(self):
+        """Write the appended checkpoints to disk."""
+        if self.mode != 'a' or self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def compatible_with(self, env):
+        """
+        Return True if an environment can load the archived checkpoints.
+
+        Args:
+            env (gym.Env): the (possibly wrapped) SuperMarioBrosEnv
+
+        Returns:
+            True if the ROM matches and the archive was written with the
+            running nes-py version (which the emulator states depend on)
+
+        """
+        return (
+            env.unwrapped._rom_image.sha256 == self.metadata['rom_hash']
+            and _state_cache._version('nes-py') == self.metadata['nes_py']
+        )
+
+    def close(self):
+        """Write the index (when appending) and close the archive."""
+        if self._file is None:
+            return
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self.mode == 'a':
+            index = b'I' + _INDEX_COUNT.pack(len(self._index))
+            index += b''.join(_INDEX_ENTRY.pack(record) for record in self._index.values())
+            self._file.seek(self._records_end)
+            self._file.write(index + _TRAILER.pack(self._records_end, _INDEX_MAGIC))
+            self._file.truncate()
+            self.flush()
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+__all__ = [CheckpointArchive.__name__]
@@ -0,0 +1,263 @@
+"""A shared-memory arena that passes checkpoints between processes by handle.
+
+Pickling an `SmbCheckpoint` through a queue copies its payload into the
+pipe, and again into a new bytes object on the other side. A
+`CheckpointArena` stores each payload once, in a fixed-size slot of one
+`multiprocessing.shared_memory` block, and `put` returns a small
+`CheckpointHandle` holding the checkpoint's metadata and slot. Handles
+pickle to a few hundred bytes. `SuperMarioBrosEnv.load_checkpoint` accepts
+a handle and reads the payload straight out of the slot.
+
+Each slot has a reference count. `put` returns a handle with one reference;
+`retain` adds one for every extra holder and `release` drops one. A slot is
+reclaimed when its count reaches zero. Each reuse bumps the slot's
+generation, so loading a handle to a reclaimed slot raises ValueError
+instead of reading another checkpoint.
+
+Create the arena in the coordinator and pass it to workers as a `Process`
+argument (its lock can't go through queues); pass the handles through
+queues.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+import multiprocessing
+from typing import Optional
+
+import numpy as np
+
+
+# the fields of a slot header: reference count, generation, payload size
+_HEADER_FIELDS = 3
+
+
+# the shared memory blocks this process has attached by name
+_ATTACHED = {}
+
+
+def _attach(name):
+    """Return the shared memory block of an arena, attaching it on first use."""
+    block = _ATTACHED.get(name)
+    if block is None:
+        try:
+            # the creator owns the block; don't unlink it when this process exits
+            block = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # before Python 3.13 workers register the block with the resource
+            # tracker they share with the creator, whose unlink unregisters it
+            block = shared_memory.SharedMemory(name=name)
+        _ATTACHED[name] = block
+    return block
+
+
+def _views(block, slots, slot_size):
+    """Return the slot headers and the slot payloads of an arena's block."""
+    headers = np.ndarray((slots, _HEADER_FIELDS), dtype=np.int64, buffer=block.buf)
+    data = np.ndarray((slots, slot_size), dtype=np.uint8, buffer=block.buf, offset=headers.nbytes)
+    return headers, data
+
+
+@dataclass(frozen=True)
+class CheckpointHandle:
+    """A checkpoint whose payload is in a slot of a `CheckpointArena`."""
+
+    # the name of the arena's shared memory block and its layout
+    arena: str
+    slots: int
+    slot_size: int
+    # the slot holding the payload and its generation when it was put
+    slot: int
+    generation: int
+
+    # the metadata of the `SmbCheckpoint`
+    rom_path: str
+    rom_hash: str
+    target_world: Optional[int]
+    target_stage: Optional[int]
+    target_area: Optional[int]
+    time_last: int
+    x_position_last: int
+    payload_format: str
+
+    def _header(self):
+        """Return the header of the slot, checking the generation."""
+        headers, data = _views(_attach(self.arena), self.slots, self.slot_size)
+        header = headers[self.slot]
+        if header[1] != self.generation or header[0] < 1:
+            raise ValueError('checkpoint handle refers to a reclaimed slot')
+        return header, data
+
+    def full_payload(self):
+        """Return the payload as a read-only view of the slot (no copy)."""
+        header, data = self._header()
+        view = data[self.slot, :header[2]]
+        view.flags.writeable = False
+        return view
+
+    def check(self):
+        """Raise ValueError if the slot was reclaimed (e.g., after a load)."""
+        self._header()
+
+
+class CheckpointArena:
+    """Fixed-size checkpoint slots in a shared memory block."""
+
+    def __init__(self, slots, slot_size, mp_context=None):
+        """
+        Create a new arena.
+
+        Args:
+            slots (int): the number of checkpoints the arena holds at once
+            slot_size (int): the size of a slot in bytes, at least the size of
+                the payloads to put (e.g., `len(checkpoint._payload)` of a
+                keyframe checkpoint)
+            mp_context: the multiprocessing context the workers are started
+                with, or None for the default one
+
+        Returns:
+            None
+
+        """
+        if slots < 1 or slot_size < 1:
+            raise ValueError('slots and slot_size must be at least 1')
+        size = slots * (_HEADER_FIELDS * 8 + slot_size)
+        self._block = shared_memory.SharedMemory(create=True, size=size)
+        self._owner = True
+        self.name = self._block.name
+        # handles read through the creator's mapping here and in forked workers
+        _ATTACHED[self.name] = self._block
+        self.slots = slots
+        self.slot_size = slot_size
+        self._lock = (mp_context or multiprocessing).Lock()
+        self._headers, self._data = _views(self._block, slots, slot_size)
+        self._headers[:] = 0
+        # the slot to start searching for a free one at
+        self._next = 0
+
+    def __getstate__(self):
+        return dict(name=self.name, slots=self.slots, slot_size=self.slot_size, lock=self._lock)
+
+    def __setstate__(self, state):
+        self.name = state['name']
+        self.slots = state['slots']
+        self.slot_size = state['slot_size']
+        self._lock = state['lock']
+        self._block = _attach(self.name)
+        self._owner = False
+        self._headers, self._data = _views(self._block, self.slots, self.slot_size)
+        self._next = 0
+
+    def __len__(self):
+        """Return the number of slots in use."""
+        return int(np.count_nonzero(self._headers[:, 0]))
+
+    def put(self, checkpoint):
+        """
+        Copy a checkpoint into a free slot.
+
+        Args:
+            checkpoint (SmbCheckpoint): the checkpoint to store (a delta
+                checkpoint is stored resolved)
+
+        Returns:
+            a CheckpointHandle holding one reference to the slot
+
+        """
+        payload = checkpoint.full_payload()
+        if len(payload) > self.slot_size:
+            raise ValueError('checkpoint payload is larger than the arena slots')
+        with self._lock:
+            for offset in range(self.slots):
+                slot = (self._next + offset) % self.slots
+                if self._headers[slot, 0] == 0:
+                    break
+            else:
+                raise MemoryError('checkpoint arena is full')
+            self._next = slot + 1
+            header = self._headers[slot]
+            header[1] += 1
+            header[0] = 1
+            header[2] = len(payload)
+            self._data[slot, :len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+            generation = int(header[1])
+        return CheckpointHandle(
+            arena=self.name,
+            slots=self.slots,
+            slot_size=self.slot_size,
+            slot=slot,
+            generation=generation,
+            rom_path=checkpoint.rom_path,
+            rom_hash=checkpoint.rom_hash,
+            target_world=checkpoint.target_world,
+            target_stage=checkpoint.target_stage,
+            target_area=checkpoint.target_area,
+            time_last=checkpoint.time_last,
+            x_position_last=checkpoint.x_position_last,
+            payload_format=checkpoint.payload_format,
+        )
+
+    def _checked_header(self, handle):
+        """Return the header of a handle's slot, checking it is still live."""
+        if handle.arena != self.name:
+            raise ValueError('checkpoint handle belongs to another arena')
+        header = self._headers[handle.slot]
+        if header[1] != handle.generation or header[0] < 1:
+            raise ValueError('checkpoint handle refers to a reclaimed slot')
+        return header
+
+    def retain(self, handle):
+        """Add a reference to the slot of a handle (e.g., before sharing it)."""
+        with self._lock:
+            self._checked_header(handle)[0] += 1
+
+    def release(self, handle):
+        """Drop a reference to the slot of a handle, reclaiming it at zero."""
+        with self._lock:
+            self._checked_header(handle)[0] -= 1
+
+    def refcount(self, handle):
+        """Return the number of references to the slot of a handle."""
+        with self._lock:
+            header = self._headers[handle.slot]
+            if header[1] != handle.generation:
+                return 0
+            return int(header[0])
+
+    def get(self, handle):
+        """Return a handle's checkpoint as an `SmbCheckpoint` (a copy)."""
+        from ._checkpoint import SmbCheckpoint
+        payload = bytes(handle.full_payload())
+        handle.check()
+        return SmbCheckpoint(
+            rom_path=handle.rom_path,
+            rom_hash=handle.rom_hash,
+            target_world=handle.target_world,
+            target_stage=handle.target_stage,
+            target_area=handle.target_area,
+            time_last=handle.time_last,
+            x_position_last=handle.x_position_last,
+            _payload=payload,
+            payload_format=handle.payload_format,
+        )
+
+    def close(self):
+        """Detach from the arena, removing it if this process created it."""
+        if self._block is None:
+            return
+        self._headers = self._data = None
+        _ATTACHED.pop(self.name, None)
+        self._block.close()
+        if self._owner:
+            self._block.unlink()
+        self._block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+__all__ = [CheckpointArena.__name__, CheckpointHandle.__name__]
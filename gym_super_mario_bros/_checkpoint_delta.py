@@ -0,0 +1,86 @@
+"""Sparse delta encoding of checkpoint payloads.
+
+Checkpoints taken along a trajectory differ in a few hundred bytes of RAM
+(and the parts of the screen that moved). A delta stores only the runs of
+bytes that differ from a base payload of the same size:
+
+- the number of runs (u32)
+- the offset of each run (u32 each)
+- the length of each run (u32 each)
+- the new bytes of every run, concatenated
+
+Runs separated by fewer than `_GAP` unchanged bytes are merged, since a run
+header costs more than the bytes between them.
+"""
+
+from __future__ import annotations
+
+import struct
+
+import numpy as np
+
+
+# the number of unchanged bytes worth splitting a run over
+_GAP = 8
+
+
+# the structure of the number of runs
+_COUNT = struct.Struct('<I')
+
+
+def encode_delta(base, payload):
+    """
+    Return the delta that turns a base payload into another payload.
+
+    Args:
+        base (bytes): the payload to encode against
+        payload (bytes): the payload to encode, the same size as `base`
+
+    Returns:
+        the delta as bytes
+
+    """
+    if len(base) != len(payload):
+        raise ValueError('delta encoding requires payloads of the same size')
+    new = np.frombuffer(payload, dtype=np.uint8)
+    changed = np.flatnonzero(np.frombuffer(base, dtype=np.uint8) != new)
+    if len(changed) == 0:
+        return _COUNT.pack(0)
+    breaks = np.flatnonzero(np.diff(changed) > _GAP) + 1
+    starts = changed[np.concatenate(([0], breaks))]
+    ends = changed[np.concatenate((breaks - 1, [-1]))] + 1
+    data = b''.join(payload[start:end] for start, end in zip(starts.tolist(), ends.tolist()))
+    return (
+        _COUNT.pack(len(starts))
+        + starts.astype('<u4').tobytes()
+        + (ends - starts).astype('<u4').tobytes()
+        + data
+    )
+
+
+def apply_deltas(base, deltas):
+    """
+    Return a base payload with deltas applied in order.
+
+    Args:
+        base (bytes): the payload the first delta was encoded against
+        deltas (iterable): deltas from `encode_delta`, each encoded against
+            the result of the ones before it
+
+    Returns:
+        the resulting payload as bytes
+
+    """
+    out = bytearray(base)
+    for delta in deltas:
+        count, = _COUNT.unpack_from(delta)
+        starts = np.frombuffer(delta, dtype='<u4', count=count, offset=_COUNT.size).tolist()
+        lengths = np.frombuffer(delta, dtype='<u4', count=count, offset=_COUNT.size + 4 * count).tolist()
+        position = _COUNT.size + 8 * count
+        for start, length in zip(starts, lengths):
+            out[start:start + length] = delta[position:position + length]
+            position += length
+    return bytes(out)
+
+
+__all__ = [encode_delta.__name__, apply_deltas.__name__]
@@ -0,0 +1,312 @@
+"""An in-memory pool of checkpoints with a byte budget.
+
+Tree search and backtracking keep many `SmbCheckpoint`s alive at once, and a
+`'buffers'` checkpoint holds a whole screen. `CheckpointPool` keys them by
+user IDs and keeps their payloads under a byte budget. It evicts the least
+recently used entry (`'lru'`) or the lowest scoring one (`'priority'`). With
+`hot_entries`, the payloads of all but that many most recently used entries
+are compressed and decompressed again when they are read.
+
+A delta checkpoint keeps its base chain alive, so the budget counts every
+checkpoint an entry reaches through its bases, once however many entries
+share it. Evicting a base's entry only frees its payload once no other
+entry depends on it, and the payload of a base with dependents is left
+uncompressed (compressing it would keep both copies alive).
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import dataclasses
+import heapq
+import itertools
+import zlib
+
+from ._checkpoint import SmbCheckpoint
+
+
+# the eviction policies of a pool
+POLICIES = ('lru', 'priority')
+
+
+class _Entry:
+    """A checkpoint in a pool and its eviction bookkeeping."""
+
+    __slots__ = ('checkpoint', 'compressed', 'score', 'order')
+
+    def __init__(self, checkpoint, score, order):
+        self.checkpoint = checkpoint
+        self.compressed = False
+        self.score = score
+        self.order = order
+
+
+def _chain(checkpoint):
+    """Return a checkpoint and the bases its payload is a delta against."""
+    chain = []
+    while checkpoint is not None:
+        chain.append(checkpoint)
+        checkpoint = checkpoint.base
+    return chain
+
+
+class CheckpointPool:
+    """Checkpoints keyed by user IDs within a byte budget."""
+
+    def __init__(self, max_bytes, policy='lru', hot_entries=None, compression_level=1):
+        """
+        Initialize an empty checkpoint pool.
+
+        Args:
+            max_bytes (int): the budget of the stored payloads in bytes
+            policy (str): the entry to evict when over budget: 'lru' for the
+                least recently used, 'priority' for the lowest score (the
+                oldest first among equal scores)
+            hot_entries (int): the number of most recently used entries to
+                keep uncompressed, or None to never compress
+            compression_level (int): the zlib level of cold payloads
+
+        Returns:
+            None
+
+        """
+        if max_bytes < 1:
+            raise ValueError('max_bytes must be at least 1')
+        if policy not in POLICIES:
+            raise ValueError('policy must be one of {}, got {!r}'.format(POLICIES, policy))
+        if hot_entries is not None and hot_entries < 0:
+            raise ValueError('hot_entries must be non-negative')
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.hot_entries = hot_entries
+        self.compression_level = compression_level
+        # the entries ordered from least to most recently used
+        self._entries = OrderedDict()
+        # the uncompressed keys ordered from least to most recently used
+        self._hot = OrderedDict()
+        # (score, order, key) of every put, stale once the key is put again
+        self._scores = []
+        self._order = itertools.count()
+        # the checkpoint and the number of entries whose chains hold it, by
+        # the id of each checkpoint the pool keeps alive
+        self._refs = {}
+        self.nbytes = 0
+        self.stats = dict(hits=0, misses=0, evictions=0, compressions=0, decompressions=0)
+
+    def __len__(self):
+        """Return the number of checkpoints in the pool."""
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """Return True if the pool holds a checkpoint (not counted as a hit)."""
+        return key in self._entries
+
+    def __iter__(self):
+        """Iterate over the keys from least to most recently used."""
+        return iter(self._entries)
+
+    def put(self, key, checkpoint, score=0.0):
+        """
+        Add a checkpoint to the pool, replacing any under the same key.
+
+        Args:
+            key (hashable): the ID to get the checkpoint by
+            checkpoint (SmbCheckpoint): the checkpoint to keep
+            score (float): the priority of the checkpoint under the
+                'priority' policy (higher scores are evicted last)
+
+        Returns:
+            None
+
+        """
+        if not isinstance(checkpoint, SmbCheckpoint):
+            raise TypeError('checkpoint must be an SmbCheckpoint')
+        if sum(len(link._payload) for link in _chain(checkpoint)) > self.max_bytes:
+            raise ValueError('checkpoint (with its base chain) is larger than the pool budget')
+        self.discard(key)
+        entry = _Entry(checkpoint, score, next(self._order))
+        self._entries[key] = entry
+        self._hot[key] = None
+        self._retain(checkpoint)
+        if self.policy == 'priority':
+            heapq.heappush(self._scores, (score, entry.order, key))
+            # drop the stale items once they outnumber the live ones
+            if len(self._scores) > 2 * len(self._entries) + 64:
+                self._scores = [(e.score, e.order, k) for k, e in self._entries.items()]
+                heapq.heapify(self._scores)
+        self._compress_cold()
+        self._evict(keep=key)
+
+    __setitem__ = put
+
+    def get(self, key, default=None):
+        """
+        Return the checkpoint of a key and mark it as recently used.
+
+        Args:
+            key (hashable): the ID the checkpoint was put with
+            default: the value to return when the pool has no such key
+
+        Returns:
+            the SmbCheckpoint (uncompressed) or `default`
+
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return default
+        self.stats['hits'] += 1
+        self._entries.move_to_end(key)
+        if not entry.compressed:
+            # a base left uncompressed for its dependents may be cold
+            self._hot.pop(key, None)
+            self._hot[key] = None
+            self._compress_cold()
+            return entry.checkpoint
+        self._decompress(entry)
+        checkpoint = entry.checkpoint
+        self._hot[key] = None
+        # with no hot entries, this compresses the entry again
+        self._compress_cold()
+        self._evict(keep=key)
+        return checkpoint
+
+    def __getitem__(self, key):
+        checkpoint = self.get(key)
+        if checkpoint is None:
+            raise KeyError(key)
+        return checkpoint
+
+    def discard(self, key):
+        """Remove the checkpoint of a key if the pool holds one."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._hot.pop(key, None)
+            self._release(entry.checkpoint)
+
+    __delitem__ = discard
+
+    def clear(self):
+        """Remove every checkpoint (the stats are kept)."""
+        self._entries.clear()
+        self._hot.clear()
+        self._scores.clear()
+        self._refs.clear()
+        self.nbytes = 0
+
+    def save(self, env, key, score=0.0):
+        """
+        Put a checkpoint of the current state of an environment.
+
+        Args:
+            env (gym.Env): the (possibly wrapped) SuperMarioBrosEnv to save
+            key (hashable): the ID to load the checkpoint by
+            score (float): the priority of the checkpoint (see `put`)
+
+        Returns:
+            None
+
+        """
+        self.put(key, env.unwrapped.save_checkpoint(), score)
+
+    def load(self, env, key):
+        """
+        Restore an environment to the checkpoint of a key.
+
+        Args:
+            env (gym.Env): the (possibly wrapped) SuperMarioBrosEnv to restore
+            key (hashable): the ID the checkpoint was saved with
+
+        Returns:
+            True if the pool held the checkpoint, False on a miss (the
+            environment is left as it is)
+
+        """
+        checkpoint = self.get(key)
+        if checkpoint is None:
+            return False
+        env.unwrapped.load_checkpoint(checkpoint)
+        return True
+
+    def _retain(self, checkpoint):
+        """Count an entry's reference to a checkpoint and its base chain."""
+        for link in _chain(checkpoint):
+            ref = self._refs.get(id(link))
+            if ref is None:
+                self._refs[id(link)] = [link, 1]
+                self.nbytes += len(link._payload)
+            else:
+                ref[1] += 1
+
+    def _release(self, checkpoint):
+        """Drop an entry's reference to a checkpoint and its base chain."""
+        for link in _chain(checkpoint):
+            ref = self._refs[id(link)]
+            ref[1] -= 1
+            if ref[1] == 0:
+                del self._refs[id(link)]
+                self.nbytes -= len(link._payload)
+
+    def _replace_payload(self, entry, payload):
+        """Swap the checkpoint of an entry for one with another payload."""
+        old = entry.checkpoint
+        entry.checkpoint = dataclasses.replace(old, _payload=payload)
+        del self._refs[id(old)]
+        self._refs[id(entry.checkpoint)] = [entry.checkpoint, 1]
+        self.nbytes += len(payload) - len(old._payload)
+
+    def _compress_cold(self):
+        """Compress the least recently used payloads beyond `hot_entries`."""
+        if self.hot_entries is None:
+            return
+        while len(self._hot) > self.hot_entries:
+            key, _ = self._hot.popitem(last=False)
+            entry = self._entries[key]
+            # the dependents of a base keep its uncompressed payload alive
+            if self._refs[id(entry.checkpoint)][1] > 1:
+                continue
+            self._replace_payload(entry, zlib.compress(entry.checkpoint._payload, self.compression_level))
+            entry.compressed = True
+            self.stats['compressions'] += 1
+
+    def _decompress(self, entry):
+        """Restore the payload of a cold entry."""
+        self._replace_payload(entry, zlib.decompress(entry.checkpoint._payload))
+        entry.compressed = False
+        self.stats['decompressions'] += 1
+
+    def _evict(self, keep):
+        """Evict entries other than `keep` until the pool fits its budget."""
+        while self.nbytes > self.max_bytes:
+            if self.policy == 'lru':
+                key = next(iter(self._entries))
+                if key == keep:
+                    break
+            else:
+                key = self._pop_lowest_score(keep)
+                if key is None:
+                    break
+            self.discard(key)
+            self.stats['evictions'] += 1
+
+    def _pop_lowest_score(self, keep):
+        """Return the key with the lowest score other than `keep` (or None)."""
+        kept = None
+        found = None
+        while self._scores:
+            item = heapq.heappop(self._scores)
+            _, order, key = item
+            entry = self._entries.get(key)
+            # skip the items of discarded and replaced entries
+            if entry is None or entry.order != order:
+                continue
+            if key != keep:
+                found = key
+                break
+            kept = item
+        if kept is not None:
+            heapq.heappush(self._scores, kept)
+        return found
+
+
+__all__ = [CheckpointPool.__name__]
@@ -0,0 +1,336 @@
+"""Offline RL datasets of transitions in memory-mapped chunk files.
+
+A `DatasetWriter` takes the (observation, action, reward, terminated,
+truncated, info) of each step from the actor loop and hands it to a
+background thread through a bounded queue. The thread writes the fields
+into memory-mapped .npy chunk files of `chunk_size` transitions each, so
+the actor only pays for copying the observation. When the queue is full,
+`add` blocks until the thread catches up.
+
+The directory holds one .npy file per field and chunk (e.g.,
+`chunk-000003.observation.npy`) and an `index.json`. The index records the
+schema (the dtype and shape of each field) and the length of each chunk. It
+is rewritten whenever a chunk is complete, so a `DatasetReader` can read a
+dataset that is still being written. The reader memory-maps the chunks: it
+reads single transitions by index and streams contiguous batches without
+loading whole files.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+# the version of the index files written by `DatasetWriter`
+FORMAT_VERSION = 1
+
+
+# the name of the index file of a dataset directory
+INDEX = 'index.json'
+
+
+# the fields every transition has and their dtypes
+_FIELDS = dict(
+    action=np.int32,
+    reward=np.float32,
+    terminated=np.bool_,
+    truncated=np.bool_,
+)
+
+
+# the sentinel that stops the writer thread
+_STOP = object()
+
+
+def _info_dtype(value):
+    """Return the dtype to store an info value with."""
+    if isinstance(value, (bool, np.bool_)):
+        return np.dtype(np.bool_)
+    if isinstance(value, (int, np.integer)):
+        # info values are NumPy bytes of the RAM in places, so widen them
+        return np.dtype(np.int32)
+    if isinstance(value, (float, np.floating)):
+        return np.dtype(np.float32)
+    if isinstance(value, str):
+        return np.dtype('U16')
+    raise TypeError('cannot store info values of type {}'.format(type(value).__name__))
+
+
+def _chunk_path(directory, chunk, field):
+    """Return the path of the file of a field in a chunk."""
+    return os.path.join(directory, 'chunk-{:06d}.{}.npy'.format(chunk, field))
+
+
+class DatasetWriter:
+    """Write transitions to memory-mapped chunk files in a background thread."""
+
+    def __init__(self, directory, chunk_size=1024, queue_size=64, info_keys=None):
+        """
+        Create a new dataset in a directory.
+
+        Args:
+            directory (str): the directory to write the dataset to, which must
+                not hold a dataset yet
+            chunk_size (int): the number of transitions per chunk file
+            queue_size (int): the most transitions waiting to be written
+                before `add` blocks
+            info_keys (list): the info keys to store, or None for every key
+                of the info of the first transition
+
+        Returns:
+            None
+
+        """
+        if chunk_size < 1 or queue_size < 1:
+            raise ValueError('chunk_size and queue_size must be at least 1')
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(os.path.join(self.directory, INDEX)):
+            raise FileExistsError('{} already holds a dataset'.format(self.directory))
+        self.chunk_size = chunk_size
+        self._info_keys = None if info_keys is None else list(info_keys)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._error = None
+        # the writer thread's state: the schema, the chunk lengths, and the
+        # memory maps and length of the chunk being written
+        self._schema = None
+        self._chunks = []
+        self._arrays = None
+        self._length = 0
+
+    def add(self, observation, action, reward, terminated, truncated, info=None):
+        """
+        Queue a transition to be written.
+
+        Args:
+            observation (np.ndarray): the observation (copied, so the
+                environment's screen buffer can be passed as is)
+            action (int): the action
+            reward (float): the reward
+            terminated (bool): whether the episode ended
+            truncated (bool): whether a truncation budget ran out
+            info (dict): the info of the step
+
+        Returns:
+            None
+
+        """
+        self._raise_error()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='DatasetWriter', daemon=True)
+            self._thread.start()
+        info = {} if info is None else info
+        if self._info_keys is None:
+            self._info_keys = sorted(info)
+        transition = dict(
+            observation=np.array(observation, copy=True),
+            action=action,
+            reward=reward,
+            terminated=terminated,
+            truncated=truncated,
+        )
+        for key in self._info_keys:
+            transition['info.' + key] = info[key]
+        # blocks while the writer thread is behind, unless it has failed
+        while True:
+            try:
+                self._queue.put(transition, timeout=0.1)
+                return
+            except queue.Full:
+                self._raise_error()
+
+    def _raise_error(self):
+        """Re-raise an error of the writer thread in the calling thread."""
+        if self._error is not None:
+            raise RuntimeError('dataset writer thread failed') from self._error
+
+    def _run(self):
+        """Write the queued transitions until the stop sentinel."""
+        while True:
+            transition = self._queue.get()
+            if transition is _STOP:
+                break
+            if self._error is not None:
+                # drain the queue so `add` doesn't block on a dead writer
+                continue
+            try:
+                self._write(transition)
+            except BaseException as error:
+                self._error = error
+
+    def _new_schema(self, transition):
+        """Return the schema of the dataset from its first transition."""
+        observation = transition['observation']
+        schema = dict(observation=(observation.dtype, observation.shape))
+        for field, dtype in _FIELDS.items():
+            schema[field] = (np.dtype(dtype), ())
+        for key in self._info_keys:
+            schema['info.' + key] = (_info_dtype(transition['info.' + key]), ())
+        return schema
+
+    def _write(self, transition):
+        """Write a transition into the current chunk."""
+        if self._schema is None:
+            self._schema = self._new_schema(transition)
+        if self._arrays is None:
+            chunk = len(self._chunks)
+            self._arrays = {
+                field: np.lib.format.open_memmap(
+                    _chunk_path(self.directory, chunk, field),
+                    mode='w+',
+                    dtype=dtype,
+                    shape=(self.chunk_size, *shape),
+                )
+                for field, (dtype, shape) in self._schema.items()
+            }
+        for field, array in self._arrays.items():
+            array[self._length] = transition[field]
+        self._length += 1
+        if self._length == self.chunk_size:
+            self._finish_chunk()
+
+    def _finish_chunk(self):
+        """Flush the current chunk and record it in the index."""
+        for array in self._arrays.values():
+            array.flush()
+        self._chunks.append(self._length)
+        self._arrays = None
+        self._length = 0
+        self._write_index()
+
+    def _write_index(self):
+        """Atomically write the index of the complete chunks."""
+        index = dict(
+            format=FORMAT_VERSION,
+            schema={
+                field: dict(dtype=dtype.str, shape=list(shape))
+                for field, (dtype, shape) in self._schema.items()
+            },
+            chunk_size=self.chunk_size,
+            chunks=self._chunks,
+        )
+        path = os.path.join(self.directory, INDEX)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as file:
+            json.dump(index, file)
+        os.replace(tmp, path)
+
+    def flush(self):
+        """Wait for the queued transitions to be written."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def close(self):
+        """Write the queued transitions and the last, partial chunk."""
+        self.flush()
+        if self._arrays is not None:
+            self._finish_chunk()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DatasetReader:
+    """Read the transitions of a dataset written by `DatasetWriter`."""
+
+    def __init__(self, directory):
+        """
+        Open a dataset.
+
+        Args:
+            directory (str): the directory of the dataset
+
+        Returns:
+            None
+
+        """
+        self.directory = os.fspath(directory)
+        with open(os.path.join(self.directory, INDEX)) as file:
+            index = json.load(file)
+        if index['format'] != FORMAT_VERSION:
+            raise ValueError('unsupported dataset format {}'.format(index['format']))
+        self.schema = {
+            field: (np.dtype(spec['dtype']), tuple(spec['shape']))
+            for field, spec in index['schema'].items()
+        }
+        self._lengths = index['chunks']
+        # the index of the first transition of each chunk, and of the end
+        self._offsets = np.concatenate([[0], np.cumsum(self._lengths, dtype=np.int64)])
+        self._chunks = {}
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def _chunk(self, chunk):
+        """Return the memory maps of the fields of a chunk."""
+        arrays = self._chunks.get(chunk)
+        if arrays is None:
+            length = self._lengths[chunk]
+            arrays = {
+                field: np.load(_chunk_path(self.directory, chunk, field), mmap_mode='r')[:length]
+                for field in self.schema
+            }
+            self._chunks[chunk] = arrays
+        return arrays
+
+    def __getitem__(self, index):
+        """Return a transition as a dictionary of its fields."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('transition index out of range')
+        chunk = int(np.searchsorted(self._offsets, index, side='right')) - 1
+        offset = index - self._offsets[chunk]
+        return {field: array[offset] for field, array in self._chunk(chunk).items()}
+
+    def batches(self, batch_size, start=0, stop=None):
+        """
+        Stream contiguous batches of transitions.
+
+        A batch inside a chunk holds read-only views of its memory maps; a
+        batch across chunks is copied together.
+
+        Args:
+            batch_size (int): the number of transitions per batch (the last
+                batch may be shorter)
+            start (int): the index of the first transition
+            stop (int): the index past the last transition, or None for the
+                end of the dataset
+
+        Returns:
+            a generator of dictionaries of the fields of each batch
+
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        stop = len(self) if stop is None else min(stop, len(self))
+        for begin in range(start, stop, batch_size):
+            end = min(begin + batch_size, stop)
+            parts = []
+            chunk = int(np.searchsorted(self._offsets, begin, side='right')) - 1
+            while begin < end:
+                offset = begin - self._offsets[chunk]
+                count = min(end - begin, self._lengths[chunk] - offset)
+                arrays = self._chunk(chunk)
+                parts.append({field: array[offset:offset + count] for field, array in arrays.items()})
+                begin += count
+                chunk += 1
+            if len(parts) == 1:
+                yield parts[0]
+            else:
+                yield {field: np.concatenate([part[field] for part in parts]) for field in self.schema}
+
+
+__all__ = [DatasetReader.__name__, DatasetWriter.__name__]
@@ -0,0 +1,207 @@
+"""Check that the emulation of every stage is unchanged by dependency upgrades.
+
+nes-py and NumPy upgrades have changed the dynamics of the environments
+before without failing a test (see the overflow patches at the top of
+`smb_env`). This module plays a corpus of fixed action sequences on every
+registered stage environment, in a process pool, and hashes the RAM after
+every step (`ram_hash`, 64 bits). `record_golden` stores the hashes of a
+known-good setup in an .npz file, and `verify_golden` replays the corpus
+stored there and reports the first step where each stage diverges.
+
+The command line interface runs both::
+
+    gym_super_mario_bros --record-golden golden.npz
+    gym_super_mario_bros --verify-golden golden.npz
+
+"""
+
+from __future__ import annotations
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+from ._episode_log import ram_hash
+
+
+# a stage whose hashes differ from the golden ones: the index of the action
+# sequence and the first diverging step (0 is the state after `reset`)
+Divergence = namedtuple('Divergence', ['env_id', 'sequence', 'step'])
+
+
+# the actions of the default corpus: run right, run and jump, and random
+# presses of the buttons the action spaces in `actions` use
+_RUN = 0b10000010
+_RUN_JUMP = 0b10000011
+_BUTTONS = np.array([0, 0b10000000, 0b10000001, 0b10000010, 0b10000011, 0b01000000, 0b00000001, 0b00000010], dtype=np.uint8)
+
+
+def stage_ids():
+    """Return the IDs of the registered single stage environments."""
+    import gymnasium as gym
+    return sorted(
+        env_id for env_id, spec in gym.envs.registry.items()
+        if spec.entry_point == 'gym_super_mario_bros:SuperMarioBrosEnv' and spec.kwargs.get('target')
+    )
+
+
+def default_corpus(steps=500, seed=0):
+    """
+    Return the default action sequences.
+
+    Args:
+        steps (int): the length of each sequence
+        seed (int): the seed of the random sequence
+
+    Returns:
+        a uint8 array of shape (3, steps)
+
+    """
+    run_jump = np.full(steps, _RUN, dtype=np.uint8)
+    # hold jump for 20 of every 40 steps so Mario lands between jumps
+    run_jump[np.arange(steps) % 40 < 20] = _RUN_JUMP
+    random = np.random.default_rng(seed).choice(_BUTTONS, size=steps)
+    return np.stack([np.full(steps, _RUN, dtype=np.uint8), run_jump, random])
+
+
+def hash_steps(env, actions):
+    """
+    Play an action sequence from `reset` and hash the RAM after each step.
+
+    Args:
+        env (SuperMarioBrosEnv): the environment to play
+        actions (iterable): the actions to play (the sequence stops early
+            when the episode ends)
+
+    Returns:
+        a uint64 array of the hash after `reset` and after each step
+
+    """
+    env.reset()
+    hashes = [ram_hash(env.ram)]
+    for action in actions:
+        _, _, terminated, truncated, _ = env.step(action)
+        hashes.append(ram_hash(env.ram))
+        if terminated or truncated:
+            break
+    return np.array(hashes, dtype=np.uint64)
+
+
+def _hash_stage(env_id, corpus):
+    """Return the hashes of each sequence of a corpus played on a stage."""
+    from ._registration import make_raw
+    env = make_raw(env_id)
+    try:
+        return [hash_steps(env, actions.tolist()) for actions in corpus]
+    finally:
+        env.close()
+
+
+def _hash_stages(env_ids, corpus, workers, mp_context):
+    """Return a dictionary of the hashes of each stage."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 0:
+        return {env_id: _hash_stage(env_id, corpus) for env_id in env_ids}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        futures = {env_id: pool.submit(_hash_stage, env_id, corpus) for env_id in env_ids}
+        return {env_id: future.result() for env_id, future in futures.items()}
+
+
+def _key(env_id, sequence):
+    """Return the .npz key of the hashes of a sequence on a stage."""
+    return '{}:{}'.format(env_id, sequence)
+
+
+def record_golden(path, env_ids=None, corpus=None, workers=None, mp_context=None):
+    """
+    Record the hashes of a corpus on each stage to a golden file.
+
+    Args:
+        path (str): the .npz file to write
+        env_ids (list): the stage IDs to record, or None for `stage_ids()`
+        corpus (np.ndarray): the action sequences, shape (sequences, steps),
+            or None for `default_corpus()`
+        workers (int): the number of worker processes, None for the number
+            of CPUs, or 0 to play in this process
+        mp_context: the multiprocessing context to start workers with, or
+            None for the default
+
+    Returns:
+        None
+
+    """
+    env_ids = stage_ids() if env_ids is None else list(env_ids)
+    corpus = default_corpus() if corpus is None else np.asarray(corpus, dtype=np.uint8)
+    results = _hash_stages(env_ids, corpus, workers, mp_context)
+    arrays = dict(corpus=corpus, env_ids=np.array(env_ids))
+    for env_id, hashes in results.items():
+        for sequence, sequence_hashes in enumerate(hashes):
+            arrays[_key(env_id, sequence)] = sequence_hashes
+    path = os.fspath(path)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(tmp, path)
+
+
+def verify_golden(path, env_ids=None, workers=None, mp_context=None):
+    """
+    Play the corpus of a golden file and compare the hashes to it.
+
+    Args:
+        path (str): the .npz file written by `record_golden`
+        env_ids (list): the stage IDs to verify, or None for all the stages
+            in the file
+        workers (int): the number of worker processes, None for the number
+            of CPUs, or 0 to play in this process
+        mp_context: the multiprocessing context to start workers with, or
+            None for the default
+
+    Returns:
+        a list of the `Divergence` of each stage that diverges at its earliest
+        step, sorted by stage ID (empty if every stage matches)
+
+    """
+    with np.load(path) as golden:
+        corpus = golden['corpus']
+        recorded = [str(env_id) for env_id in golden['env_ids']]
+        env_ids = recorded if env_ids is None else list(env_ids)
+        missing = sorted(set(env_ids) - set(recorded))
+        if missing:
+            raise ValueError('golden file has no hashes of {}'.format(', '.join(missing)))
+        expected = {
+            env_id: [golden[_key(env_id, sequence)] for sequence in range(len(corpus))]
+            for env_id in env_ids
+        }
+    results = _hash_stages(env_ids, corpus, workers, mp_context)
+    divergences = []
+    for env_id in sorted(env_ids):
+        first = None
+        for sequence, (actual, golden_hashes) in enumerate(zip(results[env_id], expected[env_id])):
+            length = min(len(actual), len(golden_hashes))
+            differ = np.flatnonzero(actual[:length] != golden_hashes[:length])
+            if len(differ):
+                step = int(differ[0])
+            elif len(actual) != len(golden_hashes):
+                # the episode ended at a different step
+                step = length
+            else:
+                continue
+            if first is None or step < first.step:
+                first = Divergence(env_id, sequence, step)
+        if first is not None:
+            divergences.append(first)
+    return divergences
+
+
+__all__ = [
+    Divergence.__name__,
+    default_corpus.__name__,
+    hash_steps.__name__,
+    record_golden.__name__,
+    stage_ids.__name__,
+    verify_golden.__name__,
+]
@@ -0,0 +1,105 @@
+"""Serialized emulator core state for restores beyond nes-py's backup slot.
+
+nes-py exposes a single backup slot per emulator via `NESEnv._backup()` /
+`NESEnv._restore()`, and `reset()` depends on that slot holding the start of
+the episode. Anything that needs additional restore points has to copy the
+complete machine state (CPU, PPU, main bus and picture bus) out of the core.
+
+Builds of the nes-py core that export `StateSize`, `DumpState` and `LoadState`
+support this; the nes-py releases on PyPI don't. On other builds
+`is_supported()` returns False, the features that need the state raise
+ValueError, and `InputLogBackend` serializes the state as a log of the inputs
+instead. Restoring RAM on top of the backup slot is *not*
+a substitute: the CPU/PPU phase differs and the game diverges within a frame.
+
+The state bytes are opaque and only valid for the core that produced them.
+"""
+
+from __future__ import annotations
+
+import ctypes
+
+import numpy as np
+
+
+def _bind_core():
+    """Return the nes-py core library if it supports state serialization."""
+    try:
+        from nes_py.nes_env import _LIB
+    except Exception:
+        return None
+    # ctypes resolves symbols lazily; a missing export raises AttributeError
+    try:
+        _LIB.StateSize.argtypes = [ctypes.c_void_p]
+        _LIB.StateSize.restype = ctypes.c_size_t
+        _LIB.DumpState.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        _LIB.DumpState.restype = None
+        _LIB.LoadState.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        _LIB.LoadState.restype = None
+    except AttributeError:
+        return None
+    return _LIB
+
+
+# the core library when it can serialize state, None otherwise
+_CORE = _bind_core()
+
+
+def is_supported() -> bool:
+    """Return True if the loaded nes-py core can serialize its state."""
+    return _CORE is not None
+
+
+def _address(buffer):
+    """Return a buffer as an argument for the core's state functions."""
+    if isinstance(buffer, np.ndarray):
+        if not buffer.flags.c_contiguous:
+            raise ValueError('state buffer must be contiguous')
+        return buffer.ctypes.data
+    return buffer
+
+
+def state_size(env) -> int:
+    """Return the size in bytes of the emulator state of a `NESEnv`."""
+    if _CORE is None:
+        raise RuntimeError('nes-py core does not support state serialization')
+    return _CORE.StateSize(env._env)
+
+
+def dump_state(env, out=None) -> bytes:
+    """
+    Return the complete emulator state of a `NESEnv` as bytes.
+
+    Args:
+        env (NESEnv): the environment to dump the state of
+        out (np.ndarray): a uint8 buffer of `state_size` bytes to dump into
+            instead of allocating new bytes (None to allocate)
+
+    Returns:
+        the state as bytes, or `out` if given
+
+    """
+    size = state_size(env)
+    if out is not None:
+        if out.nbytes != size:
+            raise ValueError('state buffer does not match this nes-py core')
+        _CORE.DumpState(env._env, _address(out))
+        return out
+    buffer = ctypes.create_string_buffer(size)
+    _CORE.DumpState(env._env, buffer)
+    return buffer.raw
+
+
+def load_state(env, state) -> None:
+    """Restore the emulator state of a `NESEnv` from `dump_state` bytes (or buffer)."""
+    if len(state) != state_size(env):
+        raise ValueError('emulator state incompatible with this nes-py core')
+    _CORE.LoadState(env._env, _address(state))
+
+
+__all__ = [
+    is_supported.__name__,
+    state_size.__name__,
+    dump_state.__name__,
+    load_state.__name__,
+]
@@ -0,0 +1,295 @@
+"""Episodes stored as a start checkpoint and the actions played from it.
+
+The emulator is deterministic, so an episode is fully described by the state
+it starts in and the actions played from there. Storing its frames is
+wasteful. An `EpisodeLog` holds the start checkpoint, the actions as one
+uint8 array, the reward and the terminated/truncated flags of each step,
+and, optionally, a hash of the RAM every `hash_every` steps. A log is a few
+bytes per step on top of the checkpoint. It also keeps the options of the
+recorded environment that change its steps (`fast_respawn` and the
+truncation budgets), so a replay into a new environment uses them too.
+
+`EpisodeRecorder` wraps an environment and writes the log of each episode to
+its own compressed .npz file in a directory. `EpisodeLog.replay` plays a log
+back into an environment and yields the steps, with their observations and
+info, as fast as the emulator runs. It checks the recorded rewards, flags,
+and RAM hashes along the way and raises RuntimeError where the replay
+diverges from the recording.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from dataclasses import field
+import hashlib
+import json
+import os
+
+import gymnasium as gym
+import numpy as np
+
+from ._checkpoint import SmbCheckpoint
+
+
+# the bits of the per-step flags
+_TERMINATED = 1
+_TRUNCATED = 2
+
+
+# the `SuperMarioBrosEnv` arguments that change the steps of an episode
+_ENV_OPTIONS = ('fast_respawn', 'max_stuck_steps', 'max_episode_seconds', 'max_episode_frames')
+
+
+def ram_hash(ram):
+    """
+    Return a 64-bit hash of the RAM.
+
+    Args:
+        ram (np.ndarray): the 2048 bytes of RAM
+
+    Returns:
+        the hash as an int
+
+    """
+    digest = hashlib.blake2b(np.ascontiguousarray(ram), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _encode_start(checkpoint):
+    """Return the arrays of a start checkpoint for an .npz file."""
+    targets = (checkpoint.target_world, checkpoint.target_stage, checkpoint.target_area)
+    return dict(
+        start_payload=np.frombuffer(checkpoint.full_payload(), dtype=np.uint8),
+        start_format=np.array(checkpoint.payload_format),
+        start_rom_path=np.array(checkpoint.rom_path),
+        start_rom_hash=np.array(checkpoint.rom_hash),
+        # -1 stands for a target of None
+        start_target=np.array([-1 if value is None else value for value in targets], dtype=np.int64),
+        start_bookkeeping=np.array([checkpoint.time_last, checkpoint.x_position_last], dtype=np.int64),
+    )
+
+
+def _decode_start(arrays):
+    """Return the start checkpoint in the arrays of an .npz file."""
+    world, stage, area = (None if value < 0 else int(value) for value in arrays['start_target'])
+    time_last, x_position_last = (int(value) for value in arrays['start_bookkeeping'])
+    return SmbCheckpoint(
+        rom_path=str(arrays['start_rom_path']),
+        rom_hash=str(arrays['start_rom_hash']),
+        target_world=world,
+        target_stage=stage,
+        target_area=area,
+        time_last=time_last,
+        x_position_last=x_position_last,
+        _payload=arrays['start_payload'].tobytes(),
+        payload_format=str(arrays['start_format']),
+    )
+
+
+@dataclass
+class EpisodeLog:
+    """The start checkpoint and the actions of an episode."""
+
+    # the checkpoint the episode starts from (its state after `reset`)
+    start: SmbCheckpoint
+    # the action of each step, shape (steps,)
+    actions: np.ndarray
+    # the reward of each step, shape (steps,)
+    rewards: np.ndarray
+    # the terminated (bit 0) and truncated (bit 1) flags of each step
+    flags: np.ndarray
+    # the steps between RAM hashes, or 0 for none
+    hash_every: int = 0
+    # the hash of the RAM after steps hash_every, 2 * hash_every, ...
+    ram_hashes: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.uint64))
+    # the `_ENV_OPTIONS` of the recorded environment
+    env_options: dict = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.actions)
+
+    @property
+    def terminated(self):
+        """Return the terminated flag of each step."""
+        return (self.flags & _TERMINATED).astype(bool)
+
+    @property
+    def truncated(self):
+        """Return the truncated flag of each step."""
+        return (self.flags & _TRUNCATED).astype(bool)
+
+    def save(self, path):
+        """Atomically write the log to a compressed .npz file."""
+        path = os.fspath(path)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as file:
+            np.savez_compressed(
+                file,
+                actions=self.actions,
+                rewards=self.rewards,
+                flags=self.flags,
+                hash_every=np.array(self.hash_every),
+                ram_hashes=self.ram_hashes,
+                env_options=np.array(json.dumps(self.env_options)),
+                **_encode_start(self.start),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a log saved with `save`."""
+        with np.load(path) as arrays:
+            # logs from before the options were recorded have none
+            env_options = {}
+            if 'env_options' in arrays.files:
+                env_options = json.loads(str(arrays['env_options']))
+            return cls(
+                start=_decode_start(arrays),
+                actions=arrays['actions'],
+                rewards=arrays['rewards'],
+                flags=arrays['flags'],
+                hash_every=int(arrays['hash_every']),
+                ram_hashes=arrays['ram_hashes'],
+                env_options=env_options,
+            )
+
+    def replay(self, env=None, verify=True):
+        """
+        Play the episode back and yield its steps.
+
+        The environment has to be configured like the recorded one (e.g.,
+        the same action wrappers, `fast_respawn`, and truncation budgets).
+        The observation of a step is the environment's screen buffer, which
+        the next step overwrites; copy it to keep it.
+
+        Args:
+            env (gym.Env): the environment to replay into, or None to replay
+                into a new `SuperMarioBrosEnv` of the start checkpoint's ROM,
+                target, and backend with the recorded `env_options` (closed
+                when the replay ends)
+            verify (bool): whether to check the replay against the recorded
+                rewards, flags, and RAM hashes
+
+        Returns:
+            a generator of the (observation, reward, terminated, truncated,
+            info) tuple of each step
+
+        """
+        owned = env is None
+        if owned:
+            from ._evaluation import env_kwargs_of
+            from .smb_env import SuperMarioBrosEnv
+            env = SuperMarioBrosEnv(**env_kwargs_of(self.start), **self.env_options)
+        try:
+            env.reset(options={'checkpoint': self.start})
+            for step, action in enumerate(self.actions.tolist()):
+                observation, reward, terminated, truncated, info = env.step(action)
+                if verify:
+                    self._verify(env, step, reward, terminated, truncated)
+                yield observation, reward, terminated, truncated, info
+        finally:
+            if owned:
+                env.close()
+
+    def _verify(self, env, step, reward, terminated, truncated):
+        """Raise RuntimeError if a replayed step differs from the recording."""
+        flags = (_TERMINATED if terminated else 0) | (_TRUNCATED if truncated else 0)
+        if np.float32(reward) != self.rewards[step] or flags != self.flags[step]:
+            raise RuntimeError('replay diverged from the recording at step {}'.format(step))
+        if self.hash_every and (step + 1) % self.hash_every == 0:
+            index = (step + 1) // self.hash_every - 1
+            if index < len(self.ram_hashes) and ram_hash(env.unwrapped.ram) != self.ram_hashes[index]:
+                raise RuntimeError('replay RAM diverged from the recording by step {}'.format(step))
+
+
+class EpisodeRecorder(gym.Wrapper):
+    """Write the `EpisodeLog` of each episode of an environment to a file."""
+
+    def __init__(self, env, directory, hash_every=None):
+        """
+        Initialize a new recorder.
+
+        Wrap the `SuperMarioBrosEnv` below any action wrappers to record the
+        controller bytes, or replay into the same wrapper stack. Episodes are
+        written when they end, or when `reset` or `close` cuts them short,
+        to `episode-000000.npz`, `episode-000001.npz`, ... in the directory.
+
+        Args:
+            env (gym.Env): the environment to record, a `SuperMarioBrosEnv`
+                or a wrapper of one with at most 256 actions
+            directory (str): the directory to write the episode files to
+            hash_every (int): the steps between RAM hashes to check replays
+                against, or None to record no hashes
+
+        Returns:
+            None
+
+        """
+        from .smb_env import SuperMarioBrosEnv
+        if not isinstance(env.unwrapped, SuperMarioBrosEnv):
+            raise TypeError('EpisodeRecorder records a SuperMarioBrosEnv')
+        if not isinstance(env.action_space, gym.spaces.Discrete) or env.action_space.n > 256:
+            raise ValueError('EpisodeRecorder records at most 256 discrete actions')
+        if hash_every is not None and hash_every < 1:
+            raise ValueError('hash_every must be at least 1')
+        super().__init__(env)
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.hash_every = hash_every or 0
+        # the paths of the episode files written so far
+        self.paths = []
+        self._episodes = len([name for name in os.listdir(self.directory) if name.startswith('episode-')])
+        self._start = None
+
+    def _begin(self, start):
+        """Start recording an episode from a checkpoint."""
+        self._start = start
+        self._actions = []
+        self._rewards = []
+        self._flags = []
+        self._ram_hashes = []
+
+    def _flush(self):
+        """Write the episode being recorded if it has any steps."""
+        if self._start is None or not self._actions:
+            self._start = None
+            return
+        log = EpisodeLog(
+            start=self._start,
+            actions=np.array(self._actions, dtype=np.uint8),
+            rewards=np.array(self._rewards, dtype=np.float32),
+            flags=np.array(self._flags, dtype=np.uint8),
+            hash_every=self.hash_every,
+            ram_hashes=np.array(self._ram_hashes, dtype=np.uint64),
+            env_options={name: self.env.unwrapped._init_kwargs[name] for name in _ENV_OPTIONS},
+        )
+        self._start = None
+        path = os.path.join(self.directory, 'episode-{:06d}.npz'.format(self._episodes))
+        log.save(path)
+        self._episodes += 1
+        self.paths.append(path)
+
+    def reset(self, **kwargs):
+        self._flush()
+        observation, info = self.env.reset(**kwargs)
+        self._begin(self.env.unwrapped.save_checkpoint())
+        return observation, info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        if self._start is not None:
+            self._actions.append(int(action))
+            self._rewards.append(reward)
+            self._flags.append((_TERMINATED if terminated else 0) | (_TRUNCATED if truncated else 0))
+            if self.hash_every and len(self._actions) % self.hash_every == 0:
+                self._ram_hashes.append(ram_hash(self.env.unwrapped.ram))
+            if terminated or truncated:
+                self._flush()
+        return observation, reward, terminated, truncated, info
+
+    def close(self):
+        self._flush()
+        super().close()
+
+
+__all__ = [EpisodeLog.__name__, EpisodeRecorder.__name__, ram_hash.__name__]
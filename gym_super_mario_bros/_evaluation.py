@@ -0,0 +1,278 @@
+"""Batched evaluation of action sequences from a checkpoint.
+
+Planning and evolutionary methods score many candidate action sequences that
+start from the same `SmbCheckpoint`. `SequenceEvaluator` keeps a pool of
+worker processes, each with a warm `SuperMarioBrosEnv`. It splits a batch
+into chunks, and a worker loads the checkpoint before each sequence and stops
+it early when the episode ends. Only a compact record per sequence comes back
+(see `RESULT_DTYPE`), plus the last screen of each sequence if requested.
+
+An `InputLogBackend` loads a state by replaying its log from the episode
+start, which costs as much as emulating the checkpoint's depth. A worker
+loads the checkpoint once per chunk and anchors the backend there (see
+`InputLogBackend.anchor`), so each sequence restarts from it without
+replaying anything. A chunk then costs one replay of the depth plus the
+sequences, and a worker's next chunk from the same checkpoint, or from a
+later one of the same episode, replays only what is new.
+
+The checkpoint must hold the complete emulator state (`PAYLOAD_STATE`), so
+each sequence plays exactly as it would in the environment that saved it.
+A buffers checkpoint only overlays the RAM and screen on the worker's own
+emulator state, so evaluating one raises ValueError.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+import dataclasses
+import os
+import time
+
+import numpy as np
+
+from ._backend import InputLogBackend
+from ._checkpoint import PAYLOAD_STATE
+from ._roms.rom_path import _ROM_PATHS
+from ._roms.rom_path import rom_path
+
+
+# the record of an evaluated sequence
+RESULT_DTYPE = np.dtype([
+    # the sum of the rewards of the steps taken
+    ('total_reward', np.float64),
+    # the number of steps taken, i.e., the step that ended the episode if the
+    # sequence stopped early
+    ('steps', np.int32),
+    ('terminated', np.bool_),
+    ('truncated', np.bool_),
+    # the x position and flag of the `info` after the last step
+    ('x_pos', np.int32),
+    ('flag_get', np.bool_),
+])
+
+
+# the number of chunks per worker to split a batch into, which balances the
+# load when sequences end early
+_CHUNKS_PER_WORKER = 4
+
+
+# the environment of a worker process
+_WORKER_ENV = None
+
+
+def env_kwargs_of(checkpoint):
+    """
+    Return the `SuperMarioBrosEnv` arguments that a checkpoint loads into.
+
+    Args:
+        checkpoint (SmbCheckpoint): the checkpoint to read the ROM and target of
+
+    Returns:
+        a dictionary of keyword arguments for `SuperMarioBrosEnv`, with the
+        `backend` too if the checkpoint holds an `InputLogBackend` state
+
+    """
+    path = os.path.abspath(checkpoint.rom_path)
+    for lost_levels, modes in _ROM_PATHS.items():
+        for rom_mode in modes:
+            if rom_path(lost_levels, rom_mode) == path:
+                target = None
+                if checkpoint.target_world is not None:
+                    target = checkpoint.target_world, checkpoint.target_stage
+                kwargs = dict(rom_mode=rom_mode, lost_levels=lost_levels, target=target)
+                payload = checkpoint.full_payload()
+                if checkpoint.payload_format == PAYLOAD_STATE and InputLogBackend.is_log_state(payload):
+                    kwargs['backend'] = InputLogBackend
+                return kwargs
+    raise ValueError('checkpoint ROM {!r} is not a bundled ROM; pass env_kwargs'.format(checkpoint.rom_path))
+
+
+def _start_from(env, checkpoint):
+    """Load a checkpoint into an environment and start an episode there."""
+    env.load_checkpoint(checkpoint)
+    env.done = False
+    # restart the truncation budgets like `reset` does
+    env._x_position_best = env._x_position
+    env._stuck_steps = 0
+    env._stuck_section = env._section
+    env._episode_start_time = time.monotonic()
+    env._episode_start_frame = env._frame_count
+
+
+def _evaluate(env, checkpoint, sequences, frames):
+    """Return the records (and last screens) of sequences on an environment."""
+    # replay the log up to the checkpoint once, then restart every sequence
+    # from the native backup there
+    env.load_checkpoint(checkpoint)
+    env._backend.anchor()
+    results = np.zeros(len(sequences), dtype=RESULT_DTYPE)
+    screens = np.zeros((len(sequences), *env.screen.shape), dtype=np.uint8) if frames else None
+    for index, actions in enumerate(sequences):
+        _start_from(env, checkpoint)
+        total_reward = 0.0
+        steps = 0
+        terminated = truncated = False
+        info = None
+        for action in actions.tolist():
+            _, reward, terminated, truncated, info = env.step(action)
+            total_reward += reward
+            steps += 1
+            if terminated or truncated:
+                break
+        if info is None:
+            info = env._get_info()
+        results[index] = total_reward, steps, terminated, truncated, info['x_pos'], info['flag_get']
+        if frames:
+            screens[index] = env.screen
+    return results, screens
+
+
+def _init_worker(env_kwargs):
+    """Construct the environment of a worker process."""
+    global _WORKER_ENV
+    from .smb_env import SuperMarioBrosEnv
+    _WORKER_ENV = SuperMarioBrosEnv(**env_kwargs)
+
+
+def _evaluate_in_worker(checkpoint, sequences, frames):
+    """Evaluate a chunk of sequences on the environment of the worker."""
+    return _evaluate(_WORKER_ENV, checkpoint, sequences, frames)
+
+
+def _as_sequences(action_batch):
+    """Return a batch of action sequences as a list of uint8 arrays."""
+    return [np.asarray(actions, dtype=np.uint8).reshape(-1) for actions in action_batch]
+
+
+def _standalone(checkpoint):
+    """Return a checkpoint with any delta chain resolved (to send it alone)."""
+    if checkpoint.base is None:
+        return checkpoint
+    return dataclasses.replace(checkpoint, _payload=checkpoint.full_payload(), base=None)
+
+
+class SequenceEvaluator:
+    """A pool of warm environments that evaluate action sequences."""
+
+    def __init__(self, env_kwargs, workers=None, mp_context=None):
+        """
+        Start the worker processes and their environments.
+
+        Args:
+            env_kwargs (dict): the `SuperMarioBrosEnv` arguments of the
+                workers (see `env_kwargs_of`)
+            workers (int): the number of worker processes, None for the
+                number of CPUs, or 0 to evaluate in this process
+            mp_context: the multiprocessing context to start workers with,
+                or None for the default
+
+        Returns:
+            None
+
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 0:
+            raise ValueError('workers must be non-negative')
+        self.workers = workers
+        self._env = None
+        self._pool = None
+        if workers == 0:
+            from .smb_env import SuperMarioBrosEnv
+            self._env = SuperMarioBrosEnv(**env_kwargs)
+        else:
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(env_kwargs,),
+            )
+
+    def evaluate(self, checkpoint, action_batch, frames=False):
+        """
+        Evaluate action sequences that each start from a checkpoint.
+
+        Args:
+            checkpoint (SmbCheckpoint): the state every sequence starts from,
+                saved by a backend that can serialize its state
+            action_batch (iterable): the action sequences, e.g., an array of
+                shape (sequences, steps) or a list of sequences of any length
+            frames (bool): whether to return the last screen of each sequence
+
+        Returns:
+            an array of `RESULT_DTYPE` records in the order of the sequences,
+            and an array of the last screens of shape (sequences, 240, 256,
+            3) if `frames` is True
+
+        """
+        if self._env is None and self._pool is None:
+            raise ValueError('evaluator has been closed')
+        if checkpoint.payload_format != PAYLOAD_STATE:
+            raise ValueError(
+                'evaluating needs a checkpoint of the complete emulator state; save it with '
+                'a backend that can serialize its state (e.g., backend=InputLogBackend)'
+            )
+        checkpoint = _standalone(checkpoint)
+        sequences = _as_sequences(action_batch)
+        if self._env is not None:
+            results, screens = _evaluate(self._env, checkpoint, sequences, frames)
+        else:
+            chunks = np.array_split(np.arange(len(sequences)), self.workers * _CHUNKS_PER_WORKER)
+            chunks = [chunk for chunk in chunks if len(chunk)]
+            futures = [
+                self._pool.submit(_evaluate_in_worker, checkpoint, [sequences[i] for i in chunk], frames)
+                for chunk in chunks
+            ]
+            parts = [future.result() for future in futures]
+            results = np.concatenate([part[0] for part in parts] or [np.zeros(0, dtype=RESULT_DTYPE)])
+            screens = np.concatenate([part[1] for part in parts]) if frames and parts else None
+        if frames:
+            return results, screens
+        return results
+
+    def close(self):
+        """Stop the worker processes (or close the in-process environment)."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._env is not None:
+            self._env.close()
+            self._env = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def evaluate_sequences(checkpoint, action_batch, workers=None, env_kwargs=None, frames=False):
+    """
+    Evaluate action sequences from a checkpoint on a temporary worker pool.
+
+    Use a `SequenceEvaluator` to keep the workers warm across batches.
+
+    Args:
+        checkpoint (SmbCheckpoint): the state every sequence starts from
+        action_batch (iterable): the action sequences to evaluate
+        workers (int): the number of worker processes, None for the number
+            of CPUs, or 0 to evaluate in this process
+        env_kwargs (dict): the `SuperMarioBrosEnv` arguments of the workers,
+            or None to derive them from the checkpoint
+        frames (bool): whether to return the last screen of each sequence
+
+    Returns:
+        the results of `SequenceEvaluator.evaluate`
+
+    """
+    if env_kwargs is None:
+        env_kwargs = env_kwargs_of(checkpoint)
+    with SequenceEvaluator(env_kwargs, workers=workers) as evaluator:
+        return evaluator.evaluate(checkpoint, action_batch, frames=frames)
+
+
+__all__ = [
+    SequenceEvaluator.__name__,
+    evaluate_sequences.__name__,
+    env_kwargs_of.__name__,
+]
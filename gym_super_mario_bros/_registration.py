@@ -1,4 +1,5 @@
 """Registration code of Gym environments in this package."""
+import itertools
 import gymnasium as gym
 
 
@@ -10,6 +11,8 @@ def _register_mario_env(id, is_random=False, **kwargs):
         id (str): id for the env to register
         is_random (bool): whether to use the random levels environment
         kwargs (dict): keyword arguments for the SuperMarioBrosEnv initializer
+            (defaults that `make` keyword arguments such as `max_stuck_steps`,
+            `max_episode_seconds`, or `max_episode_frames` override)
 
     Returns:
         None
@@ -33,73 +36,78 @@ def _register_mario_env(id, is_random=False, **kwargs):
     )
 
 
-# Super Mario Bros.
-_register_mario_env('SuperMarioBros-v0', rom_mode='vanilla')
-_register_mario_env('SuperMarioBros-v1', rom_mode='downsample')
-_register_mario_env('SuperMarioBros-v2', rom_mode='pixel')
-_register_mario_env('SuperMarioBros-v3', rom_mode='rectangle')
+# A list of ROM modes for each version of an environment
+_ROM_MODES = [
+    'vanilla',
+    'downsample',
+    'pixel',
+    'rectangle'
+]
 
 
-# Super Mario Bros. Random Levels
-_register_mario_env('SuperMarioBrosRandomStages-v0', is_random=True, rom_mode='vanilla')
-_register_mario_env('SuperMarioBrosRandomStages-v1', is_random=True, rom_mode='downsample')
-_register_mario_env('SuperMarioBrosRandomStages-v2', is_random=True, rom_mode='pixel')
-_register_mario_env('SuperMarioBrosRandomStages-v3', is_random=True, rom_mode='rectangle')
+# a table of the game environments as (name, is_random, lost_levels, the
+# number of versions/ROM modes supported)
+_GAME_ENVS = [
+    # Super Mario Bros.
+    ('SuperMarioBros', False, False, 4),
+    # Super Mario Bros. Random Levels
+    ('SuperMarioBrosRandomStages', True, False, 4),
+    # Super Mario Bros. 2 (Lost Levels)
+    ('SuperMarioBros2', False, True, 2),
+]
 
 
-# Super Mario Bros. 2 (Lost Levels)
-_register_mario_env('SuperMarioBros2-v0', lost_levels=True, rom_mode='vanilla')
-_register_mario_env('SuperMarioBros2-v1', lost_levels=True, rom_mode='downsample')
+for name, is_random, lost_levels, versions in _GAME_ENVS:
+    for version, rom_mode in enumerate(_ROM_MODES[:versions]):
+        kwargs = dict(rom_mode=rom_mode)
+        if lost_levels:
+            kwargs['lost_levels'] = True
+        _register_mario_env('{}-v{}'.format(name, version), is_random=is_random, **kwargs)
 
 
-def _register_mario_stage_env(id, **kwargs):
-    """
-    Register a Super Mario Bros. (1/2) stage environment with OpenAI Gym.
+# a template for making individual stage environments
+_ID_TEMPLATE = 'SuperMarioBros-{}-{}-v{}'
 
-    Args:
-        id (str): id for the env to register
-        kwargs (dict): keyword arguments for the SuperMarioBrosEnv initializer
 
-    Returns:
-        None
+# register every rom mode (versions), world (1-8), and stage (1-4). Gymnasium
+# looks IDs up in its registry by exact name and has no hook for patterns or
+# plugins, so each ID needs its own spec; registering them all takes a few
+# milliseconds once Gymnasium is imported
+for (version, rom_mode), world, stage in itertools.product(enumerate(_ROM_MODES), range(1, 9), range(1, 5)):
+    env_id = _ID_TEMPLATE.format(world, stage, version)
+    _register_mario_env(env_id, rom_mode=rom_mode, target=(world, stage))
 
-    """
-    # register the environment
-    gym.envs.registration.register(
-        id=id,
-        entry_point='gym_super_mario_bros:SuperMarioBrosEnv',
-        max_episode_steps=9999999,
-        reward_threshold=9999999,
-        kwargs=kwargs,
-        nondeterministic=True,
-    )
 
+# create an alias to gym.make for ease of access
+make = gym.make
 
-# a template for making individual stage environments
-_ID_TEMPLATE = 'SuperMarioBros{}-{}-{}-v{}'
-# A list of ROM modes for each level environment
-_ROM_MODES = [
-    'vanilla',
-    'downsample',
-    'pixel',
-    'rectangle'
-]
 
+def make_raw(id, **kwargs):
+    """
+    Make an environment without Gymnasium's wrappers.
 
-# iterate over all the rom modes, worlds (1-8), and stages (1-4)
-for version, rom_mode in enumerate(_ROM_MODES):
-    for world in range(1, 9):
-        for stage in range(1, 5):
-            # create the target
-            target = (world, stage)
-            # setup the frame-skipping environment
-            env_id = _ID_TEMPLATE.format('', world, stage, version)
-            _register_mario_stage_env(env_id, rom_mode=rom_mode, target=target)
+    `gym.make` wraps the environment in a `PassiveEnvChecker`, an
+    `OrderEnforcing` wrapper, and a `TimeLimit` of 9999999 steps, each of which
+    adds Python calls to every step. None of them changes the behavior of the
+    environments in this package, so tight loops (e.g., search or rollouts) can
+    use the bare environment instead.
 
+    Args:
+        id (str): the ID of a registered environment (e.g., 'SuperMarioBros-v0')
+        kwargs (dict): keyword arguments that override the registered ones
 
-# create an alias to gym.make for ease of access
-make = gym.make
+    Returns:
+        the bare SuperMarioBrosEnv or SuperMarioBrosRandomStagesEnv
+
+    """
+    spec = gym.spec(id)
+    if not str(spec.entry_point).startswith('gym_super_mario_bros:'):
+        raise ValueError('{} is not a gym_super_mario_bros environment'.format(id))
+    env_class = gym.envs.registration.load_env_creator(spec.entry_point)
+    env = env_class(**{**spec.kwargs, **kwargs})
+    env.spec = spec
+    return env
 
 
-# define the outward facing API of this module (none, gym provides the API)
-__all__ = [make.__name__]
+# define the outward facing API of this module
+__all__ = [make.__name__, make_raw.__name__]
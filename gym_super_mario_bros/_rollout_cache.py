@@ -0,0 +1,199 @@
+"""A prefix trie of evaluated action sequences that resumes shared prefixes.
+
+The emulator is deterministic, so two action sequences with a common prefix
+pass through the same states until they diverge. Genetic algorithms and
+other population methods evaluate many such sequences. `RolloutCache`
+records every evaluated step in a trie. Every `checkpoint_every` steps it
+keeps a checkpoint of the node in a `CheckpointPool` under a byte budget.
+Evaluating a new sequence emulates as little as the trie allows:
+- a sequence that ends inside the trie is answered from it
+- any other sequence resumes from the deepest checkpoint on its path
+
+Node checkpoints require a backend that can serialize its state. A buffers
+checkpoint is only exact while nes-py's backup slot holds the state it was
+saved from, and the trie must stay exact. On other cores, the cache keeps no
+node checkpoints and emulates every new sequence from the start state.
+
+An `InputLogBackend` loads a checkpoint by replaying its log, so resuming is
+not free there. The cache anchors the backend at the start state, so loading
+a node replays the steps from the start to the node, and it counts those
+frames as emulated (and in `stats['frames_replayed']`).
+"""
+
+from __future__ import annotations
+
+import itertools
+
+import numpy as np
+
+from ._checkpoint_pool import CheckpointPool
+from ._evaluation import RESULT_DTYPE
+from ._evaluation import _start_from
+
+
+class _Node:
+    """The outcome of a step of the trie (or the start, at the root)."""
+
+    __slots__ = (
+        'children',
+        'reward',
+        'frames',
+        'terminated',
+        'truncated',
+        'x_pos',
+        'flag_get',
+        'x_position_best',
+        'stuck_steps',
+        'key',
+    )
+
+    def __init__(self, reward, frames, terminated, truncated, x_pos, flag_get, x_position_best, stuck_steps):
+        self.children = {}
+        # the total reward and emulated frames from the root to this node
+        self.reward = reward
+        self.frames = frames
+        self.terminated = terminated
+        self.truncated = truncated
+        self.x_pos = x_pos
+        self.flag_get = flag_get
+        # the truncation bookkeeping to resume from the node with
+        self.x_position_best = x_position_best
+        self.stuck_steps = stuck_steps
+        # the key of the checkpoint of the node in the pool, if it has one
+        self.key = None
+
+
+class RolloutCache:
+    """Evaluates action sequences from a start state through a prefix trie."""
+
+    def __init__(self, env, checkpoint=None, max_bytes=256 << 20, checkpoint_every=8):
+        """
+        Initialize an empty cache of rollouts.
+
+        Args:
+            env (gym.Env): the (possibly wrapped) SuperMarioBrosEnv to emulate
+                with. The cache loads checkpoints into it
+            checkpoint (SmbCheckpoint): the state every sequence starts from,
+                or None for the current state of `env`
+            max_bytes (int): the budget of the checkpoints of the trie nodes
+            checkpoint_every (int): the number of steps between the nodes
+                that keep checkpoints (if the backend can serialize its
+                state)
+
+        Returns:
+            None
+
+        """
+        if checkpoint_every < 1:
+            raise ValueError('checkpoint_every must be at least 1')
+        self.env = env.unwrapped
+        if checkpoint is None:
+            checkpoint = self.env.save_checkpoint()
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.pool = CheckpointPool(max_bytes)
+        self._keeps_checkpoints = self.env._backend.supports_state
+        self._keys = itertools.count()
+        _start_from(self.env, checkpoint)
+        # load nodes by replaying from the start state, not the episode start
+        self.env._backend.anchor()
+        info = self.env._get_info()
+        self.root = _Node(0.0, 0, False, False, info['x_pos'], info['flag_get'], self.env._x_position_best, 0)
+        self.stats = dict(sequences=0, steps=0, frames_requested=0, frames_emulated=0, frames_replayed=0)
+
+    @property
+    def frames_saved(self):
+        """Return the fraction of requested frames the trie didn't emulate."""
+        if self.stats['frames_requested'] == 0:
+            return 0.0
+        return 1 - self.stats['frames_emulated'] / self.stats['frames_requested']
+
+    def evaluate(self, actions):
+        """
+        Evaluate an action sequence from the start state.
+
+        Args:
+            actions (iterable): the actions to step with. The sequence stops
+                early when the episode ends
+
+        Returns:
+            a `RESULT_DTYPE` record (see `evaluate_sequences`)
+
+        """
+        actions = [int(action) for action in actions]
+        node, depth = self.root, 0
+        resume, resume_depth = self.root, 0
+        # walk the known prefix, noting the deepest checkpoint on it
+        while depth < len(actions) and not (node.terminated or node.truncated):
+            child = node.children.get(actions[depth])
+            if child is None:
+                break
+            node, depth = child, depth + 1
+            if node.key is not None and node.key in self.pool:
+                resume, resume_depth = node, depth
+        if depth < len(actions) and not (node.terminated or node.truncated):
+            node, depth = self._emulate(resume, resume_depth, actions)
+        self.stats['sequences'] += 1
+        self.stats['steps'] += depth
+        self.stats['frames_requested'] += node.frames
+        return np.array(
+            (node.reward, depth, node.terminated, node.truncated, node.x_pos, node.flag_get),
+            dtype=RESULT_DTYPE,
+        )
+
+    def evaluate_batch(self, action_batch):
+        """Return the `RESULT_DTYPE` records of a batch of action sequences."""
+        return np.array([self.evaluate(actions) for actions in action_batch], dtype=RESULT_DTYPE)
+
+    def _emulate(self, node, depth, actions):
+        """Step the actions after a node, extend the trie, and return the end."""
+        env = self.env
+        replayed = env._backend.frames_replayed
+        if node is self.root:
+            _start_from(env, self.checkpoint)
+        else:
+            _start_from(env, self.pool.get(node.key))
+        env._x_position_best = node.x_position_best
+        env._stuck_steps = node.stuck_steps
+        start = env._frame_count
+        # the frame count of the root on the timeline of this emulation
+        frame_count = start - node.frames
+        env._episode_start_frame = frame_count
+        while depth < len(actions):
+            action = actions[depth]
+            _, reward, terminated, truncated, info = env.step(action)
+            depth += 1
+            child = node.children.get(action)
+            if child is None:
+                child = _Node(
+                    node.reward + reward,
+                    env._frame_count - frame_count,
+                    terminated,
+                    truncated,
+                    info['x_pos'],
+                    info['flag_get'],
+                    env._x_position_best,
+                    env._stuck_steps,
+                )
+                node.children[action] = child
+            node = child
+            if terminated or truncated:
+                break
+            # keep (or replace an evicted) checkpoint at the selected depths
+            if (
+                self._keeps_checkpoints
+                and depth % self.checkpoint_every == 0
+                and (node.key is None or node.key not in self.pool)
+            ):
+                checkpoint = env.save_checkpoint()
+                if len(checkpoint._payload) <= self.pool.max_bytes:
+                    node.key = next(self._keys)
+                    self.pool.put(node.key, checkpoint)
+        # the frames the backend replayed to load the node are emulated too
+        replayed = env._backend.frames_replayed - replayed
+        self.stats['frames_replayed'] += replayed
+        self.stats['frames_emulated'] += env._frame_count - start + replayed
+        return node, depth
+
+
+__all__ = [RolloutCache.__name__]
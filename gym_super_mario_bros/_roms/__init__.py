@@ -1,10 +1,12 @@
 """Methods for ROM file management."""
 from .decode_target import decode_target
 from .rom_path import rom_path
+from .rom_registry import load_rom
 
 
 # explicitly define the outward facing API of this package
 __all__ = [
     decode_target.__name__,
+    load_rom.__name__,
     rom_path.__name__,
 ]
@@ -48,21 +48,16 @@ class INESHeader:
         return self.chr_rom_size_8kb_units * 8 * 1024
 
 
-def read_ines_header(rom_path: str | Path) -> INESHeader:
-    """Read and validate the first 16 bytes of an iNES ROM.
+def parse_ines_header(data: bytes) -> INESHeader:
+    """Validate and parse the iNES header at the start of ROM bytes.
 
     Returns:
         INESHeader with fields as Python ints (never numpy scalars).
 
     Raises:
-        ValueError: if the file is missing / too small / invalid header.
+        ValueError: if the data is too small / has an invalid header.
     """
 
-    p = Path(rom_path)
-    if not p.exists():
-        raise ValueError(f"rom_path points to non-existent file: {p}.")
-
-    data = p.read_bytes()
     if len(data) < 16:
         raise ValueError("ROM file is too small to contain an iNES header.")
     if data[:4] != _INES_MAGIC:
@@ -80,6 +75,26 @@ def read_ines_header(rom_path: str | Path) -> INESHeader:
     return INESHeader(prg_rom_size_16kb_units=prg, chr_rom_size_8kb_units=chr_, flags6=flags6)
 
 
+def read_ines_header(rom_path: str | Path) -> INESHeader:
+    """Read and validate the first 16 bytes of an iNES ROM.
+
+    Returns:
+        INESHeader with fields as Python ints (never numpy scalars).
+
+    Raises:
+        ValueError: if the file is missing / too small / invalid header.
+    """
+
+    p = Path(rom_path)
+    if not p.exists():
+        raise ValueError(f"rom_path points to non-existent file: {p}.")
+
+    # only the header is needed, don't read the whole ROM
+    with p.open("rb") as f:
+        data = f.read(16)
+    return parse_ines_header(data)
+
+
 def ensure_rom_ok(rom_path: str | Path) -> str:
     """Validate ROM header and return the path as a string.
 
@@ -0,0 +1,102 @@
+"""A process-wide registry of validated, memory-mapped ROM images.
+
+Each ROM is opened, validated, and hashed once per process. Its bytes are
+memory-mapped read-only, and nes-py's Python `ROM` parses its header from
+that map instead of reading the file again for every environment. The
+emulator core doesn't use the map: nes-py's C++ core opens and reads the
+ROM file itself for each environment, so every core keeps a private copy.
+
+The SHA-256 hash identifies the ROM contents independently of its path. It
+is the key for anything derived from emulating a ROM, like cached states and
+checkpoints.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import threading
+from dataclasses import dataclass
+
+from .rom_compat import INESHeader, parse_ines_header
+
+
+@dataclass(frozen=True)
+class RomImage:
+    """A validated ROM shared by all environments in the process."""
+
+    # the absolute path to the ROM file
+    path: str
+    # the parsed iNES header
+    header: INESHeader
+    # the SHA-256 hex digest of the ROM bytes
+    sha256: str
+    # the read-only memory map of the ROM bytes
+    data: mmap.mmap
+
+
+# the registered ROM images keyed by absolute path
+_IMAGES: dict[str, RomImage] = {}
+
+
+# a lock to register each ROM exactly once
+_LOCK = threading.Lock()
+
+
+def load_rom(rom_path) -> RomImage:
+    """
+    Return the registered image of a ROM, validating it on first use.
+
+    Args:
+        rom_path (str): the path to the ROM file
+
+    Returns:
+        the RomImage for the ROM
+
+    Raises:
+        ValueError: if the file is missing or has an invalid iNES header
+
+    """
+    path = os.path.abspath(rom_path)
+    image = _IMAGES.get(path)
+    if image is not None:
+        return image
+    with _LOCK:
+        image = _IMAGES.get(path)
+        if image is None:
+            image = _map_rom(path)
+            _IMAGES[path] = image
+    return image
+
+
+def registered_rom(rom_path) -> RomImage | None:
+    """Return the image of a ROM if it has been registered, None otherwise."""
+    return _IMAGES.get(os.path.abspath(rom_path))
+
+
+def _map_rom(path: str) -> RomImage:
+    """Memory-map, validate, and hash a ROM file."""
+    try:
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # mmap raises ValueError for empty files
+        if not os.path.isfile(path):
+            raise ValueError(f"rom_path points to non-existent file: {path}.")
+        raise ValueError("ROM file is too small to contain an iNES header.")
+    try:
+        header = parse_ines_header(data[:16])
+    except ValueError:
+        data.close()
+        raise
+    sha256 = hashlib.sha256(data).hexdigest()
+    return RomImage(path=path, header=header, sha256=sha256, data=data)
+
+
+# explicitly define the outward facing API of this module
+__all__ = [
+    RomImage.__name__,
+    load_rom.__name__,
+    registered_rom.__name__,
+]
@@ -0,0 +1,140 @@
+"""A fixed set of emulator snapshot slots for search and planning.
+
+`save_checkpoint()` builds a new `SmbCheckpoint` (and, on cores without state
+serialization, moves nes-py's reset backup, which the next `reset()` has to
+emulate again). Search code that saves and loads
+states millions of times wants neither: `SnapshotStore` preallocates one
+contiguous buffer with a slot per snapshot, the core dumps its state straight
+into a slot, and loading reads it straight back. The reset backup is never
+touched, so `reset()` still returns to the start of the episode.
+
+The states of an `InputLogBackend` grow with the episode; the store keeps
+them as separate bytes objects instead of slots of one buffer. Saving one
+stays cheap, but loading one replays the episode since the reset (or the
+backend's anchor), so a load costs O(episode length) frames of emulation.
+Only backends with native states (or a `ReplayBackend`) load in O(1).
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+class SnapshotStore:
+    """Numbered emulator snapshot slots of a `SuperMarioBrosEnv`."""
+
+    def __init__(self, env, slots):
+        """
+        Initialize a store of snapshot slots.
+
+        Args:
+            env (gym.Env): the (possibly wrapped) SuperMarioBrosEnv to snapshot
+            slots (int): the number of slots to preallocate
+
+        Returns:
+            None
+
+        """
+        env = env.unwrapped
+        if not env._backend.supports_state:
+            raise RuntimeError(
+                'the emulator backend does not support state serialization; '
+                'construct the env with backend=InputLogBackend'
+            )
+        if slots < 1:
+            raise ValueError('slots must be at least 1')
+        self.env = env
+        state_size = env._backend.state_size()
+        if state_size is None:
+            self._states = [b''] * slots
+        else:
+            self._states = np.zeros((slots, state_size), dtype=np.uint8)
+        # the bookkeeping of each slot (time, x position, frame count, done,
+        # best x position, stuck steps, and the section of the best position)
+        self._bookkeeping = np.zeros((slots, 7), dtype=np.int64)
+        self._used = np.zeros(slots, dtype=bool)
+
+    def __len__(self):
+        """Return the number of slots."""
+        return len(self._states)
+
+    @property
+    def nbytes(self):
+        """Return the number of bytes of the preallocated slots."""
+        if isinstance(self._states, list):
+            states = sum(len(state) for state in self._states)
+        else:
+            states = self._states.nbytes
+        return states + self._bookkeeping.nbytes + self._used.nbytes
+
+    def save(self, slot):
+        """
+        Save the current state of the environment to a slot.
+
+        Args:
+            slot (int): the index of the slot to overwrite
+
+        Returns:
+            None
+
+        """
+        env = self.env
+        if isinstance(self._states, list):
+            self._states[slot] = env._backend.dump_state()
+        else:
+            env._backend.dump_state(self._states[slot])
+        self._bookkeeping[slot] = (
+            env._time_last,
+            env._x_position_last,
+            env._frame_count,
+            env.done,
+            env._x_position_best,
+            env._stuck_steps,
+            env._stuck_section,
+        )
+        self._used[slot] = True
+
+    def load(self, slot):
+        """
+        Restore the environment to the state saved in a slot.
+
+        On an `InputLogBackend` this replays the frames of the snapshot since
+        the reset (see `InputLogBackend.anchor`).
+
+        Args:
+            slot (int): the index of the slot to restore
+
+        Returns:
+            None
+
+        """
+        if not self._used[slot]:
+            raise ValueError('snapshot slot {} is empty'.format(slot))
+        env = self.env
+        env._backend.load_state(self._states[slot])
+        time_last, x_position_last, frame_count, done, x_position_best, stuck_steps, stuck_section = \
+            self._bookkeeping[slot].tolist()
+        env._time_last = time_last
+        env._x_position_last = x_position_last
+        env._frame_count = frame_count
+        env.done = bool(done)
+        env._x_position_best = x_position_best
+        env._stuck_steps = stuck_steps
+        env._stuck_section = stuck_section
+
+    def clear(self, slot=None):
+        """Mark a slot (or every slot if None) as empty."""
+        if slot is None:
+            self._used[:] = False
+        else:
+            self._used[slot] = False
+        if isinstance(self._states, list):
+            for index in range(len(self)) if slot is None else [slot]:
+                self._states[index] = b''
+
+    def __contains__(self, slot):
+        """Return True if a slot holds a snapshot."""
+        return 0 <= slot < len(self) and bool(self._used[slot])
+
+
+__all__ = [SnapshotStore.__name__]
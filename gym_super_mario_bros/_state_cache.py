@@ -0,0 +1,124 @@
+"""A persistent cache of emulator states after the start screen.
+
+Constructing a `SuperMarioBrosEnv` emulates the title screen and the level
+intro before the first episode can start. The resulting state only depends on
+the ROM, the ROM mode, the target, and the versions of nes-py and this
+package, so it is cached on disk under a key derived from those values and
+the backend and payload format that dumped it.
+
+Only a backend that loads its states natively benefits: an `InputLogBackend`
+state replays the start screen to load, which costs as much as emulating it,
+so environments on that backend skip the cache.
+
+Point the cache at a tmpfs like `/dev/shm` to share it between workers on a
+machine without touching the disk.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+from importlib import metadata
+from pathlib import Path
+
+
+# the environment variable that enables the cache with a directory
+CACHE_DIR_ENV = 'GYM_SUPER_MARIO_BROS_STATE_CACHE'
+
+
+# the file extension of cached states
+_SUFFIX = '.state'
+
+
+@functools.lru_cache(maxsize=None)
+def _version(distribution: str) -> str:
+    """Return the installed version of a distribution (or 'unknown')."""
+    try:
+        return metadata.version(distribution)
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+def default_cache_dir() -> Path:
+    """Return the per-user cache directory for emulator states."""
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join('~', '.cache')
+    return Path(root).expanduser() / 'gym-super-mario-bros' / 'states'
+
+
+def resolve_cache_dir(state_cache) -> Path | None:
+    """
+    Return the cache directory for a `state_cache` argument.
+
+    Args:
+        state_cache (None, bool, str, Path): the cache setting
+            - None: use the directory in $GYM_SUPER_MARIO_BROS_STATE_CACHE
+              if it is set, otherwise disable the cache
+            - False: disable the cache
+            - True: use the per-user cache directory
+            - str/Path: use the given directory (e.g., under /dev/shm)
+
+    Returns:
+        the cache directory or None if caching is disabled
+
+    """
+    if state_cache is None:
+        state_cache = os.environ.get(CACHE_DIR_ENV) or False
+    if state_cache is False:
+        return None
+    if state_cache is True:
+        return default_cache_dir()
+    return Path(state_cache).expanduser()
+
+
+def cache_key(rom_hash, rom_mode, target, backend, payload_format) -> str:
+    """
+    Return the cache key of the post-start-screen state of an environment.
+
+    Args:
+        rom_hash (str): the SHA-256 of the ROM the environment runs
+        rom_mode (str): the ROM mode of the environment
+        target (tuple): the (world, stage, area) target or (None, None, None)
+        backend (type): the class of the backend that dumps the state
+        payload_format (str): the format of the state (e.g., `PAYLOAD_STATE`)
+
+    Returns:
+        a hex digest identifying the state
+
+    """
+    parts = (
+        rom_hash,
+        str(rom_mode),
+        repr(tuple(target)),
+        '{}.{}'.format(backend.__module__, backend.__qualname__),
+        str(payload_format),
+        _version('nes-py'),
+        _version('gym-super-mario-bros'),
+    )
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def load(cache_dir: Path, key: str) -> bytes | None:
+    """Return the cached state for a key or None on a cache miss."""
+    try:
+        return (cache_dir / (key + _SUFFIX)).read_bytes()
+    except OSError:
+        return None
+
+
+def store(cache_dir: Path, key: str, state: bytes) -> None:
+    """Atomically write a state to the cache (concurrent writers are safe)."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / (key + _SUFFIX)
+    tmp = path.with_name('{}.{}.tmp'.format(path.name, os.getpid()))
+    tmp.write_bytes(state)
+    os.replace(tmp, path)
+
+
+__all__ = [
+    cache_key.__name__,
+    default_cache_dir.__name__,
+    load.__name__,
+    resolve_cache_dir.__name__,
+    store.__name__,
+]
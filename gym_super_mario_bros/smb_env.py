@@ -1,18 +1,35 @@
 """An OpenAI Gym environment for Super Mario Bros. and Lost Levels."""
 from collections import defaultdict
+import copy
+import time
+
+import numpy as np
+
+# NumPy 2.0 removed `np.bool8`; Gym<=0.26 (imported by nes-py) still
+# references it, so alias it before importing nes-py.
+if not hasattr(np, "bool8"):
+    np.bool8 = np.bool_
 
 from nes_py import NESEnv
 
 # Remove pickle-based checkpointing here; use shared checkpoint dataclass.
 
+from ._backend import NesPyBackend
+from ._checkpoint import MAX_DELTA_CHAIN
+from ._checkpoint import PAYLOAD_BUFFERS
+from ._checkpoint import PAYLOAD_STATE
 from ._checkpoint import SmbCheckpoint
+from ._checkpoint_arena import CheckpointHandle
+from ._checkpoint_delta import encode_delta
+from ._snapshot_store import SnapshotStore
+from . import _state_cache
 
-import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
 from ._roms import decode_target
+from ._roms import load_rom
 from ._roms import rom_path
-from ._roms.rom_compat import ensure_rom_ok
+from ._roms.rom_registry import registered_rom
 
 # --- nes-py compatibility patch ---
 # Some nes-py versions use numpy scalars when computing ROM sizes.
@@ -30,11 +47,47 @@ try:
 
     setattr(_nes_rom.ROM, 'prg_rom_size', property(_prg_rom_size_pyint))
     setattr(_nes_rom.ROM, 'chr_rom_size', property(_chr_rom_size_pyint))
+
+    _rom_init = _nes_rom.ROM.__init__
+
+    def _rom_init_registered(self, rom_path):  # type: ignore[override]
+        # reuse the memory-mapped bytes of a ROM the registry validated
+        # instead of reading the file again
+        image = registered_rom(rom_path) if isinstance(rom_path, str) else None
+        if image is None:
+            return _rom_init(self, rom_path)
+        self.raw_data = np.frombuffer(image.data, dtype=np.uint8)
+        # keep nes-py's header checks; the mapped file may have been
+        # rewritten since the registry validated it
+        if not np.array_equal(self._magic, self._MAGIC):
+            raise ValueError('ROM missing magic number in header.')
+        if self._zero_fill != 0:
+            raise ValueError('ROM header zero fill bytes are not zero.')
+
+    setattr(_nes_rom.ROM, '__init__', _rom_init_registered)
 except Exception:
     # If nes-py changes its internals, we still want to import and run.
     pass
 
 
+# attributes of the episode bookkeeping that are pickled with the emulator
+# snapshots
+_PICKLED_ATTRIBUTES = (
+    'done',
+    'spec',
+    'stats',
+    '_time_last',
+    '_x_position_last',
+    '_x_position_best',
+    '_stuck_steps',
+    '_stuck_section',
+    '_frame_count',
+    '_episode_start_time',
+    '_episode_start_frame',
+    '_respawn_snapshots',
+)
+
+
 # create a dictionary mapping value of status register to string names
 _STATUS_MAP = defaultdict(lambda: 'fireball', {0:'small', 1: 'tall'})
 
@@ -54,6 +107,49 @@ _ENEMY_TYPE_ADDRESSES = [0x0016, 0x0017, 0x0018, 0x0019, 0x001A]
 _STAGE_OVER_ENEMIES = np.array([0x2D, 0x31])
 
 
+# RAM values carried over a death that a life-start snapshot must be patched
+# with: life counter, coin tally, score digits, and coin digits
+_LIFE_CARRY_OVER_ADDRESSES = np.array(
+    [0x075a, 0x075e] + list(range(0x07de, 0x07de + 6)) + [0x07ed, 0x07ee]
+)
+
+
+def _reset_checkpoint(options, rng):
+    """
+    Return the checkpoint that the options of `reset` start the episode from.
+
+    Args:
+        options (dict): the options of `reset`, which may hold
+            - 'checkpoint': a checkpoint to start from
+            - 'checkpoints': checkpoints to sample the start from
+            - 'weights': the weights to sample the checkpoints with (None
+              for uniform sampling)
+        rng: the NumPy random generator (or RandomState) to sample with
+
+    Returns:
+        the SmbCheckpoint to start from, or None to start as usual
+
+    """
+    if not options:
+        return None
+    if 'checkpoint' in options:
+        if 'checkpoints' in options:
+            raise ValueError("pass either the 'checkpoint' or the 'checkpoints' option, not both")
+        return options['checkpoint']
+    checkpoints = options.get('checkpoints')
+    if checkpoints is None:
+        return None
+    if len(checkpoints) == 0:
+        raise ValueError("the 'checkpoints' option must not be empty")
+    weights = options.get('weights')
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != (len(checkpoints),):
+            raise ValueError("the 'weights' option must hold a weight per checkpoint")
+        weights = weights / weights.sum()
+    return checkpoints[int(rng.choice(len(checkpoints), p=weights))]
+
+
 class SuperMarioBrosEnv(NESEnv, gym.Env):
     """An environment for playing Super Mario Bros with OpenAI Gym."""
 
@@ -66,56 +162,97 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
     # the legal range of rewards for each step
     reward_range = (-15, 15)
 
-    # Gym 0.26+ expects the "new" API. nes-py still implements the legacy API.
-    # We wrap reset/step to match what Gym wrappers want.
-
     def reset(self, seed=None, options=None, return_info=None):
-        """Reset and return (obs, info) per the Gymnasium API."""
-        # Initialize Gymnasium's seeding / episode bookkeeping.
-        gym.Env.reset(self, seed=seed, options=options)
+        """
+        Reset and return (obs, info) per the Gymnasium API.
 
-        # nes-py has historically implemented the pre-Gymnasium reset signature.
-        # Newer versions may accept `seed`, but not `options`/`return_info`.
-        # Some newer versions may already return (obs, info).
-        # Use feature detection so we're compatible across versions.
-        try:
-            out = super(SuperMarioBrosEnv, self).reset(seed=seed, options=options, return_info=return_info)
-        except TypeError:
-            try:
-                out = super(SuperMarioBrosEnv, self).reset(seed=seed)
-            except TypeError:
-                out = super(SuperMarioBrosEnv, self).reset()
+        Args:
+            seed (int): the seed of the random generator, or None
+            options (dict): start the episode from `{'checkpoint': ckpt}`,
+                or from a checkpoint sampled from `{'checkpoints': [...],
+                'weights': [...]}` (the weights are optional). Later resets
+                without options start from the beginning again
 
-        # Pass through Gymnasium-style (obs, info).
-        if isinstance(out, tuple) and len(out) == 2:
-            obs, info = out
-            # Ensure info is a dict for downstream expectations.
-            return obs, (info if isinstance(info, dict) else {})
+        Returns:
+            the observation and info of the start of the episode
 
-        # Legacy nes-py: returns observation only.
-        return out, {}
+        """
+        # Initialize Gymnasium's seeding / episode bookkeeping.
+        gym.Env.reset(self, seed=seed, options=options)
+        # seed the legacy nes-py RNG
+        self.seed(seed)
+        checkpoint = _reset_checkpoint(options, self.np_random)
+        # call the before reset callback
+        self._will_reset()
+        # reset the emulator to the start of the episode. a checkpoint replaces
+        # the state, so emulating the start again would be wasted on it
+        if self._backup_moved and checkpoint is None:
+            self._boot(power_cycle=True)
+        elif self._has_backup:
+            self._restore()
+        else:
+            self._backend.reset()
+        # start the episode from a checkpoint instead
+        if checkpoint is not None:
+            self.load_checkpoint(checkpoint)
+        # call the after reset callback
+        self._did_reset()
+        # set the done flag to false
+        self.done = False
+        # start the rewind history of the episode at its first frame
+        if self._rewind is not None:
+            self._rewind.clear()
+            self._rewind_count = 0
+            self._rewind_snapshot()
+        return self.screen, {}
 
     def step(self, action):
-        """Step and return (obs, reward, terminated, truncated, info)."""
-        out = super(SuperMarioBrosEnv, self).step(action)
-
-        # Legacy nes-py: (obs, reward, done, info)
-        if isinstance(out, tuple) and len(out) == 4:
-            obs, reward, done, info = out
-            terminated = bool(done) or bool(self._get_done())
-            truncated = False
-            return obs, reward, terminated, truncated, info
+        """
+        Run one frame of the NES and return the relevant observation data.
 
-        # Gymnasium-style: (obs, reward, terminated, truncated, info)
-        if isinstance(out, tuple) and len(out) == 5:
-            obs, reward, terminated, truncated, info = out
-            terminated = bool(terminated) or bool(self._get_done())
-            return obs, reward, terminated, bool(truncated), info
+        Args:
+            action (byte): the bitmap determining which buttons to press
 
-        raise ValueError(f"Unexpected step() return from nes-py env: {type(out)!r} / {out!r}")
+        Returns:
+            a tuple of:
+            - state (np.ndarray): next frame as a result of the given action
+            - reward (float) : amount of reward returned after given action
+            - terminated (boolean): whether the episode has ended
+            - truncated (boolean): whether a truncation budget ran out
+            - info (dict): contains auxiliary diagnostic information
 
-    # --- existing code ---
-    def __init__(self, rom_mode='vanilla', lost_levels=False, target=None):
+        """
+        # if the environment is done, raise an error
+        if self.done:
+            raise ValueError('cannot step in a done environment! call `reset`')
+        # emulate the frame with the action on the controller
+        self._frame_advance(action)
+        # get the reward, done flag, and info for this step
+        reward = float(self._get_reward())
+        self.done = bool(self._get_done())
+        info = self._get_info()
+        # call the after step callback
+        self._did_step(self.done)
+        # bound the reward in [min, max]
+        reward = min(max(reward, self.reward_range[0]), self.reward_range[1])
+        # the callback may have skipped to a game over
+        terminated = self.done or bool(self._get_done())
+        truncated = not terminated and self._get_truncated()
+        # snapshot the state into the rewind history every few frames
+        if self._rewind is not None and not self.done and self._frame_count >= self._rewind_next_frame:
+            self._rewind_snapshot()
+        return self.screen, reward, terminated, truncated, info
+
+    def __init__(self, rom_mode='vanilla', lost_levels=False, target=None,
+        fast_respawn=False,
+        max_stuck_steps=None,
+        max_episode_seconds=None,
+        max_episode_frames=None,
+        state_cache=None,
+        backend=None,
+        rewind_every=None,
+        rewind_capacity=64,
+    ):
         """
         Initialize a new Super Mario Bros environment.
 
@@ -125,6 +262,116 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
                 - False: load original Super Mario Bros.
                 - True: load Super Mario Bros. Lost Levels
             target (tuple): a tuple of the (world, stage) to play as a level
+            fast_respawn (bool): whether to respawn Mario after a death by
+                restoring a cached life-start snapshot instead of emulating
+                the lives screen. The frame counter, random number generator,
+                and timers then differ from an emulated respawn. Requires a
+                backend that can serialize its state (raises ValueError
+                otherwise) and only saves time if it loads states without
+                replaying them (not `InputLogBackend`)
+            max_stuck_steps (int): truncate the episode after this many steps
+                without Mario passing his best horizontal position in the
+                area (None to disable). Any increase of the position would
+                let a policy that jitters against a pipe run forever
+            max_episode_seconds (float): truncate the episode after this
+                much wall-clock time (None to disable)
+            max_episode_frames (int): truncate the episode after this many
+                emulated frames, including skipped ones (None to disable)
+            state_cache (None, bool, str): where to cache the emulator state
+                after the start screen between processes (see
+                `_state_cache.resolve_cache_dir`). Requires a backend that can
+                serialize its state (raises ValueError otherwise; the cache
+                directory of the environment variable is ignored then), and
+                is skipped by one that replays states to load them
+            backend (ReplayBackend, type): an emulator backend to drive
+                instead of a nes-py core (e.g., a replay of recorded frames
+                for testing and benchmarking), a backend class to construct
+                around the nes-py core (e.g., `InputLogBackend` to serialize
+                states on any nes-py build), or None for `NesPyBackend`
+            rewind_every (int): snapshot the emulator every this many frames
+                into a ring buffer that `rewind` restores from (None to
+                disable). Requires a backend that can serialize its state
+                (raises ValueError otherwise)
+            rewind_capacity (int): the number of snapshots in the ring buffer
+
+        Returns:
+            None
+
+        """
+        # store the constructor arguments to pickle the environment with
+        self._init_kwargs = dict(
+            rom_mode=rom_mode,
+            lost_levels=lost_levels,
+            target=target,
+            fast_respawn=fast_respawn,
+            max_stuck_steps=max_stuck_steps,
+            max_episode_seconds=max_episode_seconds,
+            max_episode_frames=max_episode_frames,
+            state_cache=state_cache,
+            backend=backend,
+            rewind_every=rewind_every,
+            rewind_capacity=rewind_capacity,
+        )
+        self._setup(**self._init_kwargs)
+        # reset the emulator
+        obs, _info = self.reset()
+        self._boot()
+
+    def _boot(self, power_cycle=False):
+        """
+        Play the start of the game and back it up to restore on `reset`.
+
+        Args:
+            power_cycle (bool): whether to hard reset the emulator first and
+                clear its RAM like at power on (a warm reset keeps values like
+                the top score in RAM, which changes the start state)
+
+        Returns:
+            None
+
+        """
+        if power_cycle:
+            self._backend.reset()
+            if self._backend.boots_to_title_screen:
+                self.ram[:] = 0
+        # skip the start screen, or load the state after it from the cache. a
+        # backend that starts in game (i.e., a replay) needs neither, and one
+        # that replays states to load them would emulate the screen anyway
+        if self._backend.boots_to_title_screen:
+            cache_dir = None
+            if self._backend.supports_state and not self._backend.replays_states:
+                cache_dir = _state_cache.resolve_cache_dir(self._init_kwargs['state_cache'])
+            if cache_dir is None:
+                self._skip_start_screen()
+            else:
+                target = self._target_world, self._target_stage, self._target_area
+                key = _state_cache.cache_key(
+                    self._rom_image.sha256,
+                    self._init_kwargs['rom_mode'],
+                    target,
+                    type(self._backend),
+                    PAYLOAD_STATE,
+                )
+                self._skip_start_screen_cached(cache_dir, key)
+        # create a backup state to restore from on subsequent calls to reset
+        self._backup()
+        self._backup_moved = False
+
+    def _setup(self, rom_mode, lost_levels, target, fast_respawn,
+        max_stuck_steps,
+        max_episode_seconds,
+        max_episode_frames,
+        state_cache,
+        backend,
+        rewind_every,
+        rewind_capacity,
+    ):
+        """
+        Setup the emulator and the environment state.
+
+        Args:
+            see `__init__`; `state_cache` is only used to skip the start
+            screen, which `__init__` does after this setup
 
         Returns:
             None
@@ -132,10 +379,24 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
         """
         # decode the ROM path based on mode and lost levels flag
         rom = rom_path(lost_levels, rom_mode)
-        # validate ROM header before nes-py touches it
-        rom = ensure_rom_ok(rom)
-        # initialize the super object with the ROM path
-        super(SuperMarioBrosEnv, self).__init__(rom)
+        # validate the ROM once per process before nes-py touches it
+        self._rom_image = load_rom(rom)
+        if backend is None or isinstance(backend, type):
+            # initialize the super object with the ROM path
+            super(SuperMarioBrosEnv, self).__init__(self._rom_image.path)
+            backend = (backend or NesPyBackend)(self)
+        else:
+            # setup the NESEnv attributes without starting a nes-py core
+            self.np_random = np.random.RandomState()
+            self._rom_path = self._rom_image.path
+            self._env = None
+            self.viewer = None
+            self._has_backup = False
+            self.done = True
+            self.ram = backend.ram
+            self.screen = backend.screen
+            self.controllers = backend.controllers
+        self._backend = backend
         # set the target world, stage, and area variables
         target = decode_target(target, lost_levels)
         self._target_world, self._target_stage, self._target_area = target
@@ -143,12 +404,56 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
         self._time_last = 0
         # setup a variable to keep track of the last frames x position
         self._x_position_last = 0
-        # reset the emulator
-        obs, _info = self.reset()
-        # skip the start screen
-        self._skip_start_screen()
-        # create a backup state to restore from on subsequent calls to reset
-        self._backup()
+        # the features built on emulator states fail loudly without them
+        needs_state = dict(
+            fast_respawn=fast_respawn,
+            rewind_every=rewind_every is not None,
+            state_cache=state_cache not in (None, False),
+        )
+        for name, enabled in needs_state.items():
+            if enabled and not backend.supports_state:
+                raise ValueError(
+                    '{} needs a backend that can serialize its state; this nes-py core '
+                    'cannot, pass backend=InputLogBackend'.format(name)
+                )
+        # setup the life-start snapshots keyed by the respawn point
+        self._fast_respawn = fast_respawn
+        self._respawn_snapshots = {}
+        # setup the ring buffer of rewind snapshots
+        self._rewind = None
+        self._rewind_every = rewind_every
+        if rewind_every is not None:
+            if rewind_every < 1:
+                raise ValueError('rewind_every must be at least 1')
+            self._rewind = SnapshotStore(self, rewind_capacity)
+        self._rewind_count = 0
+        self._rewind_next_frame = 0
+        # setup a counter of emulated frames
+        self._frame_count = 0
+        # setup the last saved checkpoint and its full payload, the usual
+        # base of the next delta checkpoint
+        self._last_checkpoint = None
+        # whether a buffers checkpoint moved the backup off the start state
+        self._backup_moved = False
+        # setup the progress-based truncation budgets
+        self._max_stuck_steps = max_stuck_steps
+        self._max_episode_seconds = max_episode_seconds
+        self._max_episode_frames = max_episode_frames
+        # setup the episode bookkeeping for the truncation budgets
+        self._x_position_best = 0
+        self._stuck_steps = 0
+        self._stuck_section = 0
+        self._episode_start_time = 0
+        self._episode_start_frame = 0
+        # setup counters describing the work the environment has done
+        self.stats = dict(
+            fast_respawns=0,
+            respawn_frames_avoided=0,
+            respawn_frames_replayed=0,
+            truncated_stuck=0,
+            truncated_seconds=0,
+            truncated_frames=0,
+        )
 
     @property
     def is_single_stage_env(self):
@@ -342,6 +647,20 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
         """Return a boolean determining if the agent reached a flag."""
         return self._is_world_over or self._is_stage_over
 
+    @property
+    def _section(self):
+        """Return a key of the life and area that Mario's x position is in."""
+        # a respawn changes the lives and an area change (e.g., a pipe) the
+        # world, stage, or area, which both move x without any progress
+        ram = self.ram
+        return int(ram[0x075a]) << 24 | int(ram[0x075f]) << 16 | int(ram[0x075c]) << 8 | int(ram[0x0760])
+
+    @property
+    def _respawn_point(self):
+        """Return a key identifying where Mario respawns after a death."""
+        # 0x075b holds the page Mario restarts on (nonzero past the midpoint)
+        return self._world, self._stage, self._area, int(self.ram[0x075b])
+
     # MARK: RAM Hacks
 
     def _write_stage(self):
@@ -389,6 +708,31 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
             self._frame_advance(8)
             self._frame_advance(0)
 
+    def _skip_start_screen_cached(self, cache_dir, key):
+        """
+        Skip the start screen by loading the state after it from a cache.
+
+        Args:
+            cache_dir (Path): the directory of the state cache
+            key (str): the cache key of the state after the start screen
+
+        Returns:
+            None
+
+        """
+        state = _state_cache.load(cache_dir, key)
+        if state is not None:
+            try:
+                self._load_state(state)
+            except ValueError:
+                # a state from another build of the core, replace it
+                state = None
+            else:
+                self._time_last = self._time
+        if state is None:
+            self._skip_start_screen()
+            _state_cache.store(cache_dir, key, self._dump_state())
+
     def _skip_end_of_world(self):
         """Skip the cutscene that plays at the end of a world."""
         if self._is_world_over:
@@ -406,6 +750,85 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
         # step forward one frame
         self._frame_advance(0)
 
+    def _restore_life_start(self, respawn_point):
+        """
+        Respawn Mario from a cached life-start snapshot.
+
+        Args:
+            respawn_point (tuple): the respawn point key of the dying Mario
+
+        Returns:
+            True if a snapshot was restored, False if the respawn must be
+            emulated (and cached with `_cache_life_start`)
+
+        """
+        if respawn_point not in self._respawn_snapshots:
+            return False
+        carry_over = self.ram[_LIFE_CARRY_OVER_ADDRESSES].copy()
+        # the lives screen is what decrements the life counter
+        carry_over[0] -= 1
+        state, frames = self._respawn_snapshots[respawn_point]
+        replayed = self._backend.frames_replayed
+        self._load_state(state)
+        replayed = self._backend.frames_replayed - replayed
+        self.ram[_LIFE_CARRY_OVER_ADDRESSES] = carry_over
+        self.stats['fast_respawns'] += 1
+        # a backend that loads by replaying frames may cost more than it saves
+        self.stats['respawn_frames_replayed'] += replayed
+        self.stats['respawn_frames_avoided'] += frames - replayed
+        return True
+
+    def _cache_life_start(self, respawn_point, frames):
+        """
+        Cache the current state as the life-start snapshot of a respawn point.
+
+        Args:
+            respawn_point (tuple): the respawn point key of the dead Mario
+            frames (int): the number of frames emulated to respawn
+
+        Returns:
+            None
+
+        """
+        self._respawn_snapshots[respawn_point] = self._dump_state(), frames
+
+    def _dump_state(self):
+        """Return the complete emulator state as opaque bytes."""
+        return self._backend.dump_state()
+
+    def _load_state(self, state):
+        """Restore the complete emulator state from `_dump_state` bytes."""
+        self._backend.load_state(state)
+
+    # MARK: Emulator primitives
+
+    def _frame_advance(self, action):
+        """Advance a frame in the emulator with an action and count it."""
+        self._frame_count += 1
+        self.controllers[0][:] = action
+        self._backend.step()
+
+    def _backup(self):
+        """Backup the emulator state to restore on `reset`."""
+        self._backend.backup()
+        self._has_backup = True
+
+    def _restore(self):
+        """Restore the emulator state from the backup."""
+        self._backend.restore()
+
+    def close(self):
+        """Close the environment."""
+        # make sure the environment hasn't already been closed
+        if self._backend is None:
+            raise ValueError('env has already been closed.')
+        self._backend.close()
+        self._backend = None
+        self._env = None
+        # if there is an image viewer open, delete it
+        if self.viewer is not None:
+            self.viewer.close()
+
     # MARK: Reward Function
 
     @property
@@ -452,24 +875,36 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
         """Handle any RAM hacking after a reset occurs."""
         self._time_last = self._time
         self._x_position_last = self._x_position
+        self._x_position_best = self._x_position
+        self._stuck_steps = 0
+        self._stuck_section = self._section
+        self._episode_start_time = time.monotonic()
+        self._episode_start_frame = self._frame_count
 
-    def _did_step(self, terminated, truncated=None):
-        """Handle any RAM hacking after a step occurs.
-
-        Newer nes-py versions call this as `_did_step(terminated, truncated)`.
-        Older versions call it as `_did_step(done)`.
+    def _did_step(self, done):
         """
-        # Support both calling conventions.
-        if truncated is None:
-            done = bool(terminated)
-        else:
-            done = bool(terminated) or bool(truncated)
+        Handle any RAM hacking after a step occurs.
+
+        Args:
+            done (bool): whether the step ended the episode
+
+        Returns:
+            None
 
+        """
         # if done flag is set a reset is incoming anyway, ignore any hacking
         if done:
             return
-        # if mario is dying, then cut to the chase and kill hi,
+        # the respawn point to cache a life-start snapshot for
+        respawn_point = None
+        # if mario is dying, then cut to the chase and kill him
         if self._is_dying:
+            # respawn from a snapshot unless this death ends the game
+            if self._fast_respawn and self._life != 0:
+                respawn_point = self._respawn_point
+                if self._restore_life_start(respawn_point):
+                    return
+                frame_count = self._frame_count
             self._kill_mario()
         # skip world change scenes (must call before other skip methods)
         if not self.is_single_stage_env:
@@ -479,6 +914,10 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
         # skip occupied states like the black screen between lives that shows
         # how many lives the player has left
         self._skip_occupied_states()
+        # Mario is back in control, so this is the start of his new life
+        if respawn_point is not None:
+            frames = self._frame_count - frame_count
+            self._cache_life_start(respawn_point, frames)
 
     def _get_reward(self):
         """Return the reward after a step occurs."""
@@ -490,6 +929,37 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
             return self._is_dying or self._is_dead or self._flag_get
         return self._is_game_over
 
+    def _get_truncated(self):
+        """Return True if a truncation budget ran out, False otherwise."""
+        if self._max_stuck_steps is not None:
+            x_position = self._x_position
+            section = self._section
+            # a respawn or a new area restarts the best position; otherwise
+            # only passing the best position is progress
+            if section != self._stuck_section or x_position > self._x_position_best:
+                self._stuck_section = section
+                self._x_position_best = x_position
+                self._stuck_steps = 0
+            else:
+                self._stuck_steps += 1
+            if self._stuck_steps >= self._max_stuck_steps:
+                return self._truncate('truncated_stuck')
+        if self._max_episode_frames is not None:
+            frames = self._frame_count - self._episode_start_frame
+            if frames >= self._max_episode_frames:
+                return self._truncate('truncated_frames')
+        if self._max_episode_seconds is not None:
+            seconds = time.monotonic() - self._episode_start_time
+            if seconds >= self._max_episode_seconds:
+                return self._truncate('truncated_seconds')
+        return False
+
+    def _truncate(self, reason):
+        """Count a truncation for the given stats key and end the episode."""
+        self.stats[reason] += 1
+        self.done = True
+        return True
+
     def _get_info(self):
         """Return the info after a step occurs"""
         return dict(
@@ -525,38 +995,245 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
                 self.np_random = np.random.default_rng(seed)
         return [seed]
 
-    # MARK: Checkpointing
+    # MARK: Pickling
 
-    def save_checkpoint(self) -> SmbCheckpoint:
-        """Return a checkpoint capturing the current emulator + env state.
+    def __getstate__(self):
+        """
+        Return the state to pickle the environment with.
+
+        The state holds the constructor arguments and, if the backend can
+        serialize its state, snapshots of the reset backup and the current
+        emulator state along with the episode bookkeeping. Unpickling then
+        restores the snapshots instead of emulating the start screen.
+
+        Returns:
+            a dictionary of the state of the environment
 
-        This implementation is fully in-process and does not rely on pickling or
-        on private nes-py C APIs.
         """
-        # Ensure internal backup reflects the exact current state.
+        if self._backend is None:
+            raise ValueError('cannot pickle a closed env')
+        snapshots = None
+        if self._backend.supports_state:
+            snapshots = self._snapshots()
+        bookkeeping = {name: getattr(self, name) for name in _PICKLED_ATTRIBUTES}
+        # the episode start time is process-local, pickle the elapsed time
+        bookkeeping['_episode_start_time'] = time.monotonic() - self._episode_start_time
+        return dict(init=self._init_kwargs, snapshots=snapshots, bookkeeping=bookkeeping)
+
+    def __setstate__(self, state):
+        """
+        Restore the environment from a pickled state.
+
+        Without emulator snapshots, the environment is constructed from its
+        arguments. The pickled episode is lost, so the environment is done
+        and raises on `step` until it is reset.
+
+        Args:
+            state (dict): the state returned by `__getstate__`
+
+        Returns:
+            None
+
+        """
+        if state['snapshots'] is None:
+            self.__init__(**state['init'])
+            # don't silently continue the episode from the stage start
+            self.done = True
+            return
+        self._init_kwargs = state['init']
+        self._setup(**self._init_kwargs)
+        self._load_snapshots(*state['snapshots'])
+        for name, value in state['bookkeeping'].items():
+            setattr(self, name, value)
+        self._episode_start_time = time.monotonic() - self._episode_start_time
+
+    def _snapshots(self):
+        """Return snapshots of the reset backup and the current state."""
+        current = self._dump_state()
+        self._restore()
+        backup = self._dump_state()
+        self._load_state(current)
+        return backup, current
+
+    def _load_snapshots(self, backup, current):
+        """Restore the reset backup and the current state from snapshots."""
+        self._load_state(backup)
         self._backup()
+        self._load_state(current)
 
-        # Snapshot visible state buffers for verification / fast reload.
-        ram = bytes(self.ram.tobytes())
-        screen = bytes(self.screen.tobytes())
-        controllers = b"".join(bytes(c.tobytes()) for c in self.controllers)
+    # MARK: Cloning
+
+    def clone(self, n=1):
+        """
+        Return independent copies of the environment in its current state.
+
+        Each clone is set up around the already-loaded ROM and restored from
+        snapshots of the reset backup and the current state, so it steps and
+        resets exactly like the environment. This requires a backend that can
+        serialize its state; RAM and screen buffers alone don't restore the
+        CPU and PPU, so there is no approximate fallback.
+
+        Args:
+            n (int): the number of clones to return
+
+        Returns:
+            a list of n new SuperMarioBrosEnv
+
+        """
+        if self._backend is None:
+            raise ValueError('cannot clone a closed env')
+        if n < 1:
+            raise ValueError('n must be at least 1')
+        if not self._backend.supports_state:
+            raise ValueError(
+                'clone needs a backend that can serialize its state; this nes-py core '
+                'cannot, pass backend=InputLogBackend'
+            )
+        bookkeeping = {name: copy.copy(getattr(self, name)) for name in _PICKLED_ATTRIBUTES}
+        snapshots = self._snapshots()
+        clones = []
+        for _ in range(n):
+            kwargs = dict(self._init_kwargs)
+            if kwargs['backend'] is not None and not isinstance(kwargs['backend'], type):
+                kwargs['backend'] = self._backend.clone()
+            env = type(self).__new__(type(self))
+            env._init_kwargs = kwargs
+            env._setup(**kwargs)
+            env._load_snapshots(*snapshots)
+            clones.append(env)
+        for env in clones:
+            for name, value in bookkeeping.items():
+                setattr(env, name, copy.copy(value))
+        return clones
+
+    # MARK: Rewinding
+
+    def _rewind_snapshot(self):
+        """Snapshot the current state into the next slot of the ring buffer."""
+        self._rewind.save(self._rewind_count % len(self._rewind))
+        self._rewind_count += 1
+        self._rewind_next_frame = self._frame_count + self._rewind_every
+
+    def rewind(self, n_snapshots=1):
+        """
+        Restore the environment to an earlier snapshot of the episode.
+
+        The snapshots are taken at the start of the episode and then every
+        `rewind_every` frames. Restoring one also restores the reward and
+        truncation bookkeeping and drops the snapshots taken after it, so
+        repeated rewinds step further back. On an `InputLogBackend` this
+        replays the episode up to the snapshot, which costs as much as
+        emulating it again.
+
+        Args:
+            n_snapshots (int): the snapshot to restore counting back from the
+                latest one (1), which may be the current state
+
+        Returns:
+            the observation of the restored state
 
-        payload = ram + screen + controllers
+        """
+        if self._rewind is None:
+            raise RuntimeError('rewinding is disabled (see `rewind_every`)')
+        capacity = len(self._rewind)
+        available = min(self._rewind_count, capacity)
+        if not 1 <= n_snapshots <= available:
+            raise ValueError('n_snapshots must be in [1, {}], got {}'.format(available, n_snapshots))
+        self._rewind_count -= n_snapshots - 1
+        self._rewind.load((self._rewind_count - 1) % capacity)
+        self._rewind_next_frame = self._frame_count + self._rewind_every
+        return self.screen
+
+    # MARK: Checkpointing
+
+    def save_checkpoint(self, base=None, max_chain=MAX_DELTA_CHAIN) -> SmbCheckpoint:
+        """Return a checkpoint capturing the current emulator + env state.
 
-        return SmbCheckpoint(
+        This implementation is fully in-process and does not rely on pickling.
+        With a backend that can serialize its state, the checkpoint holds that
+        state and leaves the reset backup alone. Otherwise it holds the RAM,
+        screen, and controller buffers on top of nes-py's backup slot. Saving
+        or loading one moves the backup, so the next `reset` emulates the
+        start screen again to return to the start of the episode.
+
+        Args:
+            base (SmbCheckpoint): a checkpoint of this environment to store
+                the new one as a delta against, e.g., the previous one of a
+                trajectory. The new checkpoint keeps `base` alive
+            max_chain (int): the most deltas between keyframes. The new
+                checkpoint is a keyframe when `base` is at the limit (or
+                isn't delta compatible)
+
+        Returns:
+            a new SmbCheckpoint
+        """
+        if self._backend.supports_state:
+            payload_format = PAYLOAD_STATE
+            payload = self._dump_state()
+        else:
+            payload_format = PAYLOAD_BUFFERS
+            payload = self._buffers_payload()
+
+        full_payload = payload
+        if base is not None:
+            base_payload = None
+            if (
+                base.payload_format == payload_format
+                and base.rom_hash == self._rom_image.sha256
+                and base.chain_length < max_chain
+            ):
+                if self._last_checkpoint is not None and self._last_checkpoint[0] is base:
+                    base_payload = self._last_checkpoint[1]
+                else:
+                    base_payload = base.full_payload()
+            if base_payload is not None and len(base_payload) == len(payload):
+                payload = encode_delta(base_payload, payload)
+            else:
+                base = None
+
+        checkpoint = SmbCheckpoint(
             rom_path=getattr(self, '_rom_path', ''),
+            rom_hash=self._rom_image.sha256,
             target_world=self._target_world,
             target_stage=self._target_stage,
             target_area=self._target_area,
             time_last=int(self._time_last),
             x_position_last=int(self._x_position_last),
             _payload=payload,
+            payload_format=payload_format,
+            base=base,
         )
+        self._last_checkpoint = (checkpoint, full_payload)
+        return checkpoint
+
+    def _buffers_payload(self):
+        """Return the RAM, screen, and controller buffers as a payload."""
+        # Ensure internal backup reflects the exact current state.
+        self._backup()
+        # the next reset has to emulate the start of the game again
+        self._backup_moved = True
+
+        # Snapshot visible state buffers for verification / fast reload.
+        ram = bytes(self.ram.tobytes())
+        screen = bytes(self.screen.tobytes())
+        controllers = b"".join(bytes(c.tobytes()) for c in self.controllers)
+
+        return ram + screen + controllers
 
     def load_checkpoint(self, checkpoint: SmbCheckpoint):
-        """Restore the environment to a previously saved checkpoint."""
-        if not isinstance(checkpoint, SmbCheckpoint):
-            raise TypeError('checkpoint must be an SmbCheckpoint')
+        """
+        Restore the environment to a previously saved checkpoint.
+
+        Args:
+            checkpoint (SmbCheckpoint, CheckpointHandle): the checkpoint to
+                load; a handle's payload is read in place from its arena
+
+        Returns:
+            None
+
+        """
+        if not isinstance(checkpoint, (SmbCheckpoint, CheckpointHandle)):
+            raise TypeError('checkpoint must be an SmbCheckpoint or a CheckpointHandle')
 
         if (
             checkpoint.target_world != self._target_world
@@ -564,7 +1241,35 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
             or checkpoint.target_area != self._target_area
         ):
             raise ValueError('checkpoint target does not match this environment')
+        # old checkpoints have no ROM hash to check
+        if checkpoint.rom_hash and checkpoint.rom_hash != self._rom_image.sha256:
+            raise ValueError('checkpoint was saved from a different ROM')
+
+        if checkpoint.payload_format == PAYLOAD_STATE:
+            if not self._backend.supports_state:
+                raise ValueError('checkpoint holds an emulator state this backend cannot load')
+            payload = checkpoint.full_payload()
+            # the state restores the screen along with the rest of the machine
+            self._load_state(payload)
+        elif checkpoint.payload_format == PAYLOAD_BUFFERS:
+            payload = checkpoint.full_payload()
+            self._load_buffers_payload(payload)
+        else:
+            raise ValueError('unknown checkpoint payload format {!r}'.format(checkpoint.payload_format))
+        if isinstance(checkpoint, CheckpointHandle):
+            # the slot may have been reclaimed and reused while it was read
+            checkpoint.check()
+            # a view would pin the arena's memory; deltas can't base on handles
+            self._last_checkpoint = None
+        else:
+            # a search that backtracks saves the next checkpoint against this one
+            self._last_checkpoint = (checkpoint, payload)
+
+        self._time_last = int(checkpoint.time_last)
+        self._x_position_last = int(checkpoint.x_position_last)
 
+    def _load_buffers_payload(self, blob):
+        """Restore the RAM, screen, and controller buffers from a payload."""
         # Restore the emulator state using nes-py's backup slot.
         # We first restore to the last backup and then overwrite the exposed
         # buffers and re-backup, ensuring the backup slot matches.
@@ -575,7 +1280,6 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
         screen_size = 240 * 256 * 3
         controllers_size = len(self.controllers)  # each controller is 1 byte
 
-        blob = checkpoint._payload
         if len(blob) != ram_size + screen_size + controllers_size:
             raise ValueError('checkpoint payload incompatible with this build')
 
@@ -590,9 +1294,8 @@ class SuperMarioBrosEnv(NESEnv, gym.Env):
 
         # Re-backup so future restores return to this checkpoint.
         self._backup()
-
-        self._time_last = int(checkpoint.time_last)
-        self._x_position_last = int(checkpoint.x_position_last)
+        # the next reset has to emulate the start of the game again
+        self._backup_moved = True
 
 
 # explicitly define the outward facing API of this module
@@ -1,7 +1,57 @@
 """An OpenAI Gym Super Mario Bros. environment that randomly selects levels."""
+from collections import OrderedDict
+from collections.abc import Sequence
+import functools
+import threading
 import gymnasium as gym
 import numpy as np
+from . import _emulator_state
+from ._roms import decode_target
 from .smb_env import SuperMarioBrosEnv
+from .smb_env import _reset_checkpoint
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_stages(stages):
+    """
+    Compile stage strings into an index array for sampling.
+
+    Args:
+        stages (tuple): stage strings like '1-1' (or objects that print so)
+
+    Returns:
+        a read-only array of zero-based stage indices (4 * world + stage)
+
+    """
+    indices = np.empty(len(stages), dtype=np.intp)
+    for i, level in enumerate(stages):
+        try:
+            world, stage = map(int, str(level).split('-'))
+        except ValueError:
+            raise ValueError('stage must be like "<world>-<stage>", got {!r}'.format(level))
+        if not 1 <= world <= 8 or not 1 <= stage <= 4:
+            raise ValueError('stage {!r} is not in 1-1, ..., 8-4'.format(level))
+        indices[i] = 4 * (world - 1) + stage - 1
+    indices.setflags(write=False)
+    return indices
+
+
+class _WorldEnvs(Sequence):
+    """The stage environments of a world, constructed when indexed."""
+
+    def __init__(self, owner, world):
+        self._owner = owner
+        self._world = world
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, stage):
+        if isinstance(stage, slice):
+            return [self[index] for index in range(*stage.indices(4))]
+        if not -4 <= stage < 4:
+            raise IndexError('stage index out of range')
+        return self._owner._stage_env(self._world, stage % 4, touch=False)
 
 
 class SuperMarioBrosRandomStagesEnv(gym.Env):
@@ -17,44 +67,288 @@ class SuperMarioBrosRandomStagesEnv(gym.Env):
     observation_space = gym.spaces.Box(low=0, high=255, shape=(240, 256, 3), dtype=np.uint8)
     action_space = gym.spaces.Discrete(256)
 
-    def __init__(self, rom_mode='vanilla', stages=None):
+    def __init__(self, rom_mode='vanilla', stages=None,
+        max_live_stages=None,
+        prewarm=False,
+        single_emulator=False,
+        **kwargs
+    ):
         """
         Initialize a new Super Mario Bros environment.
 
         Args:
             rom_mode (str): the ROM mode to use when loading ROMs from disk
             stages (list): select stages at random from a specific subset
+            max_live_stages (int): the maximal number of stage environments
+                to keep alive; the least recently used one is closed when a
+                new stage is selected (None for no limit)
+            prewarm (bool): whether to construct the environments of `stages`
+                in a background thread instead of on their first `reset`
+            single_emulator (bool): whether to play every stage on a single
+                emulator that restores a snapshot of the stage start on
+                `reset`. Requires a nes-py core that can serialize its state
+                natively (ValueError otherwise)
+            kwargs (dict): keyword arguments for each stage's
+                SuperMarioBrosEnv initializer (e.g., truncation budgets)
 
         Returns:
             None
 
         """
+        if max_live_stages is not None and max_live_stages < 1:
+            raise ValueError('max_live_stages must be None or at least 1')
+        if single_emulator and not _emulator_state.is_supported():
+            raise ValueError('single_emulator needs a nes-py core that can serialize its state')
+        # store the constructor arguments to pickle the environment with
+        self._init_kwargs = dict(
+            rom_mode=rom_mode,
+            stages=stages,
+            max_live_stages=max_live_stages,
+            prewarm=prewarm,
+            single_emulator=single_emulator,
+            **kwargs
+        )
         # Dedicated RNG for stage selection.
         # Use RandomState to preserve historical determinism expected by tests
         # (e.g., seed=1 -> world=6, stage=4).
         self._stage_rng = np.random.RandomState()
         # Expose for legacy / unit tests.
         self.np_random = self._stage_rng
-        # setup the environments
-        self.envs = []
-        # iterate over the worlds in the game, i.e., {1, ..., 8}
-        for world in range(1, 9):
-            # append a new list to put this world's stages into
-            self.envs.append([])
-            # iterate over the stages in the world, i.e., {1, ..., 4}
-            for stage in range(1, 5):
-                # create the target as a tuple of the world and stage
-                target = (world, stage)
-                # create the environment with the given ROM mode
-                env = SuperMarioBrosEnv(rom_mode=rom_mode, target=target)
-                # add the environment to the stage list for this world
-                self.envs[-1].append(env)
+        # setup the arguments to construct stage environments with
+        self._rom_mode = rom_mode
+        self._env_kwargs = kwargs
+        # setup the live stage environments keyed by the zero-based (world,
+        # stage) in least to most recently used order. environments are
+        # constructed on the first reset that selects them
+        self._live_envs = OrderedDict()
+        self.max_live_stages = max_live_stages
+        # setup the single emulator and the stage start states it restores,
+        # keyed by the zero-based (world, stage)
+        self._single_emulator = single_emulator
+        self._emulator = None
+        self._emulator_stage = None
+        self._stage_states = {}
+        # setup a lock to share the stage environments with the prewarmer
+        self._envs_lock = threading.RLock()
         # create a placeholder for the current environment
-        self.env = self.envs[0][0]
+        self._current_env = None
+        self._closed = False
         # create a placeholder for the image viewer to render the screen
         self.viewer = None
         # create a placeholder for the subset of stages to choose
         self.stages = stages
+        # construct the environments for the subset of stages in the background
+        self._prewarm_thread = None
+        if prewarm and stages:
+            self._start_prewarm(list(stages))
+
+    def _start_prewarm(self, stages):
+        """Start constructing the environments for stages in the background."""
+        self._prewarm_thread = threading.Thread(
+            target=self._prewarm,
+            args=(stages,),
+            name='SuperMarioBrosRandomStagesEnv-prewarm',
+            daemon=True,
+        )
+        self._prewarm_thread.start()
+
+    @property
+    def stages(self):
+        """Return the subset of stages to select from (None for all)."""
+        return self._stages
+
+    @stages.setter
+    def stages(self, stages):
+        """Set the subset of stages to select from (None for all)."""
+        self._stage_indices = None
+        if stages is not None:
+            self._stage_indices = _compile_stages(tuple(stages))
+        self._stages = stages
+
+    def _prewarm(self, stages):
+        """Construct the environments for a list of stages (up to the limit)."""
+        indices = _compile_stages(tuple(stages))
+        if self.max_live_stages is not None and not self._single_emulator:
+            indices = indices[:self.max_live_stages]
+        for index in indices:
+            world, stage = divmod(int(index), 4)
+            with self._envs_lock:
+                if self._closed:
+                    return
+                if self._single_emulator:
+                    self._stage_state(world, stage)
+                else:
+                    self._stage_env(world, stage, touch=False)
+
+    def _stage_state(self, world, stage):
+        """
+        Return the start state of a stage, emulating it if necessary.
+
+        Args:
+            world (int): the zero-based world of the stage
+            stage (int): the zero-based stage in the world
+
+        Returns:
+            the emulator state at the start of the stage
+
+        """
+        key = world, stage
+        with self._envs_lock:
+            if key not in self._stage_states:
+                target = (world + 1, stage + 1)
+                env = SuperMarioBrosEnv(rom_mode=self._rom_mode, target=target, **self._env_kwargs)
+                self._stage_states[key] = env._dump_state()
+                env.close()
+            return self._stage_states[key]
+
+    def _single_emulator_env(self, world, stage):
+        """
+        Return the single emulator set to the start of a stage.
+
+        Args:
+            world (int): the zero-based world of the stage
+            stage (int): the zero-based stage in the world
+
+        Returns:
+            the SuperMarioBrosEnv with its reset backup at the stage start
+
+        """
+        key = world, stage
+        target = (world + 1, stage + 1)
+        with self._envs_lock:
+            if self._closed:
+                raise ValueError('env has already been closed.')
+            if self._emulator is None:
+                self._emulator = SuperMarioBrosEnv(rom_mode=self._rom_mode, target=target, **self._env_kwargs)
+                self._stage_states.setdefault(key, self._emulator._dump_state())
+            elif self._emulator_stage != key:
+                env = self._emulator
+                env._load_state(self._stage_state(world, stage))
+                env._target_world, env._target_stage, env._target_area = decode_target(target, False)
+                # pickles and clones set the emulator up from its arguments
+                env._init_kwargs = dict(env._init_kwargs, target=target)
+                # move the reset backup to the start of the new stage
+                env._backup()
+            self._emulator_stage = key
+            return self._emulator
+
+    def _stage_env(self, world, stage, touch=True):
+        """
+        Return the environment for a stage, constructing it if necessary.
+
+        Args:
+            world (int): the zero-based world of the stage
+            stage (int): the zero-based stage in the world
+            touch (bool): whether to mark the stage as most recently used
+
+        Returns:
+            the SuperMarioBrosEnv for the given stage
+
+        """
+        key = world, stage
+        with self._envs_lock:
+            if self._closed:
+                raise ValueError('env has already been closed.')
+            env = self._live_envs.get(key)
+            if env is None:
+                target = (world + 1, stage + 1)
+                env = SuperMarioBrosEnv(rom_mode=self._rom_mode, target=target, **self._env_kwargs)
+                self._live_envs[key] = env
+            elif touch:
+                self._live_envs.move_to_end(key)
+            # close the least recently used environments over the limit. the
+            # prewarmer must not close the environment that is being played
+            if self.max_live_stages is not None:
+                for other in list(self._live_envs):
+                    if len(self._live_envs) <= self.max_live_stages:
+                        break
+                    if other == key or not touch and self._live_envs[other] is self._current_env:
+                        continue
+                    self._live_envs.pop(other).close()
+            return env
+
+    @property
+    def env(self):
+        """
+        Return the environment of the stage being played.
+
+        Returns:
+            the SuperMarioBrosEnv selected by the last `reset`, or None once
+            the environment is closed
+
+        """
+        if self._current_env is None and not self._closed:
+            raise gym.error.ResetNeeded('no stage is selected before the first reset; call reset() first')
+        return self._current_env
+
+    @env.setter
+    def env(self, env):
+        """Set the environment of the stage being played."""
+        self._current_env = env
+
+    @property
+    def envs(self):
+        """
+        Return the stage environments indexed by zero-based world and stage.
+
+        `envs[world][stage]` returns the environment of a stage like before
+        stages were constructed lazily, constructing it if it isn't live.
+        Under `max_live_stages`, this may close the least recently used one.
+
+        Returns:
+            a list of 8 sequences of the 4 stage environments of each world
+
+        """
+        return [_WorldEnvs(self, world) for world in range(8)]
+
+    def __getstate__(self):
+        """
+        Return the state to pickle the environment with.
+
+        The state holds the constructor arguments, the stage RNG, and the live
+        stage environments (or the single emulator), which pickle their own
+        emulator snapshots.
+
+        Returns:
+            a dictionary of the state of the environment
+
+        """
+        with self._envs_lock:
+            if self._closed:
+                raise ValueError('cannot pickle a closed env')
+            return dict(
+                init=self._init_kwargs,
+                rng=self._stage_rng.get_state(),
+                envs=list(self._live_envs.items()),
+                env=self._current_env,
+                emulator=self._emulator,
+                emulator_stage=self._emulator_stage,
+                stage_states=dict(self._stage_states),
+            )
+
+    def __setstate__(self, state):
+        """
+        Restore the environment from a pickled state.
+
+        Args:
+            state (dict): the state returned by `__getstate__`
+
+        Returns:
+            None
+
+        """
+        init = dict(state['init'], prewarm=False)
+        self.__init__(**init)
+        self._init_kwargs = state['init']
+        self._stage_rng.set_state(state['rng'])
+        self._live_envs.update(state['envs'])
+        self._current_env = state['env']
+        self._emulator = state['emulator']
+        self._emulator_stage = state['emulator_stage']
+        self._stage_states.update(state['stage_states'])
+        # construct the remaining environments of the subset in the background
+        if state['init']['prewarm'] and self.stages:
+            self._start_prewarm(list(self.stages))
 
     @property
     def screen(self):
@@ -69,7 +363,20 @@ class SuperMarioBrosRandomStagesEnv(gym.Env):
         return [seed]
 
     def reset(self, seed=None, options=None, return_info=None):
-        """Reset the env and return (obs, info) per Gymnasium's API."""
+        """
+        Reset the env and return (obs, info) per Gymnasium's API.
+
+        Args:
+            seed (int): the seed of the stage selection, or None
+            options (dict): `{'stages': [...]}` to select from other stages
+                for this episode, or the checkpoint options of
+                `SuperMarioBrosEnv.reset` to start from a checkpoint on the
+                stage of its target
+
+        Returns:
+            the observation and info of the start of the episode
+
+        """
         # Gymnasium bookkeeping (may overwrite `self.np_random`).
         super().reset(seed=seed, options=options)
         # Restore legacy attribute and seed our dedicated RNG.
@@ -77,25 +384,35 @@ class SuperMarioBrosRandomStagesEnv(gym.Env):
         if seed is not None:
             self.seed(seed)
 
-        # Get the collection of stages to sample from
-        stages = self.stages
+        # Get the compiled collection of stages to sample from
+        indices = self._stage_indices
         if options is not None and 'stages' in options:
-            stages = options['stages']
-
-        # Select a random level
-        if stages is not None and len(stages) > 0:
-            level = self._stage_rng.choice(stages)
-            if not isinstance(level, str):
-                level = str(level)
-            world, stage = level.split('-')
-            world = int(world) - 1
-            stage = int(stage) - 1
+            indices = None
+            if options['stages'] is not None:
+                indices = _compile_stages(tuple(options['stages']))
+
+        # Select the stage of a checkpoint, or a random level
+        checkpoint = _reset_checkpoint(options, self._stage_rng)
+        if checkpoint is not None:
+            if checkpoint.target_world is None or checkpoint.target_stage is None:
+                raise ValueError('checkpoint must be saved from a single stage environment')
+            world, stage = checkpoint.target_world - 1, checkpoint.target_stage - 1
+            options = {
+                key: value for key, value in options.items()
+                if key not in ('checkpoints', 'weights')
+            }
+            options['checkpoint'] = checkpoint
+        elif indices is not None and len(indices) > 0:
+            world, stage = divmod(int(self._stage_rng.choice(indices)), 4)
         else:
             world = int(self._stage_rng.randint(1, 9)) - 1
             stage = int(self._stage_rng.randint(1, 5)) - 1
 
         # Set the environment based on the world and stage.
-        self.env = self.envs[world][stage]
+        if self._single_emulator:
+            self.env = self._single_emulator_env(world, stage)
+        else:
+            self.env = self._stage_env(world, stage)
         # reset the environment
         return self.env.reset(
             seed=seed,
@@ -123,16 +440,22 @@ class SuperMarioBrosRandomStagesEnv(gym.Env):
     def close(self):
         """Close the environment."""
         # make sure the environment hasn't already been closed
-        if self.env is None:
+        if self._closed:
             raise ValueError('env has already been closed.')
-        # iterate over each list of stages
-        for stage_lists in self.envs:
-            # iterate over each stage
-            for stage in stage_lists:
-                # close the environment
-                stage.close()
+        # stop constructing environments in the background
+        with self._envs_lock:
+            self._closed = True
+        if self._prewarm_thread is not None:
+            self._prewarm_thread.join()
+        # close each live stage environment
+        for stage in self._live_envs.values():
+            stage.close()
+        self._live_envs.clear()
+        if self._emulator is not None:
+            self._emulator.close()
+        self._stage_states.clear()
         # close the environment permanently
-        self.env = None
+        self._current_env = None
         # if there is an image viewer open, delete it
         if self.viewer is not None:
             self.viewer.close()
@@ -155,11 +478,12 @@ class SuperMarioBrosRandomStagesEnv(gym.Env):
 
     def get_keys_to_action(self):
         """Return the dictionary of keyboard keys to actions."""
-        return self.env.get_keys_to_action()
+        # the mapping is the same for every stage, so don't construct one
+        return SuperMarioBrosEnv.get_keys_to_action(self)
 
     def get_action_meanings(self):
         """Return the list of strings describing the action space actions."""
-        return self.env.get_action_meanings()
+        return SuperMarioBrosEnv.get_action_meanings(self)
 
 
 # explicitly define the outward facing API of this module
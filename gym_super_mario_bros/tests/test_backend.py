@@ -0,0 +1,192 @@
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._backend import InputLogBackend, ReplayBackend, ReplayTrace
+from gym_super_mario_bros._snapshot_store import SnapshotStore
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+def _trace(frames=3):
+    ram = np.zeros((frames, 0x0800), dtype=np.uint8)
+    ram[:, 0x0000] = np.arange(frames)
+    ram[:, 0x000E] = 0x08
+    return ReplayTrace(ram=ram)
+
+
+def test_replay_steps_through_the_trace_and_wraps_around():
+    backend = ReplayBackend(_trace())
+    seen = [int(backend.ram[0])]
+    for _ in range(3):
+        backend.step()
+        seen.append(int(backend.ram[0]))
+    assert seen == [0, 1, 2, 0]
+    backend.step()
+    backend.reset()
+    assert backend.frame == 0
+
+
+def test_replay_state_round_trips_frame_and_ram_writes():
+    backend = ReplayBackend(_trace())
+    backend.step()
+    backend.ram[0x10] = 7
+    state = backend.dump_state()
+    backend.step()
+    backend.load_state(state)
+    assert (backend.frame, int(backend.ram[0]), int(backend.ram[0x10])) == (1, 1, 7)
+    with pytest.raises(ValueError):
+        backend.load_state(state[:-1])
+
+
+def test_replay_rejects_an_empty_trace():
+    with pytest.raises(ValueError):
+        ReplayBackend(ReplayTrace(ram=np.zeros((0, 0x0800), dtype=np.uint8)))
+
+
+def test_trace_save_and_load(tmp_path):
+    trace = _trace()
+    trace.save(tmp_path / "trace.npz")
+    loaded = ReplayTrace.load(tmp_path / "trace.npz")
+    assert np.array_equal(loaded.ram, trace.ram)
+    assert loaded.screen is None
+
+
+def test_env_on_replay_backend_resets_to_the_first_frame_and_closes():
+    env = SuperMarioBrosEnv(backend=ReplayBackend(_trace()))
+    env.step(0)
+    env.step(0)
+    env.reset()
+    assert env._backend.frame == 0
+    env.close()
+    with pytest.raises(ValueError):
+        env.close()
+
+
+def test_replay_of_a_recorded_episode_matches_the_emulator():
+    actions = [0b10000010] * 60 + [0b10000011] * 20 + [0b10000010] * 40
+    env = SuperMarioBrosEnv(target=(1, 1))
+    expected = []
+    env.reset()
+    for action in actions:
+        obs, reward, terminated, truncated, info = env.step(action)
+        expected.append((obs.copy(), reward, terminated, truncated, info))
+        if terminated or truncated:
+            break
+    trace = ReplayTrace.record(env, actions)
+    env.close()
+    assert len(trace) > len(expected)
+
+    replay = SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace))
+    replay.reset()
+    for obs, reward, terminated, truncated, info in expected:
+        step = replay.step(0)
+        assert np.array_equal(step[0], obs)
+        assert step[1:] == (reward, terminated, truncated, info)
+    replay.close()
+
+
+def _play(env, actions):
+    steps = []
+    for action in actions:
+        obs, reward, terminated, truncated, info = env.step(action)
+        steps.append((obs.tobytes(), reward, terminated, truncated, info))
+        if terminated or truncated:
+            break
+    return steps
+
+
+def test_input_log_states_restore_exactly():
+    actions = np.random.default_rng(0).choice([0, 0b10000010, 0b10000011, 0b01000000], size=160).tolist()
+    plain = SuperMarioBrosEnv(target=(1, 1))
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    plain.reset()
+    env.reset()
+    start = env.ram.copy()
+    assert _play(env, actions[:80]) == _play(plain, actions[:80])
+    env.ram[0x0100] = 7
+    plain.ram[0x0100] = 7
+    checkpoint = env.save_checkpoint()
+    assert checkpoint.payload_format == "state"
+    expected = _play(plain, actions[80:])
+    assert _play(env, actions[80:]) == expected
+
+    # into the same core, and into the new core of a clone
+    env.load_checkpoint(checkpoint)
+    assert env.ram[0x0100] == 7
+    fresh = env.clone()[0]
+    assert _play(env, actions[80:]) == expected
+    assert _play(fresh, actions[80:]) == expected
+
+    # the state of the reset backup is unchanged
+    env.reset()
+    assert np.array_equal(env.ram, start)
+    for other in [plain, env, fresh]:
+        other.close()
+
+
+def test_input_log_anchor_replays_only_the_frames_after_it():
+    actions = np.random.default_rng(1).choice([0, 0b10000010, 0b10000011], size=120).tolist()
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    backend = env._backend
+    env.reset()
+    start = env.ram.copy()
+    _play(env, actions[:40])
+    env.ram[0x0100] = 7
+    anchor = env.save_checkpoint()
+    backend.anchor()
+    _play(env, actions[40:70])
+    branch = env.save_checkpoint()
+    expected = _play(env, actions[70:])
+
+    def replayed(checkpoint):
+        before = backend.frames_replayed
+        env.load_checkpoint(checkpoint)
+        return backend.frames_replayed - before
+
+    # states that extend the anchor replay from it, and dump the same log
+    assert replayed(branch) == 30
+    assert env._dump_state() == branch.full_payload()
+    assert _play(env, actions[70:]) == expected
+    assert replayed(anchor) == 0
+    assert env.ram[0x0100] == 7
+    _play(env, actions[40:70])
+    assert env._dump_state() == branch.full_payload()
+    # the reset backup branches off before the anchor, so the start screen
+    # is replayed to get back to it
+    before = backend.frames_replayed
+    env.reset()
+    assert backend.frames_replayed - before == len(backend._prefix[0]) // 2
+    assert np.array_equal(env.ram, start)
+    assert replayed(branch) == 70
+    assert _play(env, actions[70:]) == expected
+    env.close()
+
+
+def test_input_log_states_load_only_into_their_start_state():
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    other = SuperMarioBrosEnv(target=(1, 2), backend=InputLogBackend)
+    env.reset()
+    env.step(0)
+    with pytest.raises(ValueError):
+        other._load_state(env._dump_state())
+    with pytest.raises(ValueError):
+        other._load_state(ReplayBackend(_trace()).dump_state())
+    with pytest.raises(ValueError):
+        env._backend.dump_state(np.zeros(16, dtype=np.uint8))
+    env.close()
+    other.close()
+
+
+def test_snapshot_store_keeps_input_log_states():
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    env.reset()
+    store = SnapshotStore(env, slots=2)
+    _play(env, [0b10000010] * 20)
+    store.save(1)
+    ram = env.ram.copy()
+    assert store.nbytes > 0
+    _play(env, [0b10000010] * 20)
+    store.load(1)
+    assert np.array_equal(env.ram, ram)
+    store.clear(1)
+    assert 1 not in store
+    env.close()
@@ -0,0 +1,127 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._backend import InputLogBackend
+from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+from gym_super_mario_bros._cell_archive import CellArchive, CellStats, cell_keys, decode_cell
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+@pytest.fixture(scope="module")
+def trace():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [0b10000010] * 120, screen=False)
+    env.close()
+    return trace
+
+
+def _explore(archive, trace, steps):
+    env = SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace))
+    env.reset()
+    total = 0.0
+    for _ in range(steps):
+        _, reward, terminated, truncated, _ = env.step(0)
+        total += reward
+        archive.update(env, total)
+        if terminated or truncated:
+            break
+    return env
+
+
+def test_cell_keys_are_vectorized(trace):
+    keys = cell_keys(trace.ram)
+    assert keys.dtype == np.int64
+    assert [cell_keys(ram) for ram in trace.ram[:10]] == keys[:10].tolist()
+    env = SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace))
+    env.reset()
+    world, stage, x, y, status = decode_cell(cell_keys(env.ram))
+    assert (world, stage) == (1, 1)
+    assert x <= env._x_position < x + 16
+    assert y <= env._y_position < y + 16
+    assert status == env.ram[0x0756]
+
+
+def test_archive_keeps_the_best_checkpoint_per_cell(trace, tmp_path):
+    archive = CellArchive()
+    env = _explore(archive, trace, 100)
+    assert 1 < len(archive) < 100
+    cell, improved = archive.update(env, -1.0)
+    assert not improved
+    stats = archive.stats(cell)
+    assert stats.visits >= 2
+
+    archive.restore(env, cell)
+    assert archive.cell(env) == cell
+    assert archive.stats(cell).chosen == 1
+    assert not env.done
+
+    # cells restarted from less often are sampled more often
+    for _ in range(50):
+        archive.restore(env, cell)
+    samples = archive.sample(200, rng=np.random.default_rng(0))
+    assert samples.count(cell) < 200 / len(archive)
+
+    path = tmp_path / "cells.pkl"
+    archive.save(path)
+    loaded = CellArchive.load(path)
+    assert len(loaded) == len(archive)
+    assert loaded.stats(cell) == archive.stats(cell)
+    assert loaded.checkpoint(cell) == archive.checkpoint(cell)
+
+
+def test_archiving_cells_keeps_the_reset_state():
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    env.reset()
+    start = env.ram.copy()
+    archive = CellArchive()
+    total = 0.0
+    for _ in range(40):
+        _, reward, _, _, _ = env.step(0b10000010)
+        total += reward
+        archive.update(env, total)
+    assert len(archive) > 1
+    env.reset()
+    assert np.array_equal(env.ram, start)
+    assert env._x_position == 40
+    env.close()
+
+
+def test_archive_rejects_states_it_cannot_restore_exactly():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    if env._backend.supports_state:
+        pytest.skip("the nes-py core serializes its state")
+    archive = CellArchive()
+    with pytest.raises(ValueError, match="complete emulator state"):
+        archive.update(env, 0.0)
+    assert len(archive) == 0
+    # a buffers checkpoint that got into the archive is not restored
+    env.reset()
+    archive._checkpoints[0] = env.save_checkpoint()
+    archive._index[0] = CellStats(0.0, 1, 0)
+    with pytest.raises(ValueError, match="complete emulator state"):
+        archive.restore(env, 0)
+    assert archive._index[0].chosen == 0
+    env.close()
+
+
+def _worker(archive, trace, steps):
+    _explore(archive, trace, steps)
+
+
+def test_shared_archive_is_updated_by_workers(trace):
+    context = multiprocessing.get_context("fork")
+    with context.Manager() as manager:
+        archive = CellArchive.shared(manager)
+        workers = [context.Process(target=_worker, args=(archive, trace, 60)) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            assert worker.exitcode == 0
+        local = CellArchive()
+        _explore(local, trace, 60)
+        assert len(archive) == len(local)
+        cell = next(iter(dict(local._index)))
+        assert archive.stats(cell).visits == 2 * local.stats(cell).visits
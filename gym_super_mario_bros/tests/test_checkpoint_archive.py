@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from gym_super_mario_bros._checkpoint import PAYLOAD_STATE, SmbCheckpoint
+from gym_super_mario_bros._checkpoint_archive import CheckpointArchive
+
+
+_ROM_HASH = "ab" * 32
+
+
+def _checkpoint(i, rom_hash=_ROM_HASH):
+    return SmbCheckpoint(
+        rom_path="rom.nes",
+        rom_hash=rom_hash,
+        target_world=1,
+        target_stage=i % 4 + 1,
+        target_area=None,
+        time_last=400 - i,
+        x_position_last=40 + i,
+        _payload=bytes([i % 256]) * 4096,
+        payload_format=PAYLOAD_STATE,
+    )
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_round_trip_through_the_index(tmp_path, codec):
+    path = tmp_path / "checkpoints.smbck"
+    with CheckpointArchive(path, "a", rom_hash=_ROM_HASH, codec=codec) as archive:
+        for i in range(20):
+            archive.put("cell-{}".format(i), _checkpoint(i))
+        # entries are readable before the archive is closed
+        assert archive["cell-3"] == _checkpoint(3)
+    # the entries are compressed independently
+    assert os.path.getsize(path) < 20 * 4096 // 4
+
+    with CheckpointArchive(path) as archive:
+        assert archive.codec == codec
+        assert archive.metadata["rom_hash"] == _ROM_HASH
+        assert len(archive) == 20
+        assert list(archive) == ["cell-{}".format(i) for i in range(20)]
+        assert archive.get("cell-17") == _checkpoint(17)
+
+
+def test_append_to_an_existing_archive_and_shadow_keys(tmp_path):
+    path = tmp_path / "checkpoints.smbck"
+    with CheckpointArchive(path, "a", rom_hash=_ROM_HASH) as archive:
+        archive["a"] = _checkpoint(1)
+    with CheckpointArchive(path, "a") as archive:
+        archive["b"] = _checkpoint(2)
+        archive["a"] = _checkpoint(3)
+    with CheckpointArchive(path) as archive:
+        assert sorted(archive.keys()) == ["a", "b"]
+        assert archive["a"] == _checkpoint(3)
+        assert archive["b"] == _checkpoint(2)
+
+
+def test_unclosed_archive_is_recovered_by_scanning_records(tmp_path):
+    path = tmp_path / "checkpoints.smbck"
+    archive = CheckpointArchive(path, "a", rom_hash=_ROM_HASH, sync_every=1)
+    archive.put("a", _checkpoint(1))
+    archive.put("b", _checkpoint(2))
+    # simulate a crash that tore the last record
+    archive._file.flush()
+    archive._file.truncate(os.path.getsize(path) - 10)
+    archive._file.close()
+
+    with CheckpointArchive(path) as reader:
+        assert list(reader) == ["a"]
+    with CheckpointArchive(path, "a") as writer:
+        writer.put("c", _checkpoint(3))
+    with CheckpointArchive(path) as reader:
+        assert list(reader) == ["a", "c"]
+        assert reader["c"] == _checkpoint(3)
+
+
+def test_archive_rejects_other_roms_and_read_only_writes(tmp_path):
+    path = tmp_path / "checkpoints.smbck"
+    with pytest.raises(ValueError):
+        CheckpointArchive(path, "a")
+    with CheckpointArchive(path, "a", rom_hash=_ROM_HASH) as archive:
+        with pytest.raises(ValueError):
+            archive.put("x", _checkpoint(1, rom_hash="cd" * 32))
+    with pytest.raises(ValueError):
+        CheckpointArchive(path, "a", rom_hash="cd" * 32)
+    with CheckpointArchive(path) as archive:
+        with pytest.raises(ValueError):
+            archive.put("x", _checkpoint(1))
+    (tmp_path / "other").write_bytes(b"not an archive")
+    with pytest.raises(ValueError):
+        CheckpointArchive(tmp_path / "other")
+
+
+def test_archived_checkpoint_loads_into_an_env(tmp_path):
+    from gym_super_mario_bros._registration import make
+
+    env = make("SuperMarioBros-1-1-v0").unwrapped
+    env.reset()
+    for _ in range(20):
+        env.step(0b10000010)
+    checkpoint = env.save_checkpoint()
+    ram = env.ram.copy()
+    path = tmp_path / "checkpoints.smbck"
+    with CheckpointArchive(path, "a", rom_hash=checkpoint.rom_hash) as archive:
+        archive.put("x", checkpoint)
+    for _ in range(20):
+        env.step(0)
+    with CheckpointArchive(path) as archive:
+        assert archive.compatible_with(env)
+        env.load_checkpoint(archive["x"])
+    assert (env.ram == ram).all()
+    env.close()
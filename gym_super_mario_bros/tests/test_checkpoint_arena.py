@@ -0,0 +1,101 @@
+import multiprocessing
+import pickle
+
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+from gym_super_mario_bros._checkpoint_arena import CheckpointArena
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+@pytest.fixture(scope="module")
+def trace():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [0b10000010] * 40, screen=False)
+    env.close()
+    return trace
+
+
+def _env(trace):
+    return SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace))
+
+
+def _checkpoint_after(env, steps):
+    env.reset()
+    for _ in range(steps):
+        env.step(0)
+    return env.save_checkpoint(), env.ram.copy()
+
+
+def test_handles_load_in_place(trace):
+    env = _env(trace)
+    checkpoint, ram = _checkpoint_after(env, 10)
+    with CheckpointArena(slots=2, slot_size=len(checkpoint._payload)) as arena:
+        handle = arena.put(checkpoint)
+        assert len(pickle.dumps(handle)) < 1024
+        assert not handle.full_payload().flags.writeable
+        env.reset()
+        env.load_checkpoint(handle)
+        assert np.array_equal(env.ram, ram)
+        assert env._x_position_last == checkpoint.x_position_last
+        copy = arena.get(handle)
+        assert copy.full_payload() == checkpoint.full_payload()
+    env.close()
+
+
+def test_released_slots_are_reclaimed(trace):
+    env = _env(trace)
+    first, _ = _checkpoint_after(env, 5)
+    second, second_ram = _checkpoint_after(env, 15)
+    arena = CheckpointArena(slots=1, slot_size=len(first._payload))
+    try:
+        handle = arena.put(first)
+        arena.retain(handle)
+        assert arena.refcount(handle) == 2
+        with pytest.raises(MemoryError):
+            arena.put(second)
+        arena.release(handle)
+        arena.release(handle)
+        assert len(arena) == 0
+        reused = arena.put(second)
+        assert reused.slot == handle.slot
+        # the stale handle can't read the checkpoint now in its slot
+        with pytest.raises(ValueError):
+            env.load_checkpoint(handle)
+        with pytest.raises(ValueError):
+            arena.release(handle)
+        env.load_checkpoint(reused)
+        assert np.array_equal(env.ram, second_ram)
+        with CheckpointArena(slots=1, slot_size=8) as small, pytest.raises(ValueError):
+            small.put(first)
+    finally:
+        arena.close()
+    env.close()
+
+
+def _load_in_worker(arena, trace, handles, results):
+    env = _env(trace)
+    handle = handles.get()
+    env.load_checkpoint(handle)
+    arena.release(handle)
+    results.put(env.ram.copy())
+    env.close()
+
+
+def test_handles_pass_between_processes(trace):
+    env = _env(trace)
+    checkpoint, ram = _checkpoint_after(env, 20)
+    env.close()
+    context = multiprocessing.get_context("fork")
+    with CheckpointArena(slots=4, slot_size=len(checkpoint._payload)) as arena:
+        handle = arena.put(checkpoint)
+        arena.retain(handle)
+        handles, results = context.Queue(), context.Queue()
+        worker = context.Process(target=_load_in_worker, args=(arena, trace, handles, results))
+        worker.start()
+        handles.put(handle)
+        assert np.array_equal(results.get(timeout=60), ram)
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+        assert arena.refcount(handle) == 1
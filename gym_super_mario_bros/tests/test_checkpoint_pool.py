@@ -0,0 +1,179 @@
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._checkpoint import SmbCheckpoint
+from gym_super_mario_bros._checkpoint_pool import CheckpointPool
+
+
+def _checkpoint(i, size=1000):
+    return SmbCheckpoint(
+        rom_path="rom.nes",
+        rom_hash="ab" * 32,
+        target_world=1,
+        target_stage=1,
+        target_area=None,
+        time_last=400,
+        x_position_last=i,
+        _payload=bytes([i % 256]) * size,
+    )
+
+
+def test_lru_pool_evicts_least_recently_used():
+    pool = CheckpointPool(max_bytes=3000)
+    for i in range(3):
+        pool.put(i, _checkpoint(i))
+    assert pool.get(0) == _checkpoint(0)
+    pool.put(3, _checkpoint(3))
+    assert list(pool) == [2, 0, 3]
+    assert pool.nbytes == 3000
+    assert pool.get(1) is None
+    with pytest.raises(KeyError):
+        pool[1]
+    assert pool.stats["hits"] == 1
+    assert pool.stats["misses"] == 2
+    assert pool.stats["evictions"] == 1
+
+
+def test_priority_pool_evicts_lowest_score():
+    pool = CheckpointPool(max_bytes=3000, policy="priority")
+    pool.put("a", _checkpoint(1), score=5)
+    pool.put("b", _checkpoint(2), score=1)
+    pool.put("c", _checkpoint(3), score=3)
+    pool.put("b", _checkpoint(2), score=9)
+    pool.put("d", _checkpoint(4), score=0)
+    # the new entry is never evicted to make room for itself
+    assert sorted(pool) == ["a", "b", "d"]
+    pool.put("e", _checkpoint(5), score=7)
+    assert sorted(pool) == ["a", "b", "e"]
+    assert pool.stats["evictions"] == 2
+
+
+def test_cold_entries_are_compressed_transparently():
+    pool = CheckpointPool(max_bytes=2500, hot_entries=1)
+    for i in range(5):
+        pool.put(i, _checkpoint(i))
+    # the compressed entries fit the budget uncompressed ones wouldn't
+    assert len(pool) == 5
+    assert pool.nbytes < 2500
+    assert pool.stats["compressions"] == 4
+    assert pool.get(0) == _checkpoint(0)
+    assert pool.stats["decompressions"] == 1
+    assert pool.stats["evictions"] == 0
+
+
+def test_pool_rejects_oversized_checkpoints():
+    pool = CheckpointPool(max_bytes=100)
+    with pytest.raises(ValueError):
+        pool.put(0, _checkpoint(0))
+    with pytest.raises(ValueError):
+        CheckpointPool(max_bytes=100, policy="fifo")
+
+
+def test_pool_saves_and_loads_environments():
+    from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+    from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [0b10000010] * 30, screen=False)
+    env.close()
+    env = SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace))
+    pool = CheckpointPool(max_bytes=1 << 20, hot_entries=0)
+    env.reset()
+    rams = []
+    for i in range(4):
+        env.step(0)
+        pool.save(env, i)
+        rams.append(env.ram.copy())
+    for i in reversed(range(4)):
+        assert pool.load(env, i)
+        assert np.array_equal(env.ram, rams[i])
+    assert not pool.load(env, "missing")
+
+
+def _delta(i, base, size=100):
+    return SmbCheckpoint(
+        rom_path="rom.nes",
+        rom_hash="ab" * 32,
+        target_world=1,
+        target_stage=1,
+        target_area=None,
+        time_last=400,
+        x_position_last=i,
+        _payload=bytes([i % 256]) * size,
+        payload_format="state",
+        base=base,
+    )
+
+
+def test_budget_counts_the_base_chains_of_delta_checkpoints():
+    keyframe = _checkpoint(0)
+    first = _delta(1, keyframe)
+    second = _delta(2, first)
+    pool = CheckpointPool(max_bytes=1500)
+    pool.put("second", second)
+    # the entry keeps its whole chain alive
+    assert pool.nbytes == 1200
+    # entries sharing a chain count it once
+    pool.put("first", first)
+    pool.put("keyframe", keyframe)
+    assert pool.nbytes == 1200
+    # evicting bases frees nothing while a dependent holds them
+    pool.discard("keyframe")
+    pool.discard("first")
+    assert pool.nbytes == 1200
+    pool.put("other", _checkpoint(3, size=500))
+    assert list(pool) == ["other"]
+    assert pool.nbytes == 500
+    assert pool.stats["evictions"] == 1
+    with pytest.raises(ValueError):
+        CheckpointPool(max_bytes=1100).put("second", second)
+
+
+def test_bases_of_dependents_stay_uncompressed():
+    keyframe = _checkpoint(0)
+    delta = _delta(1, keyframe)
+    pool = CheckpointPool(max_bytes=5000, hot_entries=1)
+    pool.put("keyframe", keyframe)
+    pool.put("delta", delta)
+    # compressing the keyframe would keep both payloads alive
+    assert pool.stats["compressions"] == 0
+    pool.put("other", _checkpoint(2))
+    assert pool.stats["compressions"] == 1
+    compressed = len(pool._entries["delta"].checkpoint._payload)
+    assert pool.nbytes == 1000 + compressed + 1000
+    assert pool.get("keyframe") is keyframe
+    assert pool.get("delta") == delta
+    assert pool.nbytes == 1000 + 100 + len(pool._entries["other"].checkpoint._payload)
+
+
+def test_delta_checkpoints_load_after_their_bases_are_evicted():
+    from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+    from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [0b10000010] * 30, screen=False)
+    env.close()
+    env = SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace))
+    env.reset()
+    checkpoints, rams = [], []
+    for _ in range(6):
+        env.step(0)
+        checkpoints.append(env.save_checkpoint(base=checkpoints[-1] if checkpoints else None))
+        rams.append(env.ram.copy())
+    assert checkpoints[-1].chain_length == 5
+    chain_bytes = sum(len(checkpoint._payload) for checkpoint in checkpoints)
+    pool = CheckpointPool(max_bytes=chain_bytes)
+    for i, checkpoint in enumerate(checkpoints):
+        pool.put(i, checkpoint)
+    assert pool.nbytes == chain_bytes
+    # the last delta holds the whole chain, so evicting its bases frees nothing
+    for i in range(5):
+        pool.discard(i)
+    assert pool.nbytes == chain_bytes
+    assert pool.load(env, 5)
+    assert np.array_equal(env.ram, rams[5])
+    # an entry that needs the room evicts the delta and frees the chain
+    keyframe = env.save_checkpoint()
+    pool.put("keyframe", keyframe)
+    assert list(pool) == ["keyframe"]
+    assert pool.nbytes == len(keyframe._payload)
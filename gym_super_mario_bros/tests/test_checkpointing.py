@@ -56,6 +56,22 @@ def test_checkpoint_restore_is_deterministic_for_future_steps():
     env.close()
 
 
+def _reset_ram(env):
+    env.reset()
+    return env.unwrapped.ram.copy()
+
+
+def test_save_checkpoint_keeps_the_reset_state():
+    env = make("SuperMarioBros-1-1-v0")
+    start = _reset_ram(env)
+    for _ in range(60):
+        env.step(1)
+    env.unwrapped.save_checkpoint()
+    assert np.array_equal(_reset_ram(env), start)
+    assert env.unwrapped._x_position == 40
+    env.close()
+
+
 def test_checkpoint_restore_rolls_back_ram_changes():
     env = make("SuperMarioBros-v0")
     env.reset(seed=0)
@@ -76,3 +92,140 @@ def test_checkpoint_restore_rolls_back_ram_changes():
     assert int(base.ram[addr]) == before
 
     env.close()
+
+
+def test_checkpoint_from_other_rom_is_rejected():
+    import dataclasses
+
+    env = make("SuperMarioBros-v0")
+    env.reset(seed=0)
+    base = env.unwrapped
+    ckpt = base.save_checkpoint()
+    assert ckpt.rom_hash == base._rom_image.sha256
+
+    with pytest.raises(ValueError):
+        base.load_checkpoint(dataclasses.replace(ckpt, rom_hash="0" * 64))
+
+    env.close()
+
+
+def test_checkpoints_from_before_rom_hashes_still_load():
+    import pickle
+
+    from gym_super_mario_bros._checkpoint import SmbCheckpoint
+
+    env = make("SuperMarioBros-v0")
+    env.reset(seed=0)
+    base = env.unwrapped
+    ckpt = base.save_checkpoint()
+    # the positional fields of the original checkpoints
+    positional = SmbCheckpoint(
+        ckpt.rom_path,
+        ckpt.target_world,
+        ckpt.target_stage,
+        ckpt.target_area,
+        ckpt.time_last,
+        ckpt.x_position_last,
+        ckpt._payload,
+    )
+    assert positional.rom_hash == ""
+    # a pickle of a checkpoint that has no rom_hash field
+    state = dict(vars(ckpt))
+    del state["rom_hash"]
+    old = object.__new__(SmbCheckpoint)
+    vars(old).update(state)
+    old = pickle.loads(pickle.dumps(old))
+    assert old.rom_hash == ""
+
+    for _ in range(10):
+        env.step(1)
+    base.load_checkpoint(old)
+    assert np.array_equal(base.ram, np.frombuffer(ckpt._payload, dtype=np.uint8, count=2048))
+
+    env.close()
+
+
+def _replay_env():
+    from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+    from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [0b10000010] * 30)
+    env.close()
+    return SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace))
+
+
+def test_state_checkpoints_are_compact_and_exact_after_other_checkpoints():
+    from gym_super_mario_bros._checkpoint import PAYLOAD_STATE
+
+    env = _replay_env()
+    env.reset()
+    start = env.ram.copy()
+    for _ in range(5):
+        env.step(0)
+    first = env.save_checkpoint()
+    ram, screen = env.ram.copy(), env.screen.copy()
+    for _ in range(5):
+        env.step(0)
+    env.save_checkpoint()
+    env.step(0)
+
+    env.load_checkpoint(first)
+    assert first.payload_format == PAYLOAD_STATE
+    assert len(first._payload) * 10 < 240 * 256 * 3
+    assert np.array_equal(env.ram, ram)
+    # the screen is re-rendered from the state
+    assert np.array_equal(env.screen, screen)
+    # saving checkpoints leaves the reset backup at the episode start
+    env.reset()
+    assert np.array_equal(env.ram, start)
+    env.close()
+
+
+def test_state_checkpoint_from_another_backend_is_rejected():
+    env = _replay_env()
+    env.reset()
+    checkpoint = env.save_checkpoint()
+    env.close()
+
+    env = make("SuperMarioBros-1-1-v0").unwrapped
+    env.reset()
+    with pytest.raises(ValueError):
+        env.load_checkpoint(checkpoint)
+    env.close()
+
+
+def test_delta_checkpoints_restore_along_a_chain_with_keyframes():
+    env = _replay_env()
+    env.reset()
+    checkpoints, rams = [], []
+    base = None
+    for _ in range(10):
+        env.step(0)
+        base = env.save_checkpoint(base=base, max_chain=3)
+        checkpoints.append(base)
+        rams.append(env.ram.copy())
+
+    assert [c.chain_length for c in checkpoints] == [0, 1, 2, 3, 0, 1, 2, 3, 0, 1]
+    assert len(checkpoints[1]._payload) < len(checkpoints[0]._payload) // 4
+    for checkpoint, ram in reversed(list(zip(checkpoints, rams))):
+        env.load_checkpoint(checkpoint)
+        assert np.array_equal(env.ram, ram)
+    env.close()
+
+
+def test_delta_encoding_round_trips():
+    from gym_super_mario_bros._checkpoint_delta import apply_deltas, encode_delta
+
+    rng = np.random.default_rng(0)
+    payloads = [rng.integers(0, 256, 4096, dtype=np.uint8).tobytes()]
+    for _ in range(5):
+        payload = bytearray(payloads[-1])
+        for index in rng.integers(0, 4096, 50):
+            payload[index] ^= 0xFF
+        payloads.append(bytes(payload))
+    deltas = [encode_delta(a, b) for a, b in zip(payloads, payloads[1:])]
+    assert apply_deltas(payloads[0], deltas) == payloads[-1]
+    assert apply_deltas(payloads[0], [encode_delta(payloads[0], payloads[0])]) == payloads[0]
+    with pytest.raises(ValueError):
+        encode_delta(b"ab", b"abc")
@@ -1,4 +1,3 @@
-import builtins
 import sys
 
 import pytest
@@ -103,3 +102,52 @@ def test_main_wraps_actionspace(monkeypatch):
 
     assert wrapped["called"] is True
     assert wrapped["actions"] == cli._ACTION_SPACES["right"]
+
+
+def test_main_prebuild_state_cache_makes_every_registered_env(monkeypatch):
+    made = []
+
+    class DummyEnv:
+        def close(self):
+            pass
+
+    def fake_make(env_id, state_cache=None):
+        made.append((env_id, state_cache))
+        return DummyEnv()
+
+    monkeypatch.setattr(cli._emulator_state, "is_supported", lambda: True)
+    monkeypatch.setattr(cli.gym, "make", fake_make)
+    monkeypatch.setattr(sys, "argv", ["prog", "--prebuild-state-cache", "/tmp/states"])
+    cli.main()
+
+    env_ids = [env_id for env_id, _ in made]
+    assert "SuperMarioBros-v0" in env_ids
+    assert "SuperMarioBros-8-4-v3" in env_ids
+    assert "SuperMarioBrosRandomStages-v0" in env_ids
+    assert all(state_cache == "/tmp/states" for _, state_cache in made)
+
+
+def test_main_prebuild_state_cache_is_a_no_op_without_core_support(monkeypatch, capsys):
+    def fake_make(env_id, state_cache=None):
+        raise AssertionError("no environment should be made")
+
+    monkeypatch.setattr(cli._emulator_state, "is_supported", lambda: False)
+    monkeypatch.setattr(cli.gym, "make", fake_make)
+    monkeypatch.setattr(sys, "argv", ["prog", "--prebuild-state-cache"])
+    cli.main()
+    assert "nothing to cache" in capsys.readouterr().out
+
+
+def test_verify_golden_exits_with_an_error_on_divergence(monkeypatch, capsys):
+    from gym_super_mario_bros._determinism import Divergence
+
+    monkeypatch.setattr(
+        cli._determinism,
+        "verify_golden",
+        lambda path, workers: [Divergence("SuperMarioBros-1-1-v0", 1, 42)],
+    )
+    monkeypatch.setattr(sys, "argv", ["prog", "--verify-golden", "golden.npz", "--workers", "2"])
+    with pytest.raises(SystemExit) as e:
+        cli.main()
+    assert e.value.code == 1
+    assert "SuperMarioBros-1-1-v0: sequence 1 diverges at step 42" in capsys.readouterr().out
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._backend import InputLogBackend
+from gym_super_mario_bros._backend import NesPyBackend
+from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+@pytest.fixture(scope="module")
+def trace():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [0b10000010] * 40, screen=False)
+    env.close()
+    return trace
+
+
+def _steps(env, n):
+    return [env.step(0)[1:4] for _ in range(n)]
+
+
+def test_clones_continue_from_the_current_state(trace):
+    env = SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace))
+    env.reset()
+    start = env.ram.copy()
+    _steps(env, 10)
+    clones = env.clone(n=2)
+
+    assert len(clones) == 2
+    for clone in clones:
+        assert clone._backend is not env._backend
+        assert np.array_equal(clone.ram, env.ram)
+        assert clone._time_last == env._time_last
+        assert clone._x_position_last == env._x_position_last
+        assert clone._frame_count == env._frame_count
+    expected = _steps(env, 5)
+    assert _steps(clones[0], 5) == expected
+    # the clones are independent of each other and of the environment
+    assert _steps(clones[1], 5) == expected
+    clones[0].stats["fast_respawns"] += 1
+    assert env.stats["fast_respawns"] == 0
+    # the clones reset to the same backup
+    clones[0].reset()
+    assert np.array_equal(clones[0].ram, start)
+
+
+def _play(env, actions):
+    """Return the step outputs of playing actions, with the screens as bytes."""
+    return [(obs.tobytes(), *rest) for obs, *rest in (env.step(action) for action in actions)]
+
+
+def test_clones_of_the_emulator_step_like_the_source():
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    start = env.reset()[0].copy()
+    _play(env, [0b10000010] * 30 + [0b10000011] * 10)
+    clone, = env.clone()
+    assert np.array_equal(clone.ram, env.ram)
+    assert np.array_equal(clone.screen, env.screen)
+    actions = [0b10000010, 0b10000011, 0b01000000, 0] * 30
+    assert _play(clone, actions) == _play(env, actions)
+    assert np.array_equal(clone.reset()[0], start)
+    env.reset()
+    assert np.array_equal(clone.ram, env.ram)
+    assert _play(clone, actions) == _play(env, actions)
+    env.close()
+    clone.close()
+    with pytest.raises(ValueError):
+        env.clone()
+
+
+class _StatelessBackend(NesPyBackend):
+    """A nes-py core that can't serialize its state, like PyPI builds."""
+
+    supports_state = False
+
+
+def test_clone_requires_state_serialization():
+    env = SuperMarioBrosEnv(target=(1, 1), backend=_StatelessBackend)
+    env.reset()
+    with pytest.raises(ValueError, match="clone"):
+        env.clone()
+    env.close()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._dataset import DatasetReader, DatasetWriter
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+def _transitions(steps):
+    env = SuperMarioBrosEnv(target=(1, 1))
+    env.reset()
+    transitions = []
+    for step in range(steps):
+        action = 0b10000010 if step % 3 else 0b10000011
+        observation, reward, terminated, truncated, info = env.step(action)
+        transitions.append((observation.copy(), action, reward, terminated, truncated, info))
+    env.close()
+    return transitions
+
+
+def test_transitions_round_trip_through_chunks(tmp_path):
+    transitions = _transitions(10)
+    with DatasetWriter(tmp_path, chunk_size=4, queue_size=2) as writer:
+        for transition in transitions[:8]:
+            writer.add(*transition)
+        writer.flush()
+        # complete chunks are readable while the dataset is written
+        assert len(DatasetReader(tmp_path)) == 8
+        for transition in transitions[8:]:
+            writer.add(*transition)
+    with pytest.raises(FileExistsError):
+        DatasetWriter(tmp_path)
+
+    reader = DatasetReader(tmp_path)
+    assert len(reader) == 10
+    assert reader.schema["observation"] == (np.dtype(np.uint8), (240, 256, 3))
+    for index in (0, 5, -1):
+        observation, action, reward, terminated, truncated, info = transitions[index]
+        stored = reader[index]
+        assert np.array_equal(stored["observation"], observation)
+        assert (stored["action"], stored["reward"], stored["terminated"], stored["truncated"]) == (action, reward, terminated, truncated)
+        assert {key: stored["info." + key].item() for key in info} == info
+    with pytest.raises(IndexError):
+        reader[10]
+
+    batches = list(reader.batches(3, start=1))
+    assert [len(batch["action"]) for batch in batches] == [3, 3, 3]
+    actions = np.concatenate([batch["action"] for batch in batches])
+    assert actions.tolist() == [transition[1] for transition in transitions[1:]]
+    assert np.array_equal(batches[1]["observation"][2], transitions[6][0])
+
+
+def test_writer_errors_surface_in_the_actor(tmp_path):
+    writer = DatasetWriter(tmp_path, chunk_size=4)
+    writer.add(np.zeros((2, 2), dtype=np.uint8), 0, 0.0, False, False)
+    writer.add(np.zeros((3, 3), dtype=np.uint8), 0, 0.0, False, False)
+    with pytest.raises(RuntimeError):
+        writer.close()
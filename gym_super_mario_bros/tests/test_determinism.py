@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._determinism import Divergence, default_corpus, record_golden, stage_ids, verify_golden
+
+
+STAGES = ["SuperMarioBros-1-1-v0", "SuperMarioBros-4-2-v3"]
+
+
+# the hashes of a 40 step default corpus on every stage, recorded with
+# `record_golden(GOLDEN, corpus=default_corpus(steps=40))`
+GOLDEN = Path(__file__).parent / "data" / "golden.npz"
+
+
+def test_stage_ids_cover_every_stage_and_rom_mode():
+    ids = stage_ids()
+    assert len(ids) == 32 * 4
+    assert "SuperMarioBros-8-4-v3" in ids and "SuperMarioBros-v0" not in ids
+
+
+def test_verification_reports_the_first_diverging_step(tmp_path):
+    path = str(tmp_path / "golden.npz")
+    record_golden(path, STAGES, default_corpus(steps=30), workers=1)
+    assert verify_golden(path, workers=0) == []
+
+    with np.load(path) as golden:
+        arrays = dict(golden)
+    arrays["SuperMarioBros-1-1-v0:2"][12] ^= 1
+    arrays["SuperMarioBros-1-1-v0:1"][20] ^= 1
+    arrays["SuperMarioBros-4-2-v3:0"] = arrays["SuperMarioBros-4-2-v3:0"][:10]
+    np.savez(path, **arrays)
+    assert verify_golden(path, workers=0) == [
+        Divergence("SuperMarioBros-1-1-v0", 2, 12),
+        Divergence("SuperMarioBros-4-2-v3", 0, 10),
+    ]
+    with pytest.raises(ValueError):
+        verify_golden(path, ["SuperMarioBros-2-1-v0"], workers=0)
+
+
+def test_golden_file_covers_every_stage():
+    with np.load(GOLDEN) as golden:
+        assert sorted(str(env_id) for env_id in golden["env_ids"]) == stage_ids()
+        assert golden["corpus"].shape == (3, 40)
+
+
+@pytest.mark.parametrize("world", range(1, 9))
+def test_stages_match_the_golden_file(world):
+    # the CI workflow verifies every stage with the command line interface
+    env_ids = ["SuperMarioBros-{}-{}-v{}".format(world, stage, world % 4) for stage in range(1, 5)]
+    assert verify_golden(GOLDEN, env_ids, workers=0) == []
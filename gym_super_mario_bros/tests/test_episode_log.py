@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._episode_log import EpisodeLog, EpisodeRecorder
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+def _actions(steps):
+    rng = np.random.default_rng(0)
+    return rng.choice([0b10000000, 0b10000010, 0b10000011, 0b00000001], size=steps).tolist()
+
+
+def test_recorded_episodes_replay_their_steps(tmp_path):
+    env = EpisodeRecorder(SuperMarioBrosEnv(target=(1, 1)), tmp_path, hash_every=8)
+    env.reset()
+    expected = []
+    for action in _actions(60):
+        observation, reward, terminated, truncated, info = env.step(action)
+        expected.append((observation.copy(), reward, info))
+    env.reset()
+    env.step(0)
+    env.close()
+    assert [path.rsplit("-", 1)[1] for path in env.paths] == ["000000.npz", "000001.npz"]
+
+    log = EpisodeLog.load(env.paths[0])
+    assert len(log) == 60 and log.actions.dtype == np.uint8
+    assert len(log.ram_hashes) == 60 // 8
+    assert not log.terminated.any() and not log.truncated.any()
+    replayed = [(observation.copy(), reward, info) for observation, reward, _, _, info in log.replay()]
+    assert len(replayed) == 60
+    for (observation, reward, info), (expected_observation, expected_reward, expected_info) in zip(replayed, expected):
+        assert np.array_equal(observation, expected_observation)
+        assert (reward, info) == (expected_reward, expected_info)
+
+
+def test_replay_detects_desync(tmp_path):
+    env = EpisodeRecorder(SuperMarioBrosEnv(target=(1, 1)), tmp_path, hash_every=4)
+    env.reset()
+    for action in [0b10000010] * 40:
+        env.step(action)
+    env.close()
+    log = EpisodeLog.load(env.paths[0])
+    # standing still instead of running keeps the rewards at zero but not the RAM
+    log.actions[:] = 0
+    log.rewards[:] = 0
+    with pytest.raises(RuntimeError, match="RAM"):
+        for _ in log.replay():
+            pass
+    assert len(list(log.replay(verify=False))) == 40
+
+
+def test_replay_uses_the_recorded_truncation_budgets(tmp_path):
+    env = EpisodeRecorder(SuperMarioBrosEnv(target=(1, 1), max_stuck_steps=20), tmp_path)
+    env.reset()
+    truncated = False
+    while not truncated:
+        truncated = env.step(0)[3]
+    env.close()
+    log = EpisodeLog.load(env.paths[0])
+    assert log.env_options["max_stuck_steps"] == 20
+    assert log.env_options["fast_respawn"] is False
+    # a new environment without the budget would not truncate at the end
+    steps = list(log.replay())
+    assert len(steps) == len(log) and steps[-1][3]
+
+
+def test_recorder_requires_a_mario_env(tmp_path):
+    import gymnasium as gym
+    with pytest.raises(TypeError):
+        EpisodeRecorder(gym.make("CartPole-v1"), tmp_path)
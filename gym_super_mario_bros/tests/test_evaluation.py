@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._backend import InputLogBackend
+from gym_super_mario_bros._evaluation import SequenceEvaluator
+from gym_super_mario_bros._evaluation import env_kwargs_of
+from gym_super_mario_bros._evaluation import evaluate_sequences
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+# the actions from the reset to the checkpoint the sequences start from
+_PREFIX = [0b10000010] * 10
+
+
+@pytest.fixture(scope="module")
+def start():
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    env.reset()
+    for action in _PREFIX:
+        env.step(action)
+    checkpoint = env.save_checkpoint()
+    env.close()
+    return checkpoint
+
+
+def _sequences():
+    rng = np.random.default_rng(0)
+    return [rng.choice([0, 0b10000010, 0b10000011], size=length) for length in (30, 5, 0, 50)]
+
+
+def _play(env, actions):
+    """Return the record of playing a sequence after the prefix from a reset."""
+    env.reset()
+    for action in _PREFIX:
+        env.step(action)
+    total_reward, steps, terminated, truncated = 0.0, 0, False, False
+    info = env._get_info()
+    for action in actions.tolist():
+        _, reward, terminated, truncated, info = env.step(action)
+        total_reward += reward
+        steps += 1
+        if terminated or truncated:
+            break
+    return total_reward, steps, terminated, truncated, info["x_pos"], info["flag_get"]
+
+
+def test_checkpoint_names_its_environment(start):
+    assert env_kwargs_of(start) == dict(rom_mode="vanilla", lost_levels=False, target=(1, 1), backend=InputLogBackend)
+    env = SuperMarioBrosEnv(target=(1, 1))
+    env.reset()
+    assert env_kwargs_of(env.save_checkpoint()) == dict(rom_mode="vanilla", lost_levels=False, target=(1, 1))
+    env.close()
+
+
+def test_results_match_playing_the_sequences():
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    rng = np.random.default_rng(1)
+    sequences = [rng.choice([0, 0b10000010, 0b10000011, 0b01000000], size=80) for _ in range(4)]
+    expected = [_play(env, actions) for actions in sequences]
+    env.reset()
+    for action in _PREFIX:
+        env.step(action)
+    results = evaluate_sequences(env.save_checkpoint(), sequences, workers=0)
+    env.close()
+    assert results.tolist() == expected
+
+
+def test_a_chunk_replays_the_checkpoint_depth_once():
+    with SequenceEvaluator(dict(target=(1, 1), backend=InputLogBackend), workers=0) as evaluator:
+        env = evaluator._env
+        env.reset()
+        for _ in range(3):
+            for action in _PREFIX:
+                env.step(action)
+        deep = env.save_checkpoint()
+        depth = env._frame_count - env._episode_start_frame
+        backend = env._backend
+        before = backend.frames_replayed
+        evaluator.evaluate(deep, _sequences())
+        assert backend.frames_replayed - before == depth
+        # another batch from the same checkpoint replays nothing
+        before = backend.frames_replayed
+        evaluator.evaluate(deep, _sequences())
+        assert backend.frames_replayed == before
+
+
+def test_buffers_checkpoints_are_rejected():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    env.reset()
+    checkpoint = env.save_checkpoint()
+    env.close()
+    assert checkpoint.payload_format == "buffers"
+    with pytest.raises(ValueError, match="complete emulator state"):
+        evaluate_sequences(checkpoint, _sequences(), workers=0)
+
+
+def test_workers_match_in_process_evaluation(start):
+    expected = evaluate_sequences(start, _sequences(), workers=0)
+    assert expected.dtype.names == ("total_reward", "steps", "terminated", "truncated", "x_pos", "flag_get")
+    assert expected["steps"].tolist() == [30, 5, 0, 50]
+    assert expected["x_pos"][3] > expected["x_pos"][1]
+
+    with SequenceEvaluator(env_kwargs_of(start), workers=2) as evaluator:
+        results, screens = evaluator.evaluate(start, _sequences(), frames=True)
+        # the warm workers evaluate another batch the same way
+        again = evaluator.evaluate(start, _sequences())
+    assert np.array_equal(results, expected)
+    assert np.array_equal(again, expected)
+    assert screens.shape == (4, 240, 256, 3)
+
+
+def test_sequences_stop_when_the_episode_ends(start):
+    kwargs = dict(env_kwargs_of(start), max_stuck_steps=5)
+    results = evaluate_sequences(start, [[0] * 100], workers=0, env_kwargs=kwargs)
+    # Mario slides to a stop, then the stuck budget runs out
+    assert 5 <= results["steps"][0] < 100
+    assert results["truncated"][0]
+    assert not results["terminated"][0]
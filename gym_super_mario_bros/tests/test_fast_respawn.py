@@ -0,0 +1,126 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._backend import InputLogBackend
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+# the pseudo-random number generator
+_PRNG = list(range(0x07A7, 0x07AE))
+
+
+# the RAM a restored life-start snapshot gets wrong: it holds the random number
+# generator and the interval timer control and timer of the life it was taken
+# in, not of the respawn that is skipped
+_SNAPSHOT_PHASE_ADDRESSES = {0x077F, 0x0787, *_PRNG}
+
+
+def _make_env_without_init() -> SuperMarioBrosEnv:
+    env = object.__new__(SuperMarioBrosEnv)
+    env.ram = np.zeros(0x0800, dtype=np.uint8)
+    env._respawn_snapshots = {}
+    env._backend = SimpleNamespace(frames_replayed=0)
+    env.stats = dict(fast_respawns=0, respawn_frames_avoided=0, respawn_frames_replayed=0)
+    # the "emulator state" of the fake is a copy of its RAM
+    env._dump_state = lambda: env.ram.tobytes()
+    env._load_state = lambda state: env.ram.__setitem__(slice(None), np.frombuffer(state, dtype=np.uint8))
+    return env
+
+
+def test_restore_life_start_misses_without_snapshot():
+    env = _make_env_without_init()
+    assert env._restore_life_start((1, 1, 1, 0)) is False
+    assert env.stats["fast_respawns"] == 0
+
+
+def test_restore_life_start_patches_carried_over_values():
+    env = _make_env_without_init()
+    # the life-start state: 1 life left, no score, Mario at x=40
+    env.ram[0x075A] = 1
+    env.ram[0x0086] = 40
+    env._cache_life_start((1, 1, 1, 0), frames=120)
+    # Mario dies later with 2 lives, a score of 1230, and 15 coins
+    env.ram[0x075A] = 2
+    env.ram[0x0086] = 200
+    env.ram[0x07DE:0x07DE + 6] = [0, 0, 1, 2, 3, 0]
+    env.ram[0x07ED:0x07ED + 2] = [1, 5]
+    env.ram[0x075E] = 15
+
+    assert env._restore_life_start((1, 1, 1, 0)) is True
+
+    assert env.ram[0x0086] == 40
+    assert env._life == 1
+    assert env._score == 1230
+    assert env._coins == 15
+    assert env.ram[0x075E] == 15
+    assert env.stats == dict(fast_respawns=1, respawn_frames_avoided=120, respawn_frames_replayed=0)
+
+
+def test_restore_life_start_counts_the_frames_replayed_to_load():
+    env = _make_env_without_init()
+    env.ram[0x075A] = 2
+    env._cache_life_start((1, 1, 1, 0), frames=120)
+    load_state = env._load_state
+
+    def replay_and_load(state):
+        env._backend.frames_replayed += 300
+        load_state(state)
+
+    env._load_state = replay_and_load
+    assert env._restore_life_start((1, 1, 1, 0)) is True
+    assert env.stats == dict(fast_respawns=1, respawn_frames_avoided=-180, respawn_frames_replayed=300)
+
+
+def test_respawn_point_includes_midpoint_page():
+    env = _make_env_without_init()
+    env.ram[0x075F] = 0
+    env.ram[0x075C] = 1
+    env.ram[0x0760] = 2
+    env.ram[0x075B] = 6
+    assert env._respawn_point == (1, 2, 3, 6)
+
+
+class _StatelessBackend(InputLogBackend):
+    """A nes-py core that can't serialize its state, like PyPI builds."""
+
+    supports_state = False
+
+
+def test_fast_respawn_requires_state_serialization():
+    with pytest.raises(ValueError, match="fast_respawn"):
+        SuperMarioBrosEnv(fast_respawn=True, backend=_StatelessBackend)
+
+
+def test_fast_respawn_differs_from_emulated_respawn_in_the_snapshot_phase():
+    """Walking right in 1-1 dies to the first Goomba; compare the respawns.
+
+    The two paths are not equivalent. The restored snapshot matches the
+    emulated respawn on screen and in RAM except for the random number
+    generator and the timer phase of the life it was taken in, so the two
+    episodes can diverge later (e.g., in what enemies do).
+    """
+    fast = SuperMarioBrosEnv(fast_respawn=True, backend=InputLogBackend)
+    slow = SuperMarioBrosEnv()
+    fast.reset()
+    slow.reset()
+
+    for _ in range(3000):
+        _, r1, d1, t1, i1 = fast.step(0b10000000)
+        _, r2, d2, t2, i2 = slow.step(0b10000000)
+        assert (r1, d1, t1, i1) == (r2, d2, t2, i2)
+        assert np.array_equal(fast.screen, slow.screen)
+        if fast.stats["fast_respawns"]:
+            break
+        assert np.array_equal(fast.ram, slow.ram)
+
+    assert fast.stats["fast_respawns"] == 1
+    assert set(np.flatnonzero(fast.ram != slow.ram).tolist()) <= _SNAPSHOT_PHASE_ADDRESSES
+    assert not np.array_equal(fast.ram[_PRNG], slow.ram[_PRNG])
+    # loading the snapshot replays the input log, which costs more frames
+    # than the skipped respawn
+    assert fast.stats["respawn_frames_replayed"] > 0
+    assert fast.stats["respawn_frames_avoided"] < 0
+    fast.close()
+    slow.close()
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+import gym_super_mario_bros
+
+
+def _run(code):
+    """Run code in a fresh interpreter and return its stdout."""
+    root = os.path.dirname(os.path.dirname(gym_super_mario_bros.__file__))
+    env = dict(os.environ, PYTHONPATH=root)
+    out = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True)
+    return out.stdout.strip()
+
+
+def test_import_does_not_load_heavy_dependencies():
+    out = _run(
+        "import sys, gym_super_mario_bros\n"
+        "print(sorted(m for m in ('numpy', 'gymnasium', 'gym', 'nes_py') if m in sys.modules))"
+    )
+    assert out == "[]"
+
+
+def test_environments_register_when_gymnasium_is_imported_later():
+    out = _run(
+        "import gym_super_mario_bros\n"
+        "import gymnasium as gym\n"
+        "print(gym.spec('SuperMarioBros-1-1-v0').entry_point)"
+    )
+    assert out == "gym_super_mario_bros:SuperMarioBrosEnv"
+
+
+def test_lazy_attributes_resolve_to_the_defining_modules():
+    from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+    from gym_super_mario_bros.smb_random_stages_env import SuperMarioBrosRandomStagesEnv
+
+    assert gym_super_mario_bros.SuperMarioBrosEnv is SuperMarioBrosEnv
+    assert gym_super_mario_bros.SuperMarioBrosRandomStagesEnv is SuperMarioBrosRandomStagesEnv
+    assert set(gym_super_mario_bros.__all__) <= set(dir(gym_super_mario_bros))
@@ -0,0 +1,103 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._backend import InputLogBackend
+from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+from gym_super_mario_bros.smb_random_stages_env import SuperMarioBrosRandomStagesEnv
+
+
+# run right and jump
+_ACTION = 0b10000011
+
+
+def _replay_env(**kwargs):
+    """Return an env replaying a recorded stretch of 1-1."""
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [_ACTION] * 40, screen=False)
+    env.close()
+    return SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace), **kwargs)
+
+
+def _steps(env, n):
+    return [env.step(_ACTION)[1:] for _ in range(n)]
+
+
+def test_pickle_restores_the_emulator_and_episode_bookkeeping():
+    env = _replay_env(max_stuck_steps=500)
+    env.reset()
+    _steps(env, 10)
+    clone = pickle.loads(pickle.dumps(env))
+    assert clone is not env
+    assert clone._max_stuck_steps == 500
+    assert clone._frame_count == env._frame_count
+    assert clone._time_last == env._time_last
+    assert np.array_equal(clone.ram, env.ram)
+    assert _steps(clone, 10) == _steps(env, 10)
+    # the reset backup is restored as well
+    clone.reset()
+    env.reset()
+    assert np.array_equal(clone.ram, env.ram)
+    clone.close()
+    env.close()
+
+
+def test_pickle_without_state_support_constructs_a_fresh_env(monkeypatch):
+    env = SuperMarioBrosEnv(target=(2, 1), max_episode_frames=50)
+    monkeypatch.setattr(env._backend.__class__, "supports_state", False)
+    env.reset()
+    env.step(_ACTION)
+    clone = pickle.loads(pickle.dumps(env))
+    assert (clone._target_world, clone._target_stage) == (2, 1)
+    assert clone._max_episode_frames == 50
+    # the episode didn't survive the pickle, so it can't be continued
+    assert clone.done
+    with pytest.raises(ValueError):
+        clone.step(_ACTION)
+    _obs, info = clone.reset()
+    assert clone.step(0)[4]["world"] == 2
+    clone.close()
+    env.close()
+
+
+def test_unpickling_does_not_emulate_the_start_screen(monkeypatch):
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    env.reset()
+    _steps(env, 10)
+    data = pickle.dumps(env)
+
+    def fail(self):
+        raise AssertionError("start screen emulated")
+
+    monkeypatch.setattr(SuperMarioBrosEnv, "_skip_start_screen", fail)
+    clone = pickle.loads(data)
+    assert np.array_equal(clone.ram, env.ram)
+    assert _steps(clone, 20) == _steps(env, 20)
+    assert np.array_equal(clone.reset()[0], env.reset()[0])
+    assert np.array_equal(clone.ram, env.ram)
+    clone.close()
+    env.close()
+
+
+def test_pickling_a_closed_env_raises():
+    env = _replay_env()
+    env.close()
+    with pytest.raises(ValueError):
+        pickle.dumps(env)
+
+
+def test_random_stages_env_pickles_its_stages_and_rng():
+    env = SuperMarioBrosRandomStagesEnv(stages=["1-1", "1-2", "4-1"])
+    env.reset(seed=3)
+    env.step(0)
+    clone = pickle.loads(pickle.dumps(env))
+    assert list(clone._live_envs) == list(env._live_envs)
+    assert clone.env is clone._live_envs[next(iter(clone._live_envs))]
+    assert clone.stages == env.stages
+    for _ in range(3):
+        assert clone.reset()[1] == env.reset()[1]
+        assert clone.step(0)[4] == env.step(0)[4]
+    clone.close()
+    env.close()
@@ -1,6 +1,8 @@
 """Test cases for the gym registered environments."""
 from unittest import TestCase
 from .._registration import make
+from .._registration import make_raw
+from ..smb_env import SuperMarioBrosEnv
 
 
 class ShouldMakeEnv:
@@ -413,3 +415,23 @@ class ShouldMakeSuperMarioBrosRandomStagesSubset(ShouldMakeEnv, TestCase):
     stages = ['4-2']
     # the environments ID for all versions of Super Mario Bros
     env_id = ['SuperMarioBrosRandomStages-v{}'.format(v) for v in range(4)]
+
+
+class ShouldMakeRawEnv(TestCase):
+    def test_returns_the_bare_env_with_registered_kwargs(self):
+        env = make_raw('SuperMarioBros-2-3-v1', max_stuck_steps=5)
+        try:
+            self.assertIs(type(env), SuperMarioBrosEnv)
+            self.assertIs(env.unwrapped, env)
+            self.assertEqual('SuperMarioBros-2-3-v1', env.spec.id)
+            self.assertEqual((2, 3), (env._target_world, env._target_stage))
+            self.assertEqual(5, env._max_stuck_steps)
+            env.reset()
+            self.assertEqual(5, len(env.step(0)))
+        finally:
+            env.close()
+
+    def test_rejects_foreign_environments(self):
+        import gymnasium as gym
+        self.assertIn('CartPole-v1', gym.registry)
+        self.assertRaises(ValueError, make_raw, 'CartPole-v1')
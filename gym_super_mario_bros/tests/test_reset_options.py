@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._registration import make
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+from gym_super_mario_bros.smb_random_stages_env import SuperMarioBrosRandomStagesEnv
+
+
+def _checkpoint_after(env, steps):
+    env.reset()
+    for _ in range(steps):
+        env.step(0b10000010)
+    return env.save_checkpoint(), env.ram.copy()
+
+
+def test_reset_starts_from_a_checkpoint_through_wrappers():
+    env = make("SuperMarioBros-1-1-v0")
+    checkpoint, ram = _checkpoint_after(env.unwrapped, 30)
+    env.reset()
+    env.reset(options={"checkpoint": checkpoint})
+    assert np.array_equal(env.unwrapped.ram, ram)
+    assert env.unwrapped._x_position_last == checkpoint.x_position_last
+    _, _, terminated, truncated, _ = env.step(0)
+    assert not terminated and not truncated
+    env.close()
+
+
+def test_checkpoint_reset_only_affects_that_reset():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    env.reset()
+    start = env.ram.copy()
+    checkpoint, ram = _checkpoint_after(env, 60)
+    env.reset()
+    env.reset(options={"checkpoint": checkpoint})
+    assert np.array_equal(env.ram, ram)
+    env.reset()
+    assert np.array_equal(env.ram, start)
+    assert env._x_position == 40
+    env.close()
+
+
+def test_checkpoint_reset_skips_the_start_screen_after_a_buffers_checkpoint(monkeypatch):
+    env = SuperMarioBrosEnv(target=(1, 1))
+    checkpoint, _ = _checkpoint_after(env, 30)
+    if checkpoint.payload_format != "buffers":
+        pytest.skip("the nes-py core serializes its state")
+    expected = [(obs.copy(), reward) for obs, reward, *_ in (env.step(0b10000011) for _ in range(20))]
+    boots = []
+    monkeypatch.setattr(env, "_boot", lambda power_cycle=False: boots.append(power_cycle))
+    env.reset(options={"checkpoint": checkpoint})
+    assert boots == []
+    # the backup slot still holds the checkpoint, so it restores exactly
+    for obs, reward in expected:
+        actual = env.step(0b10000011)[:2]
+        assert np.array_equal(actual[0], obs)
+        assert actual[1] == reward
+    env.close()
+
+
+def test_reset_samples_checkpoints_by_weight():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    first, first_ram = _checkpoint_after(env, 10)
+    second, second_ram = _checkpoint_after(env, 20)
+    options = {"checkpoints": [first, second], "weights": [0, 1]}
+    for seed in range(3):
+        env.reset(seed=seed, options=options)
+        assert np.array_equal(env.ram, second_ram)
+    with pytest.raises(ValueError):
+        env.reset(options={"checkpoints": [first], "weights": [1, 1]})
+    with pytest.raises(ValueError):
+        env.reset(options={"checkpoint": first, "checkpoints": [first]})
+    env.close()
+
+
+def test_random_stages_env_selects_the_stage_of_the_checkpoint():
+    stage_env = SuperMarioBrosEnv(target=(1, 2))
+    checkpoint, ram = _checkpoint_after(stage_env, 10)
+    stage_env.close()
+
+    env = SuperMarioBrosRandomStagesEnv(stages=["1-1"])
+    env.reset(seed=0, options={"checkpoints": [checkpoint]})
+    assert (env.env._target_world, env.env._target_stage) == (1, 2)
+    assert np.array_equal(env.env.ram, ram)
+    env.step(0)
+    env.close()
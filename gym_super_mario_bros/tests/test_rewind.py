@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._backend import InputLogBackend
+from gym_super_mario_bros._backend import NesPyBackend
+from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+@pytest.fixture(scope="module")
+def trace():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [0b10000010] * 60, screen=False)
+    env.close()
+    return trace
+
+
+def _env(trace, **kwargs):
+    return SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace), rewind_every=4, **kwargs)
+
+
+def test_rewind_restores_snapshots_and_bookkeeping(trace):
+    env = _env(trace)
+    env.reset()
+    start = env.ram.copy()
+    states = {}
+    for _ in range(20):
+        env.step(0)
+        states[env._frame_count] = env.ram.copy(), env._x_position_last, env._time_last
+    frames = sorted(frame for frame in states if frame % 4 == 0)
+
+    env.rewind(2)
+    frame = env._frame_count
+    assert frame == frames[-2]
+    ram, x_position_last, time_last = states[frame]
+    assert np.array_equal(env.ram, ram)
+    assert (env._x_position_last, env._time_last) == (x_position_last, time_last)
+    # the rewound history continues from the restored snapshot
+    expected = [env.step(0)[1:4] for _ in range(4)]
+    env.rewind(2)
+    assert env._frame_count == frame
+    assert [env.step(0)[1:4] for _ in range(4)] == expected
+
+    env.rewind(env._rewind_count)
+    assert np.array_equal(env.ram, start)
+    with pytest.raises(ValueError):
+        env.rewind(2)
+
+
+def test_rewind_ring_keeps_the_latest_snapshots(trace):
+    env = _env(trace, rewind_capacity=3)
+    env.reset()
+    for _ in range(40):
+        env.step(0)
+    with pytest.raises(ValueError):
+        env.rewind(4)
+    frame = env._frame_count - env._frame_count % 4
+    env.rewind(3)
+    assert env._frame_count == frame - 8
+
+
+class _StatelessBackend(NesPyBackend):
+    """A nes-py core that can't serialize its state, like PyPI builds."""
+
+    supports_state = False
+
+
+def test_rewind_requires_state_serialization():
+    with pytest.raises(ValueError, match="rewind_every"):
+        SuperMarioBrosEnv(target=(1, 1), rewind_every=4, backend=_StatelessBackend)
+
+
+def test_rewind_restores_the_emulator_with_an_input_log():
+    env = SuperMarioBrosEnv(target=(1, 1), rewind_every=4, backend=InputLogBackend)
+    env.reset()
+    start = env._frame_count
+    states = {}
+    for _ in range(20):
+        env.step(0b10000010)
+        states[env._frame_count] = env.ram.copy(), env.screen.copy()
+    frames = sorted(frame for frame in states if (frame - start) % 4 == 0)
+
+    env.rewind(2)
+    assert env._frame_count == frames[-2]
+    ram, screen = states[env._frame_count]
+    assert np.array_equal(env.ram, ram)
+    assert np.array_equal(env.screen, screen)
+    # the emulator continues like it did from the restored snapshot
+    expected = [env.step(0b10000011)[1:4] for _ in range(4)]
+    env.rewind(2)
+    assert [env.step(0b10000011)[1:4] for _ in range(4)] == expected
+    env.close()
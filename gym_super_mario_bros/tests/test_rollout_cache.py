@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._backend import InputLogBackend
+from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+from gym_super_mario_bros._evaluation import RESULT_DTYPE
+from gym_super_mario_bros._evaluation import evaluate_sequences
+from gym_super_mario_bros._rollout_cache import RolloutCache
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+@pytest.fixture(scope="module")
+def trace():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [0b10000010] * 100, screen=False)
+    env.close()
+    return trace
+
+
+def _population(rng, size, length):
+    """Return mutations of a parent sequence that share long prefixes."""
+    parent = rng.choice([0b10000010, 0b10000011], size=length)
+    population = [parent]
+    for _ in range(size - 1):
+        child = parent.copy()
+        start = rng.integers(length // 2, length)
+        child[start:] = rng.choice([0, 0b10000010, 0b10000011], size=length - start)
+        population.append(child)
+    return population
+
+
+def _play(env_kwargs, population):
+    """Return the records of playing each sequence from a reset."""
+    env = SuperMarioBrosEnv(**env_kwargs)
+    records = []
+    for actions in population:
+        env.reset()
+        total_reward, steps, terminated, truncated = 0.0, 0, False, False
+        info = env._get_info()
+        for action in actions.tolist():
+            _, reward, terminated, truncated, info = env.step(action)
+            total_reward += reward
+            steps += 1
+            if terminated or truncated:
+                break
+        records.append((total_reward, steps, terminated, truncated, info["x_pos"], info["flag_get"]))
+    env.close()
+    return np.array(records, dtype=RESULT_DTYPE)
+
+
+def _evaluate(env_kwargs, population):
+    env = SuperMarioBrosEnv(**env_kwargs)
+    env.reset()
+    checkpoint = env.save_checkpoint()
+    cache = RolloutCache(env, checkpoint, checkpoint_every=4)
+    results = cache.evaluate_batch(population)
+    if isinstance(env_kwargs.get("backend"), ReplayBackend):
+        env_kwargs = dict(env_kwargs, backend=env_kwargs["backend"].clone())
+    if checkpoint.payload_format == "state":
+        expected = evaluate_sequences(checkpoint, population, workers=0, env_kwargs=env_kwargs)
+    else:
+        # the evaluator only takes checkpoints of the complete emulator state
+        expected = _play(env_kwargs, population)
+    assert np.array_equal(results, expected)
+    return cache
+
+
+def test_cache_resumes_from_node_checkpoints(trace):
+    env_kwargs = dict(target=(1, 1), max_stuck_steps=20, backend=ReplayBackend(trace))
+    population = _population(np.random.default_rng(0), 12, 60)
+    cache = _evaluate(env_kwargs, population)
+    assert len(cache.pool) > 0
+    assert cache.frames_saved > 0.3
+
+    # a sequence that ends inside the trie is answered without emulating
+    emulated = cache.stats["frames_emulated"]
+    cache.evaluate(population[3][:20])
+    assert cache.stats["frames_emulated"] == emulated
+
+
+def test_cache_without_state_serialization_emulates_from_the_start():
+    env_kwargs = dict(target=(1, 1), max_stuck_steps=20)
+    population = _population(np.random.default_rng(1), 6, 40)
+    population += [sequence[:30] for sequence in population]
+    cache = _evaluate(env_kwargs, population)
+    if cache._keeps_checkpoints:
+        pytest.skip("the nes-py core serializes its state")
+    assert len(cache.pool) == 0
+    # only the prefixes are answered from the trie
+    assert 0 < cache.frames_saved < 0.5
+
+
+def test_cached_rollouts_match_uncached_ones_on_the_emulator():
+    env_kwargs = dict(target=(1, 1), max_stuck_steps=20, backend=InputLogBackend)
+    rng = np.random.default_rng(2)
+    population = _population(rng, 8, 60)
+    # sequences that diverge from the parent early or right away
+    population += [
+        np.concatenate([population[0][:depth], rng.choice([0, 0b01000000, 0b10000011], size=60 - depth)])
+        for depth in (0, 1, 4, 9)
+    ]
+    # and prefixes of earlier sequences that end inside the trie
+    population += [population[5][:25], population[9][:3]]
+    cache = _evaluate(env_kwargs, population)
+    assert len(cache.pool) > 0
+    # resuming replays the log from the start state, so little is saved
+    assert cache.stats["frames_replayed"] > 0
+    assert np.array_equal(cache.evaluate_batch(population), _play(env_kwargs, population))
+
+
+def test_frames_replayed_to_load_nodes_count_as_emulated():
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    env.reset()
+    cache = RolloutCache(env, checkpoint_every=4)
+    parent = np.full(40, 0b10000010)
+    cache.evaluate(parent)
+    assert cache.stats["frames_replayed"] == 0
+    emulated = cache.stats["frames_emulated"]
+    # the child resumes from the node 36 steps in, which replays those steps
+    # from the start state (not the start screen before it)
+    child = np.concatenate([parent[:37], np.zeros(3, dtype=parent.dtype)])
+    cache.evaluate(child)
+    assert cache.stats["frames_replayed"] == 36
+    assert cache.stats["frames_emulated"] - emulated == 36 + 4
+    env.close()
@@ -0,0 +1,90 @@
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from gym_super_mario_bros._roms import rom_path
+from gym_super_mario_bros._roms.rom_registry import load_rom, registered_rom
+
+
+def test_load_rom_validates_and_hashes_once():
+    path = rom_path(False, "vanilla")
+    image = load_rom(path)
+    assert load_rom(path) is image
+    assert registered_rom(path) is image
+    assert image.sha256 == hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    assert image.header.prg_rom_size_16kb_units == 2
+    assert len(image.data) == Path(path).stat().st_size
+
+
+def test_roms_have_distinct_hashes():
+    hashes = {load_rom(rom_path(False, mode)).sha256 for mode in ["vanilla", "downsample", "pixel", "rectangle"]}
+    assert len(hashes) == 4
+
+
+def test_load_rom_missing_file_raises(tmp_path: Path):
+    with pytest.raises(ValueError):
+        load_rom(tmp_path / "missing.nes")
+    assert registered_rom(tmp_path / "missing.nes") is None
+
+
+def test_load_rom_empty_file_raises(tmp_path: Path):
+    p = tmp_path / "empty.nes"
+    p.write_bytes(b"")
+    with pytest.raises(ValueError):
+        load_rom(p)
+
+
+def test_load_rom_bad_header_raises(tmp_path: Path):
+    p = tmp_path / "bad.nes"
+    p.write_bytes(b"NOPE" + b"\x00" * 32)
+    with pytest.raises(ValueError):
+        load_rom(p)
+
+
+def test_nes_py_rom_shares_the_registered_bytes():
+    import gym_super_mario_bros.smb_env  # noqa: F401 (patches nes-py)
+    from nes_py._rom import ROM
+
+    path = rom_path(False, "vanilla")
+    image = load_rom(path)
+    rom = ROM(image.path)
+    assert rom.raw_data.flags.writeable is False
+    assert rom.raw_data.tobytes() == image.data[:]
+    assert rom.prg_rom_size == 32
+
+
+def test_nes_py_rom_still_validates_the_registered_header(tmp_path: Path):
+    import gym_super_mario_bros.smb_env  # noqa: F401 (patches nes-py)
+    from nes_py._rom import ROM
+
+    path = tmp_path / "rewritten.nes"
+    path.write_bytes(Path(rom_path(False, "vanilla")).read_bytes())
+    image = load_rom(path)
+    # rewrite a zero fill byte of the header in place, which the map sees
+    with open(path, "r+b") as file:
+        file.seek(12)
+        file.write(b"\x01")
+    assert image.data[12] == 1
+    with pytest.raises(ValueError, match="zero fill"):
+        ROM(image.path)
+
+
+def test_load_rom_bad_header_closes_the_map(tmp_path: Path, monkeypatch):
+    from gym_super_mario_bros._roms import rom_registry
+
+    maps = []
+    mmap = rom_registry.mmap.mmap
+
+    def tracked_mmap(*args, **kwargs):
+        maps.append(mmap(*args, **kwargs))
+        return maps[-1]
+
+    monkeypatch.setattr(rom_registry.mmap, "mmap", tracked_mmap)
+    for name, data in [("short.nes", b"NES\x1a"), ("bad.nes", b"NOPE" + b"\x00" * 32)]:
+        p = tmp_path / name
+        p.write_bytes(data)
+        with pytest.raises(ValueError):
+            load_rom(p)
+    assert len(maps) == 2
+    assert all(data.closed for data in maps)
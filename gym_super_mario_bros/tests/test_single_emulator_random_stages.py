@@ -0,0 +1,54 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from gym_super_mario_bros import _emulator_state
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+from gym_super_mario_bros.smb_random_stages_env import SuperMarioBrosRandomStagesEnv
+
+
+@pytest.mark.skipif(not _emulator_state.is_supported(), reason="nes-py core cannot serialize state")
+def test_single_emulator_episodes_match_one_emulator_per_stage():
+    stages = ["1-1", "4-2", "8-4"]
+    single = SuperMarioBrosRandomStagesEnv(stages=stages, single_emulator=True)
+    multi = SuperMarioBrosRandomStagesEnv(stages=stages)
+    actions = [0, 130, 131, 130, 0, 129] * 10
+
+    for seed in range(6):
+        obs1, info1 = single.reset(seed=seed)
+        obs2, info2 = multi.reset(seed=seed)
+        assert np.array_equal(obs1, obs2)
+        for action in actions:
+            obs1, r1, d1, t1, info1 = single.step(action)
+            obs2, r2, d2, t2, info2 = multi.step(action)
+            assert np.array_equal(obs1, obs2)
+            assert (r1, d1, t1, info1) == (r2, d2, t2, info2)
+            if d1 or t1:
+                break
+
+    single.close()
+    multi.close()
+
+
+def test_switching_stages_retargets_pickles_of_the_emulator(monkeypatch):
+    # stand in for a core that serializes its state: a state names its stage
+    loaded = []
+    monkeypatch.setattr(_emulator_state, "is_supported", lambda: True)
+    monkeypatch.setattr(
+        SuperMarioBrosEnv,
+        "_dump_state",
+        lambda self: "{}-{}".format(self._target_world, self._target_stage).encode(),
+    )
+    monkeypatch.setattr(SuperMarioBrosEnv, "_load_state", lambda self, state: loaded.append(state))
+    env = SuperMarioBrosRandomStagesEnv(stages=["1-1", "4-2"], single_emulator=True)
+    emulator = env._single_emulator_env(0, 0)
+    assert env._single_emulator_env(3, 1) is emulator
+    assert loaded == [b"4-2"]
+    target = emulator._target_world, emulator._target_stage, emulator._target_area
+    assert target[:2] == (4, 2)
+    assert emulator._init_kwargs["target"] == (4, 2)
+    copy = pickle.loads(pickle.dumps(emulator))
+    assert (copy._target_world, copy._target_stage, copy._target_area) == target
+    copy.close()
+    env.close()
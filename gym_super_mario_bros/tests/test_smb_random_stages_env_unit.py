@@ -89,3 +89,153 @@ def test_close_closes_all_child_envs_and_viewer():
     # subsequent close should error
     with pytest.raises(ValueError):
         env.close()
+
+
+def test_stage_envs_are_constructed_on_first_reset():
+    env = rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla", stages=["4-2"])
+    assert len(env._live_envs) == 0
+    env.reset(seed=0)
+    assert list(env._live_envs) == [(3, 1)]
+    assert env._live_envs[(3, 1)].rom_mode == "vanilla"
+    first = env.env
+    env.reset(seed=1)
+    assert env.env is first
+
+
+def test_envs_keeps_the_list_of_lists_by_world_and_stage():
+    env = rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla", stages=["1-1"])
+    assert len(env.envs) == 8
+    assert all(len(stages) == 4 for stages in env.envs)
+    assert len(env._live_envs) == 0
+    # indexing constructs the stage environment and keeps it live
+    assert env.envs[3][1].target == (4, 2)
+    assert env.envs[3][1] is env._live_envs[(3, 1)]
+    assert env.envs[7][-1].target == (8, 4)
+    assert [stage.target for stage in env.envs[0][:2]] == [(1, 1), (1, 2)]
+    with pytest.raises(IndexError):
+        env.envs[0][4]
+    env.reset()
+    assert env.env is env.envs[0][0]
+
+
+def test_env_before_the_first_reset_raises():
+    env = rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla")
+    with pytest.raises(rse.gym.error.ResetNeeded):
+        env.env
+    with pytest.raises(rse.gym.error.ResetNeeded):
+        env.step(0)
+    env.reset()
+    assert env.step(0)[4] == {"action": 0}
+
+
+def test_max_live_stages_closes_least_recently_used():
+    env = rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla", max_live_stages=2)
+    env.reset(options={"stages": ["1-1"]})
+    one_one = env.env
+    env.reset(options={"stages": ["1-2"]})
+    env.reset(options={"stages": ["1-1"]})
+    env.reset(options={"stages": ["1-3"]})
+    assert list(env._live_envs) == [(0, 0), (0, 2)]
+    assert env._live_envs[(0, 0)] is one_one
+    assert one_one.closed is False
+
+
+def test_max_live_stages_must_be_positive():
+    with pytest.raises(ValueError):
+        rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla", max_live_stages=0)
+
+
+def test_prewarm_constructs_the_stage_subset():
+    env = rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla", stages=["1-1", "8-4"], prewarm=True)
+    env._prewarm_thread.join()
+    assert set(env._live_envs) == {(0, 0), (7, 3)}
+    stages = list(env._live_envs.values())
+    env.close()
+    assert all(stage.closed for stage in stages)
+
+
+def test_key_mapping_available_before_reset():
+    env = rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla")
+    assert env.get_keys_to_action() == {(): 0}
+    assert env.get_action_meanings() == ["NOOP"]
+    assert len(env._live_envs) == 0
+
+
+def test_single_live_stage_replaces_current_env():
+    env = rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla", max_live_stages=1)
+    env.reset(options={"stages": ["1-1"]})
+    first = env.env
+    env.reset(options={"stages": ["2-1"]})
+    assert list(env._live_envs) == [(1, 0)]
+    assert first.closed is True
+
+
+class SnapshotStageEnv(DummyStageEnv):
+    """A stage env whose "emulator state" is a label of the stage start."""
+
+    def __init__(self, rom_mode="vanilla", target=None):
+        super().__init__(rom_mode=rom_mode, target=target)
+        self._target_world, self._target_stage = target
+        self._target_area = None
+        self._init_kwargs = dict(rom_mode=rom_mode, target=target)
+        self.state = "start of {}-{}".format(*target)
+        self.backup = None
+
+    def _dump_state(self):
+        return self.state
+
+    def _load_state(self, state):
+        self.state = state
+
+    def _backup(self):
+        self.backup = self.state
+
+    def reset(self, seed=None, options=None, return_info=None):
+        target = (self._target_world, self._target_stage)
+        return ("obs", {"target": target, "state": self.backup or self.state})
+
+
+def test_single_emulator_restores_stage_start_snapshots(monkeypatch):
+    monkeypatch.setattr(rse, "SuperMarioBrosEnv", SnapshotStageEnv)
+    monkeypatch.setattr(rse._emulator_state, "is_supported", lambda: True)
+    env = rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla", single_emulator=True)
+
+    _, info = env.reset(options={"stages": ["4-2"]})
+    emulator = env.env
+    assert info == {"target": (4, 2), "state": "start of 4-2"}
+
+    _, info = env.reset(options={"stages": ["1-1"]})
+    assert env.env is emulator
+    assert info == {"target": (1, 1), "state": "start of 1-1"}
+    assert emulator._target_area == 1
+    assert emulator._init_kwargs["target"] == (1, 1)
+
+    _, info = env.reset(options={"stages": ["4-2"]})
+    assert env.env is emulator
+    assert info == {"target": (4, 2), "state": "start of 4-2"}
+    assert len(env._live_envs) == 0
+    assert set(env._stage_states) == {(3, 1), (0, 0)}
+
+    env.close()
+    assert emulator.closed is True
+
+
+def test_single_emulator_requires_core_support(monkeypatch):
+    monkeypatch.setattr(rse._emulator_state, "is_supported", lambda: False)
+    with pytest.raises(ValueError, match="single_emulator"):
+        rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla", single_emulator=True)
+
+
+def test_stages_are_compiled_once():
+    env = rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla", stages=["1-1", "8-4"])
+    assert env._stage_indices.tolist() == [0, 31]
+    env.stages = ["2-3"]
+    assert env._stage_indices.tolist() == [6]
+    env.stages = None
+    assert env._stage_indices is None
+
+
+@pytest.mark.parametrize("stages", [["9-1"], ["1-5"], ["11"], ["a-b"]])
+def test_invalid_stages_raise(stages):
+    with pytest.raises(ValueError):
+        rse.SuperMarioBrosRandomStagesEnv(rom_mode="vanilla", stages=stages)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+from gym_super_mario_bros._snapshot_store import SnapshotStore
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+@pytest.fixture(scope="module")
+def trace():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [0b10000010] * 30, screen=False)
+    env.close()
+    return trace
+
+
+def _steps(env, n):
+    return [env.step(0)[1:] for _ in range(n)]
+
+
+def test_save_and_load_restore_slots_independently(trace):
+    env = SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace))
+    store = SnapshotStore(env, slots=4)
+    env.reset()
+    start = env.ram.copy()
+    _steps(env, 3)
+    store.save(0)
+    expected_0 = _steps(env, 5)
+    store.save(2)
+    expected_2 = _steps(env, 5)
+
+    store.load(0)
+    assert _steps(env, 5) == expected_0
+    store.load(2)
+    assert _steps(env, 5) == expected_2
+    # the reset backup is untouched
+    env.reset()
+    assert np.array_equal(env.ram, start)
+    assert 0 in store and 1 not in store and 4 not in store
+    env.close()
+
+
+def test_load_of_an_empty_slot_raises(trace):
+    env = SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace))
+    store = SnapshotStore(env, slots=2)
+    store.save(1)
+    store.clear(1)
+    with pytest.raises(ValueError):
+        store.load(1)
+    with pytest.raises(IndexError):
+        store.save(2)
+    env.close()
+
+
+def test_store_requires_state_support():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    if env._backend.supports_state:
+        store = SnapshotStore(env, slots=1)
+        assert store.nbytes >= env._backend.state_size()
+    else:
+        with pytest.raises(RuntimeError):
+            SnapshotStore(env, slots=1)
+    env.close()
@@ -0,0 +1,123 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from gym_super_mario_bros import _emulator_state
+from gym_super_mario_bros import _state_cache
+from gym_super_mario_bros._backend import InputLogBackend
+from gym_super_mario_bros._backend import NesPyBackend
+from gym_super_mario_bros._checkpoint import PAYLOAD_BUFFERS, PAYLOAD_STATE
+from gym_super_mario_bros._roms import load_rom, rom_path
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+def test_resolve_cache_dir_disabled_by_default(monkeypatch):
+    monkeypatch.delenv(_state_cache.CACHE_DIR_ENV, raising=False)
+    assert _state_cache.resolve_cache_dir(None) is None
+    assert _state_cache.resolve_cache_dir(False) is None
+
+
+def test_resolve_cache_dir_from_environment_variable(monkeypatch, tmp_path: Path):
+    monkeypatch.setenv(_state_cache.CACHE_DIR_ENV, str(tmp_path))
+    assert _state_cache.resolve_cache_dir(None) == tmp_path
+    # an explicit argument wins over the environment
+    assert _state_cache.resolve_cache_dir(False) is None
+
+
+def test_resolve_cache_dir_true_uses_user_cache(monkeypatch, tmp_path: Path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert _state_cache.resolve_cache_dir(True) == tmp_path / "gym-super-mario-bros" / "states"
+
+
+def _key(rom_hash, rom_mode="vanilla", target=(None, None, None), backend=NesPyBackend, payload_format=PAYLOAD_STATE):
+    """Return the cache key with the defaults of a plain environment."""
+    return _state_cache.cache_key(rom_hash, rom_mode, target, backend, payload_format)
+
+
+def test_cache_key_depends_on_rom_mode_and_target():
+    vanilla = load_rom(rom_path(False, "vanilla")).sha256
+    downsample = load_rom(rom_path(False, "downsample")).sha256
+    key = _key(vanilla)
+    assert key == _key(vanilla)
+    assert key != _key(vanilla, target=(1, 2, 3))
+    assert key != _key(downsample, "downsample")
+
+
+def test_cache_key_depends_on_backend_and_payload_format():
+    vanilla = load_rom(rom_path(False, "vanilla")).sha256
+    key = _key(vanilla)
+    # a state dumped by one backend or in one format never loads into another
+    assert key != _key(vanilla, backend=InputLogBackend)
+    assert key != _key(vanilla, payload_format=PAYLOAD_BUFFERS)
+
+
+def test_cache_key_depends_on_rom_content_not_path(tmp_path: Path):
+    data = Path(rom_path(False, "vanilla")).read_bytes()
+    (tmp_path / "a.nes").write_bytes(data)
+    (tmp_path / "b.nes").write_bytes(data)
+    # the same bytes with one PRG byte changed
+    (tmp_path / "c.nes").write_bytes(data[:100] + bytes([data[100] ^ 0xFF]) + data[101:])
+    a, b, c = (_key(load_rom(tmp_path / name).sha256) for name in ["a.nes", "b.nes", "c.nes"])
+    assert a == b
+    assert a != c
+
+
+def test_store_and_load_round_trip(tmp_path: Path):
+    cache_dir = tmp_path / "states"
+    assert _state_cache.load(cache_dir, "abc") is None
+    _state_cache.store(cache_dir, "abc", b"\x00\x01state")
+    assert _state_cache.load(cache_dir, "abc") == b"\x00\x01state"
+    # no temporary files are left behind
+    assert [p.name for p in cache_dir.iterdir()] == ["abc.state"]
+
+
+def test_env_construction_loads_cached_state(monkeypatch, tmp_path: Path):
+    import gym_super_mario_bros.smb_env as smb_env
+
+    calls = {"skip": 0, "load": []}
+    skip_start_screen = smb_env.SuperMarioBrosEnv._skip_start_screen
+
+    def counting_skip(self):
+        calls["skip"] += 1
+        skip_start_screen(self)
+
+    monkeypatch.setattr(_emulator_state, "is_supported", lambda: True)
+    monkeypatch.setattr(smb_env.SuperMarioBrosEnv, "_skip_start_screen", counting_skip)
+    monkeypatch.setattr(smb_env.SuperMarioBrosEnv, "_dump_state", lambda self: b"state")
+    monkeypatch.setattr(smb_env.SuperMarioBrosEnv, "_load_state", lambda self, state: calls["load"].append(state))
+
+    smb_env.SuperMarioBrosEnv(target=(1, 1), state_cache=tmp_path).close()
+    assert calls == {"skip": 1, "load": []}
+    assert len(list(tmp_path.iterdir())) == 1
+
+    smb_env.SuperMarioBrosEnv(target=(1, 1), state_cache=tmp_path).close()
+    assert calls == {"skip": 1, "load": [b"state"]}
+
+
+class _StatelessBackend(NesPyBackend):
+    """A nes-py core that can't serialize its state, like PyPI builds."""
+
+    supports_state = False
+
+
+def test_state_cache_requires_state_serialization(monkeypatch, tmp_path: Path):
+    with pytest.raises(ValueError, match="state_cache"):
+        SuperMarioBrosEnv(target=(1, 1), state_cache=tmp_path, backend=_StatelessBackend)
+    # the environment variable enables the cache only where it works
+    monkeypatch.setenv(_state_cache.CACHE_DIR_ENV, str(tmp_path))
+    SuperMarioBrosEnv(target=(1, 1), backend=_StatelessBackend).close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_input_log_states_skip_the_cache(tmp_path: Path):
+    plain = SuperMarioBrosEnv(target=(1, 1))
+    for _ in range(2):
+        # loading a log replays the start screen, so caching it saves nothing
+        env = SuperMarioBrosEnv(target=(1, 1), state_cache=tmp_path, backend=InputLogBackend)
+        assert list(tmp_path.iterdir()) == []
+        assert np.array_equal(env.reset()[0], plain.reset()[0])
+        assert np.array_equal(env.ram, plain.ram)
+        assert env.step(0b10000010)[1:] == plain.step(0b10000010)[1:]
+        env.close()
+    plain.close()
@@ -1,64 +1,56 @@
 import numpy as np
 
+from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
 
-def test_step_sets_terminated_when_game_over(monkeypatch):
-    """Even if nes-py doesn't report done that frame, env should terminate on game over."""
-    from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
 
-    # Create an instance without running full emulator init.
-    env = object.__new__(SuperMarioBrosEnv)
+def _frame(life=2, player_state=0x08):
+    """Return the RAM of a frame with Mario in control."""
+    ram = np.zeros(2048, dtype=np.uint8)
+    ram[0x07F8:0x07F8 + 3] = [4, 0, 0]
+    ram[0x075A] = life
+    ram[0x000E] = player_state
+    ram[0x00B5] = 1
+    return ram
 
-    # Minimal RAM backing for _life (0x075A) and other reads.
-    env.ram = np.zeros(2048, dtype=np.uint8)
-    env.ram[0x075A] = 0xFF  # game over
 
-    # Not a single-stage env => _get_done should use _is_game_over
-    env._target_world, env._target_stage, env._target_area = None, None, None
+def _make_env(*frames, **kwargs) -> SuperMarioBrosEnv:
+    return SuperMarioBrosEnv(backend=ReplayBackend(ReplayTrace(ram=np.stack(frames))), **kwargs)
 
-    # Stub NESEnv.step to return legacy 4-tuple with done=False.
-    def fake_super_step(_self, action):
-        obs = np.zeros((240, 256, 3), dtype=np.uint8)
-        reward = 0.0
-        done = False
-        info = {}
-        return obs, reward, done, info
 
-    monkeypatch.setattr(
-        SuperMarioBrosEnv.__mro__[1],  # NESEnv
-        "step",
-        fake_super_step,
-        raising=True,
-    )
-
-    obs, reward, terminated, truncated, info = SuperMarioBrosEnv.step(env, 0)
+def test_step_sets_terminated_when_game_over():
+    """The env terminates on game over without nes-py reporting done."""
+    env = _make_env(_frame(), _frame(life=0xFF))
+    obs, reward, terminated, truncated, info = env.step(0)
     assert terminated is True
     assert truncated is False
+    assert info["life"] == 0xFF
 
 
-def test_step_preserves_truncated(monkeypatch):
-    """If underlying env reports truncated, we keep it (and may also terminate)."""
-    from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
-
-    env = object.__new__(SuperMarioBrosEnv)
-    env.ram = np.zeros(2048, dtype=np.uint8)
-    env.ram[0x075A] = 0x00  # not game over
-    env._target_world, env._target_stage, env._target_area = None, None, None
+def test_step_preserves_truncated():
+    """A truncated step stays truncated (and not terminated) on the last life."""
+    env = _make_env(_frame(life=0x00), _frame(life=0x00), max_episode_frames=1)
+    _obs, _reward, terminated, truncated, _info = env.step(0)
+    assert terminated is False
+    assert truncated is True
 
-    def fake_super_step(_self, action):
-        obs = np.zeros((240, 256, 3), dtype=np.uint8)
-        reward = 0.0
-        terminated = False
-        truncated = True
-        info = {}
-        return obs, reward, terminated, truncated, info
 
-    monkeypatch.setattr(
-        SuperMarioBrosEnv.__mro__[1],
-        "step",
-        fake_super_step,
-        raising=True,
+def test_step_sets_terminated_when_skipped_death_ends_the_game():
+    """Skipping the last death's animation reaches the game over in one step."""
+    env = _make_env(
+        _frame(life=0),
+        _frame(life=0, player_state=0x0B),
+        _frame(life=0, player_state=0x00),
+        _frame(life=0xFF),
     )
+    _obs, _reward, terminated, truncated, _info = env.step(0)
+    assert terminated is True
+    assert truncated is False
+    assert env._backend.frame == 3
+
 
-    _obs, _reward, terminated, truncated, _info = SuperMarioBrosEnv.step(env, 0)
+def test_step_continues_while_mario_is_alive():
+    env = _make_env(_frame(), _frame())
+    _obs, _reward, terminated, truncated, _info = env.step(0)
     assert terminated is False
-    assert truncated is True
+    assert truncated is False
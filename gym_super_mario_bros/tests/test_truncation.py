@@ -0,0 +1,141 @@
+import numpy as np
+
+from gym_super_mario_bros._backend import ReplayBackend, ReplayTrace
+from gym_super_mario_bros.smb_env import SuperMarioBrosEnv
+
+
+def _make_env_without_init(**budgets) -> SuperMarioBrosEnv:
+    env = object.__new__(SuperMarioBrosEnv)
+    env.ram = np.zeros(0x0800, dtype=np.uint8)
+    env.done = False
+    env._max_stuck_steps = budgets.get("max_stuck_steps")
+    env._max_episode_seconds = budgets.get("max_episode_seconds")
+    env._max_episode_frames = budgets.get("max_episode_frames")
+    env._frame_count = 0
+    env._did_reset()
+    env.stats = dict(truncated_stuck=0, truncated_seconds=0, truncated_frames=0)
+    return env
+
+
+def _set_x(env, x):
+    env.ram[0x6D] = x // 0x100
+    env.ram[0x86] = x % 0x100
+
+
+def test_no_budgets_never_truncate():
+    env = _make_env_without_init()
+    for _ in range(100):
+        env._frame_count += 1
+        assert env._get_truncated() is False
+    assert env.done is False
+
+
+def test_stuck_steps_truncates_without_new_best_x():
+    env = _make_env_without_init(max_stuck_steps=3)
+    _set_x(env, 10)
+    assert env._get_truncated() is False
+    # moving back and forth below the best x does not count as progress
+    _set_x(env, 8)
+    assert env._get_truncated() is False
+    _set_x(env, 10)
+    assert env._get_truncated() is False
+    _set_x(env, 9)
+    assert env._get_truncated() is True
+    assert env.done is True
+    assert env.stats["truncated_stuck"] == 1
+
+
+def test_stuck_steps_counter_resets_on_progress_respawns_and_areas():
+    env = _make_env_without_init(max_stuck_steps=2)
+    env.ram[0x075A] = 2
+    _set_x(env, 300)
+    assert env._get_truncated() is False
+    assert env._get_truncated() is False
+    _set_x(env, 301)
+    assert env._get_truncated() is False
+    # a respawn costs a life and moves Mario back to the start of the area
+    env.ram[0x075A] = 1
+    _set_x(env, 40)
+    assert env._get_truncated() is False
+    assert env._x_position_best == 40
+    assert env._get_truncated() is False
+    # a pipe into another area moves Mario back too
+    env.ram[0x0760] = 2
+    _set_x(env, 20)
+    assert env._get_truncated() is False
+    assert env._x_position_best == 20
+
+
+def test_oscillating_does_not_reset_the_stuck_counter():
+    env = _make_env_without_init(max_stuck_steps=50)
+    x = 100
+    _set_x(env, x)
+    for step in range(200):
+        # walk right 8 steps, then back left 12, so x drifts backwards
+        x += 2 if step % 20 < 8 else -2
+        _set_x(env, x)
+        if env._get_truncated():
+            break
+    assert env.stats["truncated_stuck"] == 1
+    assert step < 60
+
+
+def test_oscillating_in_the_game_truncates():
+    env = SuperMarioBrosEnv(target=(1, 1), max_stuck_steps=50)
+    env.reset()
+    for step in range(400):
+        action = 0b10000000 if step % 20 < 8 else 0b01000000
+        _obs, _reward, terminated, truncated, _info = env.step(action)
+        if terminated or truncated:
+            break
+    assert truncated is True
+    assert env.stats["truncated_stuck"] == 1
+    env.close()
+
+
+def test_frame_budget_counts_frames_since_reset():
+    env = _make_env_without_init(max_episode_frames=10)
+    env._frame_count = 9
+    assert env._get_truncated() is False
+    env._frame_count = 10
+    assert env._get_truncated() is True
+    assert env.stats["truncated_frames"] == 1
+
+
+def test_wall_clock_budget(monkeypatch):
+    import gym_super_mario_bros.smb_env as smb_env
+
+    now = [100.0]
+    monkeypatch.setattr(smb_env.time, "monotonic", lambda: now[0])
+    env = _make_env_without_init(max_episode_seconds=2.5)
+    now[0] = 102.0
+    assert env._get_truncated() is False
+    now[0] = 102.5
+    assert env._get_truncated() is True
+    assert env.stats["truncated_seconds"] == 1
+
+
+def test_step_reports_truncated_instead_of_terminated():
+    ram = np.zeros((2, 0x0800), dtype=np.uint8)
+    ram[:, 0x075A] = 2
+    ram[:, 0x000E] = 0x08
+    env = SuperMarioBrosEnv(max_episode_frames=1, backend=ReplayBackend(ReplayTrace(ram=ram)))
+
+    _obs, _reward, terminated, truncated, _info = env.step(0)
+    assert terminated is False
+    assert truncated is True
+
+
+def test_make_forwards_truncation_kwargs():
+    from gym_super_mario_bros._registration import make
+
+    env = make("SuperMarioBros-1-1-v0", max_stuck_steps=5)
+    env.reset(seed=0)
+    truncated = False
+    for _ in range(50):
+        _obs, _reward, terminated, truncated, _info = env.step(0)
+        if terminated or truncated:
+            break
+    assert truncated is True
+    assert env.unwrapped.stats["truncated_stuck"] == 1
+    env.close()
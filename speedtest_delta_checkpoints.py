@@ -0,0 +1,80 @@
+"""Measure the compression and restore latency of delta checkpoints.
+
+Saves a checkpoint after every step of a long random rollout, once as
+independent keyframes and once as delta chains of a few lengths, and reports
+the bytes the payloads take, the compression ratio against keyframes, and the
+median latency of `save_checkpoint` and `load_checkpoint` in microseconds.
+The rollout runs on nes-py (buffers checkpoints, which hold the screen) and
+on a `ReplayBackend` of it (serialized state checkpoints).
+"""
+import random
+import statistics
+import time
+
+import gym_super_mario_bros
+from gym_super_mario_bros import ReplayBackend, ReplayTrace, SuperMarioBrosEnv
+
+
+# the number of steps of the rollout
+STEPS = 2000
+
+
+# the chain limits to compare (0 saves keyframes only)
+CHAINS = (0, 4, 16, 64)
+
+
+# the format of a result line
+_LINE = '  max_chain={:<4}{:>12,} bytes{:>8.1f}x  save {:8.1f} us  load {:8.1f} us'
+
+
+def _rollout(env, actions, max_chain):
+    """Return the checkpoints and save latencies of a rollout."""
+    env.reset()
+    checkpoints, times = [], []
+    base = None
+    for action in actions:
+        _, _, terminated, truncated, _ = env.step(action)
+        start = time.perf_counter_ns()
+        base = env.save_checkpoint(base=base if max_chain else None, max_chain=max_chain)
+        times.append(time.perf_counter_ns() - start)
+        checkpoints.append(base)
+        if terminated or truncated:
+            env.reset()
+            base = None
+    return checkpoints, times
+
+
+def _load_us(env, checkpoints):
+    """Return the median latency of loading each of the checkpoints."""
+    times = []
+    for checkpoint in checkpoints:
+        start = time.perf_counter_ns()
+        env.load_checkpoint(checkpoint)
+        times.append(time.perf_counter_ns() - start)
+    return statistics.median(times) / 1000
+
+
+def _report(name, env, actions):
+    """Print the results of the chain limits on an environment."""
+    print('{} ({} steps)'.format(name, len(actions)))
+    keyframe_bytes = None
+    for max_chain in CHAINS:
+        checkpoints, times = _rollout(env, actions, max_chain)
+        stored = sum(len(checkpoint._payload) for checkpoint in checkpoints)
+        keyframe_bytes = keyframe_bytes or stored
+        save_us = statistics.median(times) / 1000
+        print(_LINE.format(max_chain, stored, keyframe_bytes / stored, save_us, _load_us(env, checkpoints)))
+
+
+def main():
+    rng = random.Random(0)
+    actions = [rng.randrange(256) for _ in range(STEPS)]
+    env = gym_super_mario_bros.make_raw('SuperMarioBros-1-1-v0')
+    _report('nes-py', env, actions)
+    trace = ReplayTrace.record(env, actions, screen=False)
+    env.close()
+    _report('replay', SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace)), actions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Measure how batched evaluation scales with the depth of the checkpoint.
+
+`InputLogBackend` loads a state by replaying its log from the episode start,
+so loading a checkpoint costs as much as emulating its depth. The evaluator
+loads it once per batch and anchors there, so a batch should cost one replay
+of the depth plus its sequences, not one replay per sequence. For checkpoints
+at several depths in 1-1 (Mario standing still, which he survives), this
+times a batch of sequences in the calling process, a second batch from the
+same checkpoint (the warm case), and stepping the same number of steps
+without any checkpoint, and reports the frames the backend replayed.
+"""
+import time
+
+import numpy as np
+
+from gym_super_mario_bros import InputLogBackend, SequenceEvaluator
+
+
+# the depths in frames of the checkpoints to evaluate from
+DEPTHS = (100, 1000, 3000)
+
+
+# the number of sequences per batch and of steps per sequence
+SEQUENCES = 20
+STEPS = 20
+
+
+def _checkpoint_at(env, depth):
+    """Return a checkpoint of the environment after standing still for a while."""
+    env.reset()
+    for _ in range(depth):
+        env.step(0)
+    return env.save_checkpoint()
+
+
+def main():
+    rng = np.random.default_rng(0)
+    batch = rng.choice([0, 0b10000010, 0b10000011], size=(SEQUENCES, STEPS))
+    with SequenceEvaluator(dict(target=(1, 1), backend=InputLogBackend), workers=0) as evaluator:
+        env = evaluator._env
+        backend = env._backend
+        print('{:>6} {:>10} {:>10} {:>10} {:>10}'.format('depth', 'batch', 'warm', 'plain', 'replayed'))
+        for depth in DEPTHS:
+            checkpoint = _checkpoint_at(env, depth)
+            replayed = backend.frames_replayed
+            start = time.perf_counter()
+            evaluator.evaluate(checkpoint, batch)
+            cold = time.perf_counter() - start
+            replayed = backend.frames_replayed - replayed
+            start = time.perf_counter()
+            evaluator.evaluate(checkpoint, batch)
+            warm = time.perf_counter() - start
+            env.reset()
+            start = time.perf_counter()
+            for _ in range(SEQUENCES * STEPS):
+                _, _, terminated, truncated, _ = env.step(0b10000010)
+                if terminated or truncated:
+                    env.reset()
+            plain = time.perf_counter() - start
+            print('{:>6} {:>9.2f}s {:>9.2f}s {:>9.2f}s {:>10}'.format(depth, cold, warm, plain, replayed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Measure the import time of gym_super_mario_bros in fresh interpreters.
+
+Spawn-based workers (multiprocessing "spawn", Ray, etc.) import the package
+in a new interpreter, so its import time is paid once per worker. This
+script reports the median wall time over several fresh interpreters of:
+
+- an empty interpreter (the baseline),
+- `import gym_super_mario_bros`,
+- importing gymnasium afterwards (which registers the environments), and
+- constructing a first environment.
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+
+# the number of fresh interpreters to time per statement
+RUNS = 10
+
+
+# the statements to time, from cheapest to most expensive
+STATEMENTS = {
+    'python': 'pass',
+    'import gym_super_mario_bros': 'import gym_super_mario_bros',
+    '+ import gymnasium': 'import gym_super_mario_bros, gymnasium',
+    '+ make SuperMarioBros-v0': (
+        'import gym_super_mario_bros; '
+        'gym_super_mario_bros.make("SuperMarioBros-v0").close()'
+    ),
+}
+
+
+def _time(statement):
+    """Return the wall time in seconds to run a statement in a new process."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', statement], check=True, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    """Print the median time of each statement."""
+    for name, statement in STATEMENTS.items():
+        times = [_time(statement) for _ in range(RUNS)]
+        print('{:<32} {:8.1f} ms'.format(name, 1000 * statistics.median(times)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Measure the per-step overhead of each layer around the emulator.
+
+`gym_super_mario_bros.make` returns the environment wrapped as
+`TimeLimit(OrderEnforcing(PassiveEnvChecker(SuperMarioBrosEnv)))`, while
+`gym_super_mario_bros.make_raw` returns the bare `SuperMarioBrosEnv`. The
+layers are:
+
+- nes-py: `NESEnv.step`, the RAM-derived reward, done flag, and info,
+- make_raw: `SuperMarioBrosEnv.step`, the Gymnasium 5-tuple and truncation,
+- + PassiveEnvChecker, + OrderEnforcing, + TimeLimit: `make`'s wrappers.
+
+The Python overhead of a few microseconds per layer is far below the noise of
+emulating a frame, so the layers are timed with the native frame emulation
+replaced by a no-op (the NES stays on the first frame of the episode and every
+layer still runs in full). The cost of emulating a frame is reported first for
+scale.
+"""
+import gc
+import time
+
+from gymnasium.wrappers import OrderEnforcing, PassiveEnvChecker, TimeLimit
+from nes_py import NESEnv
+from nes_py import nes_env
+
+import gym_super_mario_bros
+
+
+# the number of steps per timed block
+STEPS = 200
+
+
+# the number of blocks to time per layer (the best one is reported)
+ROUNDS = 200
+
+
+# the action to take on every step (right + B)
+ACTION = 0b10000010
+
+
+def _best_times_per_step(layers):
+    """Return the best mean seconds per step of each layer over interleaved blocks."""
+    best = {name: float('inf') for name, _ in layers}
+    for _ in range(ROUNDS):
+        for name, step in layers:
+            start = time.perf_counter()
+            for _ in range(STEPS):
+                step(ACTION)
+            best[name] = min(best[name], (time.perf_counter() - start) / STEPS)
+    return [(name, best[name]) for name, _ in layers]
+
+
+def _frame_time(env):
+    """Return the best mean seconds to emulate a frame of the NES."""
+    env.reset()
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(STEPS // 20):
+            nes_env._LIB.Step(env._env)
+        best = min(best, (time.perf_counter() - start) / (STEPS // 20))
+    return best
+
+
+def main():
+    env = gym_super_mario_bros.make_raw('SuperMarioBros-v0')
+    print('emulating a frame: {:.1f} us'.format(1e6 * _frame_time(env)))
+    env.reset()
+    checked = PassiveEnvChecker(env)
+    ordered = OrderEnforcing(checked)
+    limited = TimeLimit(ordered, max_episode_steps=9999999)
+    limited.reset()
+    layers = [
+        ('nes-py', lambda action: NESEnv.step(env, action)),
+        ('make_raw', env.step),
+        ('+ PassiveEnvChecker', checked.step),
+        ('+ OrderEnforcing', ordered.step),
+        ('+ TimeLimit (make)', limited.step),
+    ]
+    # replace the frame emulation with a no-op to time the Python layers
+    native_step = nes_env._LIB.Step
+    nes_env._LIB.Step = lambda _: None
+    gc.disable()
+    try:
+        times = _best_times_per_step(layers)
+    finally:
+        gc.enable()
+        nes_env._LIB.Step = native_step
+    env.close()
+    print('{:<22} {:>12} {:>12}'.format('layer', 'us/step', 'added us'))
+    below = None
+    for name, seconds in times:
+        added = '' if below is None else '{:+.1f}'.format(1e6 * (seconds - below))
+        print('{:<22} {:>12.1f} {:>12}'.format(name, 1e6 * seconds, added))
+        below = seconds
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Measure the per-step overhead of the rewind ring buffer and its rewinds.
+
+Steps environments with rewinding disabled and with a snapshot every few
+frames, interleaving short timed blocks, and reports the best mean time per
+step and the overhead against the disabled environment. The nes-py core is
+timed when it can serialize its state (its constructor raises otherwise),
+and an `InputLogBackend` is always timed. A `ReplayBackend` of the same
+frames is timed too; its steps are cheap, so the overhead of the snapshots
+stands out.
+
+An `InputLogBackend` loads a snapshot by replaying the episode up to it, so
+this also times `rewind` on one at several depths into an episode.
+"""
+import gc
+import time
+
+from gym_super_mario_bros import InputLogBackend, ReplayBackend, ReplayTrace, SuperMarioBrosEnv
+
+
+# the number of steps per timed block
+STEPS = 200
+
+
+# the number of blocks to time per configuration (the best one is reported)
+ROUNDS = 100
+
+
+# the snapshot intervals in frames to compare (None disables rewinding)
+INTERVALS = (None, 16, 4, 1)
+
+
+# the depths in frames into an episode to time rewinds at, and the number of
+# rewinds to time at each
+REWIND_DEPTHS = (60, 600, 3000)
+REWINDS = 10
+
+
+def _best_time_per_step(envs):
+    """Return the best mean seconds per step of each environment."""
+    best = [float('inf')] * len(envs)
+    for env in envs:
+        env.reset()
+    for _ in range(ROUNDS):
+        for index, env in enumerate(envs):
+            start = time.perf_counter()
+            for _ in range(STEPS):
+                _, _, terminated, truncated, _ = env.step(0b10000010)
+                if terminated or truncated:
+                    env.reset()
+            best[index] = min(best[index], (time.perf_counter() - start) / STEPS)
+    return best
+
+
+def _report(name, make_env):
+    """Print the step time of each snapshot interval."""
+    try:
+        envs = [make_env(interval) for interval in INTERVALS]
+    except ValueError:
+        print('{}: rewinding is unavailable (the core cannot serialize its state)'.format(name))
+        return
+    gc.disable()
+    try:
+        times = _best_time_per_step(envs)
+    finally:
+        gc.enable()
+    print(name)
+    for interval, seconds in zip(INTERVALS, times):
+        label = 'disabled' if interval is None else 'every {} frames'.format(interval)
+        overhead = 1e6 * (seconds - times[0])
+        print('  {:<18}{:8.2f} us/step  ({:+.2f} us)'.format(label, 1e6 * seconds, overhead))
+
+
+def _report_rewinds():
+    """Print the time of a rewind on an `InputLogBackend` by episode depth."""
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend, rewind_every=30)
+    print('input log rewind(1)')
+    for depth in REWIND_DEPTHS:
+        env.reset()
+        # stand still, which Mario survives
+        for _ in range(depth):
+            env.step(0)
+        replayed = env._backend.frames_replayed
+        start = time.perf_counter()
+        for _ in range(REWINDS):
+            env.rewind(1)
+        seconds = (time.perf_counter() - start) / REWINDS
+        replayed = (env._backend.frames_replayed - replayed) // REWINDS
+        print('  {:>5} frames{:10.1f} ms  ({} frames replayed)'.format(depth, 1e3 * seconds, replayed))
+    env.close()
+
+
+def main():
+    env = SuperMarioBrosEnv(target=(1, 1))
+    trace = ReplayTrace.record(env, [0b10000010] * 400, screen=False)
+    env.close()
+    _report('nes-py', lambda interval: SuperMarioBrosEnv(target=(1, 1), rewind_every=interval))
+    _report('input log', lambda interval: SuperMarioBrosEnv(
+        target=(1, 1),
+        backend=InputLogBackend,
+        rewind_every=interval,
+    ))
+    _report('replay', lambda interval: SuperMarioBrosEnv(
+        target=(1, 1),
+        backend=ReplayBackend(trace),
+        rewind_every=interval,
+    ))
+    _report_rewinds()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Measure the latency of saving and loading emulator snapshots.
+
+Compares `SnapshotStore.save`/`load` with `save_checkpoint`/`load_checkpoint`
+and reports the median latency of each in microseconds, on the default
+backend, on an `InputLogBackend` at two episode depths, and on a
+`ReplayBackend`. On a nes-py core that can't serialize its state the store is
+unavailable on the default backend. An `InputLogBackend` loads a state by
+replaying the episode since the reset, so its loads grow with the depth. A
+`ReplayBackend` measures the store's Python overhead, not the core's.
+"""
+import statistics
+import time
+
+import gym_super_mario_bros
+from gym_super_mario_bros import InputLogBackend, ReplayBackend, ReplayTrace, SnapshotStore, SuperMarioBrosEnv
+
+
+# the number of timed calls per operation
+CALLS = 20000
+
+
+# the number of timed calls per operation on an `InputLogBackend`, whose loads
+# take milliseconds
+LOG_CALLS = 50
+
+
+# the episode depths in steps to time an `InputLogBackend` at
+LOG_DEPTHS = (60, 600)
+
+
+# the number of snapshot slots to cycle through
+SLOTS = 1024
+
+
+# the format of a latency line
+_LINE = '  {:<20}{:8.2f} us'
+
+
+def _median_us(function, calls=CALLS):
+    """Return the median latency of a function in microseconds."""
+    times = []
+    for i in range(calls):
+        start = time.perf_counter_ns()
+        function(i)
+        times.append(time.perf_counter_ns() - start)
+    return statistics.median(times) / 1000
+
+
+def _report(name, env, steps=60, action=0b10000010, calls=CALLS):
+    """Print the latencies of the snapshot operations of an environment."""
+    env.reset()
+    start = env._frame_count
+    for _ in range(steps):
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            break
+    checkpoint = env.save_checkpoint()
+    print('{} ({} frames in, {} checkpoint, {} bytes)'.format(
+        name,
+        env._frame_count - start,
+        checkpoint.payload_format,
+        len(checkpoint._payload),
+    ))
+    print(_LINE.format('save_checkpoint', _median_us(lambda _: env.save_checkpoint(), calls)))
+    print(_LINE.format('load_checkpoint', _median_us(lambda _: env.load_checkpoint(checkpoint), calls)))
+    if not env._backend.supports_state:
+        print('  SnapshotStore is unavailable (the core cannot serialize its state)')
+        return
+    store = SnapshotStore(env, SLOTS)
+    print(_LINE.format('SnapshotStore.save', _median_us(lambda i: store.save(i % SLOTS), calls)))
+    print(_LINE.format('SnapshotStore.load', _median_us(lambda i: store.load(i % SLOTS), calls)))
+    print('  ({} slots in {} bytes)'.format(SLOTS, store.nbytes))
+
+
+def main():
+    env = gym_super_mario_bros.make_raw('SuperMarioBros-1-1-v0')
+    trace = ReplayTrace.record(env, [0b10000010] * 200, screen=False)
+    _report('nes-py', env)
+    env.close()
+    env = SuperMarioBrosEnv(target=(1, 1), backend=InputLogBackend)
+    for steps in LOG_DEPTHS:
+        # stand still, which Mario survives
+        _report('input log', env, steps=steps, action=0, calls=LOG_CALLS)
+    env.close()
+    _report('replay', SuperMarioBrosEnv(target=(1, 1), backend=ReplayBackend(trace)))
+
+
+if __name__ == '__main__':
+    main()
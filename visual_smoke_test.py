@@ -66,7 +66,7 @@ def main(
     except Exception as e:  # pragma: no cover
         raise SystemExit(
             "This script requires Matplotlib. Install it with:\n"
-            "  pip install matplotlib\n\n"
+            "  pip install 'gym-super-mario-bros[dev]'\n\n"
             f"Original import error: {e}"
         )
 